@@ -0,0 +1,154 @@
+# src/batch_api.py
+import os
+import json
+import uuid
+import logging
+import http.client
+import urllib.parse
+from typing import List, Optional, Tuple
+
+from src.config import BATCH_API_BASE_URL, BATCH_COMPLETION_WINDOW, OPENAI_API_KEY, require_openai_api_key
+
+log = logging.getLogger("batch_api")
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+CHAT_COMPLETIONS_ENDPOINT = "/v1/chat/completions"
+# Bu durumlardaki batch'ler artık değişmez (expired/cancelled batch'lerin de kısmi çıktısı olabilir)
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+class BatchAPIError(Exception):
+    """Batch API'nin 2xx dışı döndürdüğü cevaplar."""
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+
+class BatchRequestError(Exception):
+    """Batch içindeki tek bir isteğin başarısız sonucu (çıktı dosyasındaki hata satırı)."""
+
+# =================================================================
+# 1. JSONL İSTEK VE CEVAP SATIRLARI
+# =================================================================
+
+# LangChain mesaj tipleri -> Chat Completions rolleri
+_ROLES = {"human": "user", "ai": "assistant", "system": "system"}
+
+def chat_request_line(custom_id: str, messages, model: str, temperature: float = 0) -> dict:
+    """LangChain mesajlarından tek bir Chat Completions batch isteği satırı oluşturur."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": CHAT_COMPLETIONS_ENDPOINT,
+        "body": {
+            "model": model,
+            "temperature": temperature,
+            "messages": [{"role": _ROLES.get(m.type, "user"), "content": m.content} for m in messages],
+        },
+    }
+
+def response_content(line: dict) -> Tuple[str, dict]:
+    """
+    Çıktı/hata dosyasındaki bir satırdan (cevap metni, token kullanımı) döndürür.
+    İstek başarısız olduysa BatchRequestError fırlatır.
+    """
+    if line.get("error"):
+        raise BatchRequestError(json.dumps(line["error"], ensure_ascii=False))
+    response = line.get("response") or {}
+    body = response.get("body") or {}
+    if response.get("status_code") != 200:
+        message = (body.get("error") or {}).get("message") or body
+        raise BatchRequestError(f"{response.get('status_code')}: {message}")
+    try:
+        content = body["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        raise BatchRequestError("Cevapta 'choices[0].message.content' bulunamadı.")
+    return content, body.get("usage") or {}
+
+# =================================================================
+# 2. BATCH API İSTEMCİSİ
+# =================================================================
+
+class BatchAPIClient:
+    """
+    OpenAI Batch API'si (dosya yükleme, batch oluşturma/sorgulama, çıktı indirme)
+    için küçük bir HTTP istemcisi. Aynı uç noktaları sunan yerel sahte sunucu
+    (src.batch_server) ile de çalışır.
+    """
+
+    def __init__(self, base_url: Optional[str] = BATCH_API_BASE_URL, api_key: Optional[str] = None,
+                 timeout: float = 300.0):
+        self.base_url = (base_url or OPENAI_BASE_URL).rstrip("/")
+        if api_key is None:
+            # Yerel sunucu anahtar istemez; OpenAI için anahtar zorunludur
+            api_key = require_openai_api_key() if base_url is None else (OPENAI_API_KEY or "local")
+        self.api_key = api_key
+        self.timeout = timeout
+        parts = urllib.parse.urlsplit(self.base_url)
+        self._scheme = parts.scheme
+        self._netloc = parts.netloc
+        self._prefix = parts.path.rstrip("/")
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._scheme == "https":
+            return http.client.HTTPSConnection(self._netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(self._netloc, timeout=self.timeout)
+
+    def _request(self, method: str, path: str, body: bytes = None, content_type: str = None) -> bytes:
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        if content_type:
+            headers["Content-Type"] = content_type
+        connection = self._connection()
+        try:
+            connection.request(method, self._prefix + path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        finally:
+            connection.close()
+        if response.status >= 300:
+            raise BatchAPIError(response.status, data.decode("utf-8", errors="replace")[:500])
+        return data
+
+    def _json(self, method: str, path: str, payload: dict = None) -> dict:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        return json.loads(self._request(method, path, body, "application/json" if body else None))
+
+    def upload_file(self, path: str) -> str:
+        """JSONL dosyasını 'batch' amaçlı yükler; dosya id'sini döndürür."""
+        boundary = uuid.uuid4().hex
+        with open(path, "rb") as f:
+            content = f.read()
+        body = b"".join([
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"purpose\"\r\n\r\nbatch\r\n".encode(),
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{os.path.basename(path)}\"\r\n"
+            f"Content-Type: application/jsonl\r\n\r\n".encode(),
+            content,
+            f"\r\n--{boundary}--\r\n".encode(),
+        ])
+        data = self._request("POST", "/files", body, f"multipart/form-data; boundary={boundary}")
+        return json.loads(data)["id"]
+
+    def create_batch(self, input_file_id: str, metadata: dict = None) -> dict:
+        return self._json("POST", "/batches", {
+            "input_file_id": input_file_id,
+            "endpoint": CHAT_COMPLETIONS_ENDPOINT,
+            "completion_window": BATCH_COMPLETION_WINDOW,
+            "metadata": metadata or {},
+        })
+
+    def retrieve_batch(self, batch_id: str) -> dict:
+        return self._json("GET", f"/batches/{batch_id}")
+
+    def cancel_batch(self, batch_id: str) -> dict:
+        return self._json("POST", f"/batches/{batch_id}/cancel")
+
+    def file_content(self, file_id: str) -> bytes:
+        return self._request("GET", f"/files/{file_id}/content")
+
+    def output_lines(self, batch: dict) -> List[dict]:
+        """Bitmiş bir batch'in çıktı ve hata dosyalarındaki tüm satırlar."""
+        lines = []
+        for key in ("output_file_id", "error_file_id"):
+            if batch.get(key):
+                for raw in self.file_content(batch[key]).splitlines():
+                    if raw.strip():
+                        lines.append(json.loads(raw))
+        return lines
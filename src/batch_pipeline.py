@@ -0,0 +1,585 @@
+# src/batch_pipeline.py
+import os
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import hashlib
+import logging
+import argparse
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from langchain_core.runnables import RunnableLambda
+
+from src.config import (
+    LLM_MODEL,
+    LLM_CACHE_ENABLED,
+    CALL_METRICS_ENABLED,
+    CHECKPOINTS_ENABLED,
+    SEGMENTATION_WINDOWING_ENABLED,
+    SEGMENTATION_WINDOW_MIN_CHARS,
+    BATCH_POLL_SECONDS,
+    BATCH_MAX_WAIT_SECONDS,
+    BATCH_MAX_CALLS,
+    BATCH_MAX_REQUESTS_PER_FILE,
+    BATCH_MAX_FILE_BYTES,
+    BATCH_MAX_ATTEMPTS,
+    BATCH_LEASE_SECONDS,
+    BATCH_RETRIEVAL_CHUNK_SIZE,
+    BATCH_WRITE_CHUNK_SIZE,
+    BATCH_WORK_PATH,
+    BATCH_KEEP_FILES
+)
+from src.models import SessionLocal, Segment, TranscriptSegments, AnalysisResult, create_db_and_tables
+from src.metrics import REGISTRY, CallTrace
+from src.llm_cache import get_llm_cache, prompt_template_hash, input_hash
+from src.segmentation import split_turns, build_windows, merge_window_segments
+from src.checkpoints import CallCheckpointer, CALL_LEVEL
+from src.call_queue import new_worker_id, claim_calls, renew_leases, owned_calls
+from src.batch_api import BatchAPIClient, BatchRequestError, chat_request_line, response_content, TERMINAL_STATUSES
+from src.compliance_chain import (
+    SearchQuery,
+    create_segmentation_chain,
+    create_query_transformation_chain,
+    create_analysis_chain,
+    get_retrieval_batcher,
+    reload_index_if_changed,
+    warm_up,
+    gate_segments,
+    cached_search_queries,
+    remember_search_queries,
+    assemble_contexts,
+    load_checkpoint,
+    save_checkpoint,
+    context_record,
+    analyzed_segment_result,
+    skipped_segment_result
+)
+from src.main import write_call_results
+
+log = logging.getLogger("batch_pipeline")
+
+_STATE_FILENAME = "state.json"
+# Yeniden gönderilmeyen (sonucu beklenmeyecek) batch durumları
+_DEAD_STATUSES = ("failed", "cancelled", "expired")
+# Toplu talepte tek sorguda alınan çağrı sayısı
+_CLAIM_CHUNK_SIZE = 1000
+
+# =================================================================
+# 1. AŞAMA ŞABLONLARI (PROMPT -> JSONL İSTEĞİ, CEVAP -> PYDANTIC)
+# =================================================================
+
+class StageTemplate:
+    """
+    Bir LLM aşamasının prompt'u ve çıktı ayrıştırıcısı. İstekler canlı zincirlerle
+    aynı prompt'tan üretilir; cevaplar aynı önbellek anahtarıyla LLM önbelleğine yazılır.
+    """
+
+    def __init__(self, stage: str, chain, output_model):
+        self.stage = stage
+        self.prompt = chain.first
+        self.parser = chain.last
+        self.output_model = output_model
+        self.template_hash = prompt_template_hash(chain)
+
+    def request_line(self, custom_id: str, inputs: dict) -> dict:
+        return chat_request_line(custom_id, self.prompt.format_messages(**inputs), LLM_MODEL)
+
+    def cache_key(self, inputs: dict) -> tuple:
+        # Canlı yoldaki CachedChain anahtarıyla aynı (OpenAI modeli, sıcaklık 0)
+        return (self.stage, self.template_hash, LLM_MODEL, 0.0, input_hash(inputs))
+
+def stage_templates() -> dict:
+    # Model gerekmez: prompt ve parser, yer tutucu bir adımla zincirlenir
+    placeholder = RunnableLambda(lambda x: x)
+    return {
+        "segmentation": StageTemplate("segmentation", create_segmentation_chain(llm=placeholder), TranscriptSegments),
+        "query_transform": StageTemplate("query_transform", create_query_transformation_chain(llm=placeholder), SearchQuery),
+        "analysis": StageTemplate("analysis", create_analysis_chain(llm=placeholder), AnalysisResult),
+    }
+
+# =================================================================
+# 2. TOPLU ÇALIŞTIRMA: JSONL DOSYALARI, GÖNDERME VE SORGULAMA
+# =================================================================
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class BatchRun:
+    """
+    Bir toplu çalıştırmanın klasörü (aşama başına JSONL istek dosyaları) ve durumu
+    (state.json: worker kimliği ve gönderilen batch'ler). Çalıştırma yarıda kalırsa
+    aynı klasörle devam edilir: içeriği aynı olan istek dosyası için yeni batch
+    açılmaz, önceden gönderilen batch'in sonucu beklenir.
+    """
+
+    def __init__(self, client: BatchAPIClient, run_dir: str, state: dict, poll_seconds: float = BATCH_POLL_SECONDS):
+        self.client = client
+        self.run_dir = run_dir
+        self.state = state
+        self.poll_seconds = poll_seconds
+        self.stats = defaultdict(lambda: {"requests": 0, "cached": 0, "succeeded": 0, "failed": 0, "batches": 0})
+        self.on_poll = None # Sonuç beklenirken ve yerel adımlar arasında çağrılır (örn: kiralama yenileme)
+
+    @classmethod
+    def create(cls, client: BatchAPIClient, root: str = BATCH_WORK_PATH, **kwargs) -> "BatchRun":
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        run = cls(client, os.path.join(root, run_id), {"run_id": run_id, "worker_id": new_worker_id(), "batches": {}}, **kwargs)
+        os.makedirs(run.run_dir, exist_ok=True)
+        run.save_state()
+        return run
+
+    @classmethod
+    def resume(cls, client: BatchAPIClient, run_dir: str, **kwargs) -> "BatchRun":
+        with open(os.path.join(run_dir, _STATE_FILENAME), "r", encoding="utf-8") as f:
+            return cls(client, run_dir, json.load(f), **kwargs)
+
+    @property
+    def worker_id(self) -> str:
+        return self.state["worker_id"]
+
+    def save_state(self):
+        path = os.path.join(self.run_dir, _STATE_FILENAME)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def _write_request_files(self, template: StageTemplate, requests: Dict[str, dict], attempt: int) -> List[str]:
+        """İstekleri sağlayıcı limitlerini (istek sayısı, dosya boyutu) aşmayan JSONL dosyalarına böler."""
+        paths = []
+        f = None
+        count = size = 0
+        try:
+            for custom_id, inputs in requests.items():
+                line = (json.dumps(template.request_line(custom_id, inputs), ensure_ascii=False) + "\n").encode("utf-8")
+                if f is None or count >= BATCH_MAX_REQUESTS_PER_FILE or size + len(line) > BATCH_MAX_FILE_BYTES:
+                    if f is not None:
+                        f.close()
+                    paths.append(os.path.join(self.run_dir, f"{template.stage}-{attempt}-{len(paths)}.jsonl"))
+                    f = open(paths[-1], "wb")
+                    count = size = 0
+                f.write(line)
+                count += 1
+                size += len(line)
+        finally:
+            if f is not None:
+                f.close()
+        return paths
+
+    async def _submit(self, template: StageTemplate, path: str, key: str) -> str:
+        digest = await asyncio.to_thread(_file_sha256, path)
+        entry = self.state["batches"].get(key)
+        if entry and entry["sha256"] == digest:
+            batch = await asyncio.to_thread(self.client.retrieve_batch, entry["batch_id"])
+            if batch["status"] not in _DEAD_STATUSES:
+                log.info(f"'{key}' için önceden gönderilen batch {entry['batch_id']} bekleniyor.")
+                return entry["batch_id"]
+        file_id = await asyncio.to_thread(self.client.upload_file, path)
+        batch = await asyncio.to_thread(
+            self.client.create_batch, file_id, {"stage": template.stage, "run_id": self.state["run_id"]}
+        )
+        self.state["batches"][key] = {"batch_id": batch["id"], "sha256": digest, "input_file_id": file_id}
+        self.save_state()
+        self.stats[template.stage]["batches"] += 1
+        REGISTRY.inc("compliance_batch_jobs_total", stage=template.stage)
+        log.info(f"'{key}' batch'i gönderildi: {batch['id']}")
+        return batch["id"]
+
+    def heartbeat(self):
+        """
+        Uzun süren her adımdan sonra çağrılır: batch beklerken olduğu gibi yerel
+        adımlar (filtre, önbellek, retrieval, bağlam derleme) sırasında da
+        kiralamaların süresi dolmamalıdır.
+        """
+        if self.on_poll is not None:
+            self.on_poll()
+
+    async def _wait(self, batch_id: str) -> dict:
+        start = time.monotonic()
+        last_status = None
+        while True:
+            batch = await asyncio.to_thread(self.client.retrieve_batch, batch_id)
+            if batch["status"] != last_status:
+                last_status = batch["status"]
+                log.info(f"Batch {batch_id}: {last_status} {batch.get('request_counts') or ''}")
+            if batch["status"] in TERMINAL_STATUSES:
+                return batch
+            if time.monotonic() - start > BATCH_MAX_WAIT_SECONDS:
+                log.error(f"Batch {batch_id} {BATCH_MAX_WAIT_SECONDS} sn içinde bitmedi, iptal ediliyor.")
+                await asyncio.to_thread(self.client.cancel_batch, batch_id)
+                return batch
+            self.heartbeat()
+            await asyncio.sleep(self.poll_seconds)
+
+    async def run_stage(self, template: StageTemplate, requests: Dict[str, dict],
+                        traces: Dict[str, CallTrace] = None) -> Dict[str, object]:
+        """
+        Bir aşamanın tüm isteklerini çalıştırır: önce LLM önbelleğine bakılır, kalanlar
+        JSONL dosyaları halinde batch olarak gönderilir ve sonuçları beklenir.
+        Başarısız istekler BATCH_MAX_ATTEMPTS'e kadar yeni bir batch ile tekrar denenir.
+        {custom_id: çıktı modeli veya hata} döndürür; token kullanımı çağrı izlerine yazılır.
+        """
+        stage = template.stage
+        stats = self.stats[stage]
+        stats["requests"] += len(requests)
+        traces = traces or {}
+        cache = get_llm_cache() if LLM_CACHE_ENABLED else None
+        results, pending, errors = {}, {}, {}
+        for custom_id, inputs in requests.items():
+            cached = cache.get(template.cache_key(inputs)) if cache is not None else None
+            if cached is not None:
+                try:
+                    results[custom_id] = template.output_model.model_validate_json(cached)
+                    continue
+                except Exception as e:
+                    log.warning(f"'{stage}' önbellek kaydı okunamadı, batch'e eklenecek: {e}")
+            pending[custom_id] = inputs
+        stats["cached"] += len(results)
+        if results:
+            REGISTRY.inc("compliance_batch_requests_total", len(results), stage=stage, outcome="cached")
+        log.info(f"'{stage}': {len(requests)} istek, {len(results)} önbellekten, {len(pending)} batch ile gönderilecek.")
+
+        for attempt in range(1, BATCH_MAX_ATTEMPTS + 1):
+            if not pending:
+                break
+            paths = self._write_request_files(template, pending, attempt)
+            batch_ids = [await self._submit(template, path, f"{stage}-{attempt}-{part}") for part, path in enumerate(paths)]
+            outputs = {}
+            for batch_id in batch_ids:
+                batch = await self._wait(batch_id)
+                for line in await asyncio.to_thread(self.client.output_lines, batch):
+                    outputs[line.get("custom_id")] = line
+
+            failed = {}
+            for custom_id, inputs in pending.items():
+                try:
+                    line = outputs.get(custom_id)
+                    if line is None:
+                        raise BatchRequestError("Batch çıktısında bu isteğin sonucu yok.")
+                    content, usage = response_content(line)
+                    result = template.parser.parse(content)
+                except Exception as e:
+                    failed[custom_id] = inputs
+                    errors[custom_id] = e
+                    continue
+                results[custom_id] = result
+                prompt_tokens, completion_tokens = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+                REGISTRY.inc("compliance_llm_tokens_total", prompt_tokens, stage=stage, kind="prompt")
+                REGISTRY.inc("compliance_llm_tokens_total", completion_tokens, stage=stage, kind="completion")
+                if custom_id in traces:
+                    traces[custom_id].add_tokens(stage, prompt_tokens, completion_tokens)
+                if cache is not None:
+                    cache.put(template.cache_key(inputs), result.model_dump_json())
+            succeeded = len(pending) - len(failed)
+            stats["succeeded"] += succeeded
+            REGISTRY.inc("compliance_batch_requests_total", succeeded, stage=stage, outcome="succeeded")
+            if failed:
+                log.warning(f"'{stage}' deneme {attempt}/{BATCH_MAX_ATTEMPTS}: {len(failed)} istek başarısız.")
+            pending = failed
+
+        for custom_id in pending:
+            results[custom_id] = errors[custom_id]
+        stats["failed"] += len(pending)
+        if pending:
+            REGISTRY.inc("compliance_batch_requests_total", len(pending), stage=stage, outcome="failed")
+        return results
+
+# =================================================================
+# 3. AŞAMALAR ARASI AKIŞ (TÜM ÇAĞRILAR İÇİN TOPLU)
+# =================================================================
+
+async def _segment_calls(run: BatchRun, template: StageTemplate, calls: List[tuple],
+                         checkpoints: dict, traces: dict, failures: dict) -> Dict[int, list]:
+    """Adım 1: Ara kaydı olmayan çağrılar (uzunsa pencereleri) tek segmentasyon aşamasında işlenir."""
+    segments_by_call = {}
+    requests, owners = {}, {}
+    for call_pk, _, transcript in calls:
+        saved = checkpoints[call_pk].get("segmentation") if checkpoints[call_pk] else None
+        if saved is not None:
+            segments_by_call[call_pk] = [Segment(**segment) for segment in saved]
+            continue
+        windows = []
+        if SEGMENTATION_WINDOWING_ENABLED and len(transcript) > SEGMENTATION_WINDOW_MIN_CHARS:
+            windows = build_windows(split_turns(transcript))
+        for w, window in enumerate(windows if len(windows) > 1 else [transcript]):
+            custom_id = f"seg-{call_pk}-{w}"
+            requests[custom_id] = {"transcript": window}
+            owners[custom_id] = call_pk
+
+    results = await run.run_stage(template, requests, {cid: traces[pk] for cid, pk in owners.items()})
+    window_results = defaultdict(list)
+    for custom_id, call_pk in owners.items():
+        window_results[call_pk].append(results[custom_id])
+    for call_pk, outputs in window_results.items():
+        succeeded = [r.segments for r in outputs if not isinstance(r, Exception)]
+        if len(outputs) > 1:
+            REGISTRY.inc("compliance_segmentation_windows_total", len(succeeded), outcome="segmented")
+            if len(succeeded) < len(outputs):
+                REGISTRY.inc("compliance_segmentation_windows_total", len(outputs) - len(succeeded), outcome="failed")
+        if len(succeeded) < len(outputs):
+            # Canlı akıştaki gibi: eksik pencereyle segmentlenen çağrı 'failed' olur
+            failures[call_pk] = next(r for r in outputs if isinstance(r, Exception))
+            continue
+        segments = succeeded[0] if len(outputs) == 1 else merge_window_segments(succeeded)
+        segments_by_call[call_pk] = segments
+        if segments:
+            await save_checkpoint(checkpoints[call_pk], "segmentation", {CALL_LEVEL: [s.model_dump() for s in segments]})
+    return segments_by_call
+
+async def analyze_calls(run: BatchRun, templates: dict, calls: List[tuple], traces: dict) -> Dict[int, object]:
+    """
+    Tüm çağrılar için segmentasyon -> ilgililik filtresi -> sorgu zenginleştirme ->
+    yerel toplu retrieval -> analiz akışı; her LLM aşaması tek bir toplu (batch) işlemdir.
+    Canlı akışla aynı ara kayıtları kullanır. {call_pk: segment sonuçları veya hata} döndürür.
+    """
+    checkpoints = {}
+    for call_pk, _, transcript in calls:
+        checkpoint = CallCheckpointer(call_pk, transcript) if CHECKPOINTS_ENABLED else None
+        checkpoints[call_pk] = await load_checkpoint(checkpoint)
+    failures = {}
+
+    # --- ADIM 1: Segmentasyon ---
+    segments_by_call = await _segment_calls(run, templates["segmentation"], calls, checkpoints, traces, failures)
+    run.heartbeat()
+    log.info(f"Adım 1 tamamlandı: {sum(len(s) for s in segments_by_call.values())} segment, {len(failures)} başarısız çağrı.")
+
+    # --- ADIM 1.2: Yerel ilgililik filtresi (BATCH_RETRIEVAL_CHUNK_SIZE segmentlik parçalar halinde) ---
+    flat = [(call_pk, i) for call_pk, segments in segments_by_call.items() for i in range(len(segments))]
+    scores = {}
+    for start in range(0, len(flat), BATCH_RETRIEVAL_CHUNK_SIZE):
+        chunk = flat[start:start + BATCH_RETRIEVAL_CHUNK_SIZE]
+        decisions = await gate_segments([segments_by_call[pk][i] for pk, i in chunk])
+        if decisions is None:
+            # Filtre kapalı ya da çalışmıyor: kalan segmentler de puanlanmadan analiz edilir
+            break
+        scores.update(zip(chunk, decisions))
+        run.heartbeat()
+    results = defaultdict(list)
+    candidates = []
+    for key in flat:
+        call_pk, i = key
+        if key in scores and not scores[key]["relevant"]:
+            results[call_pk].append(skipped_segment_result(i, segments_by_call[call_pk][i], scores[key]))
+            continue
+        saved = checkpoints[call_pk].get("analysis", i + 1) if checkpoints[call_pk] else None
+        if saved is not None:
+            results[call_pk].append(saved)
+        else:
+            candidates.append(key)
+
+    # --- ADIM 1.5: Sorgu zenginleştirme (ara kayıt -> anlamsal önbellek -> batch) ---
+    search_queries = {}
+    for call_pk, i in candidates:
+        saved = checkpoints[call_pk].get("search_query", i + 1) if checkpoints[call_pk] else None
+        if saved is not None:
+            search_queries[(call_pk, i)] = saved["search_query"]
+    pending = [key for key in candidates if key not in search_queries]
+    new_queries = {}
+    for start in range(0, len(pending), BATCH_RETRIEVAL_CHUNK_SIZE):
+        chunk = pending[start:start + BATCH_RETRIEVAL_CHUNK_SIZE]
+        cached = await cached_search_queries([segments_by_call[pk][i] for pk, i in chunk])
+        new_queries.update({chunk[k]: q for k, q in cached.items()})
+        run.heartbeat()
+    to_transform = {f"q-{pk}-{i}": (pk, i) for pk, i in pending if (pk, i) not in new_queries}
+    transformed = await run.run_stage(
+        templates["query_transform"],
+        {
+            cid: {"customer_query": segments_by_call[pk][i].customer_query,
+                  "agent_response": segments_by_call[pk][i].agent_response}
+            for cid, (pk, i) in to_transform.items()
+        },
+        {cid: traces[pk] for cid, (pk, _) in to_transform.items()}
+    )
+    generated = {}
+    for cid, key in to_transform.items():
+        if isinstance(transformed[cid], Exception):
+            log.error(f"Çağrı {key[0]} segment {key[1] + 1} sorgu zenginleştirme hatası: {transformed[cid]}")
+            REGISTRY.inc("compliance_segments_total", outcome="query_transform_failed")
+        else:
+            generated[key] = transformed[cid].search_query
+    await remember_search_queries([segments_by_call[pk][i] for pk, i in generated], list(generated.values()))
+    new_queries.update(generated)
+    for call_pk in {pk for pk, _ in new_queries}:
+        await save_checkpoint(checkpoints[call_pk], "search_query", {
+            i + 1: {"search_query": q} for (pk, i), q in new_queries.items() if pk == call_pk
+        })
+    search_queries.update(new_queries)
+    run.heartbeat()
+
+    # --- ADIM 2: Yerel toplu retrieval ve bağlam derleme ---
+    batcher = await asyncio.to_thread(get_retrieval_batcher)
+    contexts = {}
+    for key in search_queries:
+        call_pk, i = key
+        saved = checkpoints[call_pk].get("context", i + 1) if checkpoints[call_pk] else None
+        if saved is not None and saved["index_version"] == batcher.index_version:
+            contexts[key] = saved
+    to_retrieve = [key for key in sorted(search_queries) if key not in contexts]
+    log.info(f"Adım 2: {len(to_retrieve)} sorgu için yerel toplu retrieval...")
+    for start in range(0, len(to_retrieve), BATCH_RETRIEVAL_CHUNK_SIZE):
+        chunk = to_retrieve[start:start + BATCH_RETRIEVAL_CHUNK_SIZE]
+        retrieved = await batcher.retrieve_many_tolerant([search_queries[key] for key in chunk])
+        # Araması başarısız olan segmentler canlı akıştaki gibi atlanır
+        chunk = [key for key, docs in zip(chunk, retrieved) if docs is not None]
+        rag_results = [docs for docs in retrieved if docs is not None]
+        assembled = await assemble_contexts([search_queries[key] for key in chunk], rag_results) if chunk else []
+        new_contexts = {key: context_record(a, batcher.index_version) for key, a in zip(chunk, assembled)}
+        for call_pk in {pk for pk, _ in new_contexts}:
+            await save_checkpoint(checkpoints[call_pk], "context", {
+                i + 1: c for (pk, i), c in new_contexts.items() if pk == call_pk
+            })
+        contexts.update(new_contexts)
+        run.heartbeat()
+
+    # --- ADIM 3: Analiz ---
+    to_analyze = {f"a-{pk}-{i}": (pk, i) for pk, i in sorted(contexts)}
+    analyzed = await run.run_stage(
+        templates["analysis"],
+        {
+            cid: {"rag_context": contexts[key]["context"],
+                  "customer_query": segments_by_call[key[0]][key[1]].customer_query,
+                  "agent_response": segments_by_call[key[0]][key[1]].agent_response}
+            for cid, key in to_analyze.items()
+        },
+        {cid: traces[pk] for cid, (pk, _) in to_analyze.items()}
+    )
+    new_results = defaultdict(dict)
+    for cid, (call_pk, i) in to_analyze.items():
+        if isinstance(analyzed[cid], Exception):
+            log.error(f"Çağrı {call_pk} segment {i + 1} analiz hatası: {analyzed[cid]}")
+            REGISTRY.inc("compliance_segments_total", outcome="analysis_failed")
+            continue
+        REGISTRY.inc("compliance_segments_total", outcome="analyzed")
+        score = scores[(call_pk, i)]["score"] if (call_pk, i) in scores else None
+        result = analyzed_segment_result(
+            i, segments_by_call[call_pk][i], search_queries[(call_pk, i)], contexts[(call_pk, i)], analyzed[cid], score
+        )
+        new_results[call_pk][i + 1] = result
+        results[call_pk].append(result)
+    for call_pk, by_segment in new_results.items():
+        await save_checkpoint(checkpoints[call_pk], "analysis", by_segment)
+
+    outcome = {}
+    for call_pk, _, _ in calls:
+        if call_pk in failures:
+            outcome[call_pk] = failures[call_pk]
+            continue
+        call_results = sorted(results.get(call_pk, []), key=lambda entry: entry["segment_index"])
+        traces[call_pk].segments = len(call_results)
+        traces[call_pk].segments_skipped = sum(1 for r in call_results if r.get("skipped_reason"))
+        outcome[call_pk] = call_results
+    return outcome
+
+# =================================================================
+# 4. TOPLU ÇALIŞTIRMA (TALEP -> AŞAMALAR -> TOPLU YAZIM)
+# =================================================================
+
+def _claim_all(db_session, worker_id: str, limit: int) -> List[tuple]:
+    calls = []
+    while len(calls) < limit:
+        claimed = claim_calls(db_session, worker_id, min(_CLAIM_CHUNK_SIZE, limit - len(calls)), BATCH_LEASE_SECONDS)
+        if not claimed:
+            break
+        calls.extend(claimed)
+    return calls
+
+async def run_batch_pipeline(limit: int = BATCH_MAX_CALLS, resume_dir: Optional[str] = None,
+                             client: BatchAPIClient = None, poll_seconds: float = BATCH_POLL_SECONDS) -> dict:
+    """
+    Bekleyen çağrıları (en fazla 'limit') kiralayıp offline toplu modda işler ve
+    sonuçları BATCH_WRITE_CHUNK_SIZE çağrılık toplu INSERT'lerle yazar.
+    resume_dir verilirse yarıda kalan çalıştırmanın çağrıları ve batch'leriyle devam edilir.
+    """
+    await asyncio.to_thread(create_db_and_tables)
+    await asyncio.to_thread(warm_up)
+    try:
+        await asyncio.to_thread(reload_index_if_changed, True)
+    except Exception as e:
+        log.warning(f"Yeni index sürümü yüklenemedi, mevcut sürümle devam ediliyor: {e}")
+    client = client or BatchAPIClient()
+    if resume_dir:
+        run = BatchRun.resume(client, resume_dir, poll_seconds=poll_seconds)
+    else:
+        run = BatchRun.create(client, poll_seconds=poll_seconds)
+    db_session = SessionLocal()
+    try:
+        if resume_dir:
+            calls = owned_calls(db_session, run.worker_id, BATCH_LEASE_SECONDS)
+        else:
+            calls = _claim_all(db_session, run.worker_id, limit)
+        if not calls:
+            log.info("Toplu işlenecek çağrı bulunamadı.")
+            shutil.rmtree(run.run_dir, ignore_errors=True)
+            return {"run_dir": None, "calls": 0}
+        log.info(f"Toplu çalıştırma '{run.state['run_id']}': {len(calls)} çağrı işlenecek.")
+
+        call_pks = [call_pk for call_pk, _, _ in calls]
+        last_renewal = time.monotonic()
+
+        def renew():
+            # Batch sonuçları ve yerel adımlar saatler sürebilir: kiralamalar her adımdan sonra yenilenir
+            nonlocal last_renewal
+            if time.monotonic() - last_renewal < BATCH_LEASE_SECONDS / 3:
+                return
+            try:
+                renew_leases(db_session, run.worker_id, call_pks, BATCH_LEASE_SECONDS)
+                last_renewal = time.monotonic()
+            except Exception as e:
+                log.error(f"Kiralama yenilenirken DB hatası: {e}")
+                db_session.rollback()
+
+        run.on_poll = renew
+        traces = {call_pk: CallTrace() for call_pk in call_pks}
+        outcome = await analyze_calls(run, stage_templates(), calls, traces)
+
+        items = [(call_pk, call_id, outcome[call_pk], traces[call_pk] if CALL_METRICS_ENABLED else None)
+                 for call_pk, call_id, _ in calls]
+        for start in range(0, len(items), BATCH_WRITE_CHUNK_SIZE):
+            run.heartbeat()
+            write_call_results(db_session, run.worker_id, items[start:start + BATCH_WRITE_CHUNK_SIZE])
+    finally:
+        db_session.close()
+
+    failed = sum(1 for result in outcome.values() if isinstance(result, Exception))
+    summary = {
+        "run_dir": run.run_dir,
+        "calls": len(calls),
+        "failed_calls": failed,
+        "segments": sum(len(r) for r in outcome.values() if not isinstance(r, Exception)),
+        "stages": {stage: dict(stats) for stage, stats in run.stats.items()},
+    }
+    if failed == 0 and not BATCH_KEEP_FILES:
+        shutil.rmtree(run.run_dir, ignore_errors=True)
+        summary["run_dir"] = None
+    else:
+        log.info(f"Çalıştırma dosyaları '{run.run_dir}' klasöründe tutuldu.")
+    return summary
+
+def run_batch_mode(limit: int = BATCH_MAX_CALLS, resume_dir: Optional[str] = None,
+                   local_server: bool = False, poll_seconds: Optional[float] = None) -> dict:
+    """Komut satırı girişi; local_server=True ise yerel sahte Batch API sunucusu kullanılır."""
+    client = None
+    if local_server:
+        from src.batch_server import start_batch_server
+        _, base_url = start_batch_server(port=0)
+        client = BatchAPIClient(base_url=base_url, api_key="local")
+        poll_seconds = poll_seconds if poll_seconds is not None else 1.0
+    return asyncio.run(run_batch_pipeline(
+        limit, resume_dir, client, poll_seconds if poll_seconds is not None else BATCH_POLL_SECONDS
+    ))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bekleyen çağrıları offline toplu (Batch API) modda işler.")
+    parser.add_argument("--limit", type=int, default=BATCH_MAX_CALLS, help="İşlenecek en fazla çağrı")
+    parser.add_argument("--resume", metavar="KLASÖR", default=None, help="Yarıda kalan çalıştırmaya devam et")
+    parser.add_argument("--local-server", action="store_true", help="Yerel sahte Batch API sunucusunu kullan (offline)")
+    parser.add_argument("--poll-seconds", type=float, default=None)
+    args = parser.parse_args()
+    print(json.dumps(run_batch_mode(args.limit, args.resume, args.local_server, args.poll_seconds), indent=2))
@@ -0,0 +1,224 @@
+# src/batch_server.py
+import os
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import tempfile
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from src.config import BATCH_SERVER_HOST, BATCH_SERVER_PORT
+from src.fake_llm import build_fake_response
+
+log = logging.getLogger("batch_server")
+
+# =================================================================
+# 1. SAHTE BATCH İŞLEYİCİ
+# =================================================================
+
+class LocalBatchStore:
+    """
+    OpenAI Batch API'sinin dosya ve batch nesnelerini taklit eder. Her batch ayrı bir
+    thread'de 'completion_delay' saniye bekledikten sonra sahte sohbet modelinin
+    cevap üreticisiyle (src.fake_llm) işlenir; 'failure_rate' oranındaki istekler
+    500 hatasıyla döner. Dosyalar 'directory' altında saklanır.
+    """
+
+    def __init__(self, directory: str, completion_delay: float = 1.0, failure_rate: float = 0.0, seed: int = 0):
+        self.directory = directory
+        self.completion_delay = completion_delay
+        self.failure_rate = failure_rate
+        self.files = {}
+        self.batches = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def add_file(self, filename: str, content: bytes, purpose: str) -> dict:
+        file_id = f"file-{uuid.uuid4().hex}"
+        with open(os.path.join(self.directory, file_id), "wb") as f:
+            f.write(content)
+        obj = {
+            "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+            "filename": filename, "purpose": purpose, "status": "processed",
+        }
+        with self._lock:
+            self.files[file_id] = obj
+        return obj
+
+    def file_content(self, file_id: str) -> bytes:
+        if file_id not in self.files:
+            raise KeyError(file_id)
+        with open(os.path.join(self.directory, file_id), "rb") as f:
+            return f.read()
+
+    def create_batch(self, request: dict) -> dict:
+        if request.get("input_file_id") not in self.files:
+            raise KeyError(request.get("input_file_id"))
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        batch = {
+            "id": batch_id, "object": "batch", "endpoint": request.get("endpoint"),
+            "input_file_id": request["input_file_id"], "completion_window": request.get("completion_window", "24h"),
+            "status": "validating", "output_file_id": None, "error_file_id": None,
+            "created_at": int(time.time()), "completed_at": None, "metadata": request.get("metadata") or {},
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        with self._lock:
+            self.batches[batch_id] = batch
+        threading.Thread(target=self._process, args=(batch_id,), daemon=True).start()
+        return dict(batch)
+
+    def get_batch(self, batch_id: str) -> dict:
+        with self._lock:
+            return dict(self.batches[batch_id])
+
+    def cancel_batch(self, batch_id: str) -> dict:
+        with self._lock:
+            batch = self.batches[batch_id]
+            if batch["status"] not in ("completed", "failed", "expired", "cancelled"):
+                batch["status"] = "cancelling"
+            return dict(batch)
+
+    def _respond(self, request: dict) -> dict:
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            return {
+                "id": f"batch_req_{uuid.uuid4().hex}", "custom_id": request["custom_id"], "error": None,
+                "response": {"status_code": 500, "body": {"error": {"message": "Internal server error (fake batch server)"}}},
+            }
+        prompt = "\n".join(str(m.get("content", "")) for m in request["body"]["messages"])
+        content = build_fake_response(prompt)
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(content) // 4)
+        return {
+            "id": f"batch_req_{uuid.uuid4().hex}", "custom_id": request["custom_id"], "error": None,
+            "response": {
+                "status_code": 200,
+                "body": {
+                    "object": "chat.completion",
+                    "model": request["body"].get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                },
+            },
+        }
+
+    def _process(self, batch_id: str):
+        with self._lock:
+            batch = self.batches[batch_id]
+            batch["status"] = "in_progress"
+        time.sleep(self.completion_delay)
+        lines = [json.loads(raw) for raw in self.file_content(batch["input_file_id"]).splitlines() if raw.strip()]
+        outputs = [self._respond(request) for request in lines]
+        failed = sum(1 for line in outputs if line["response"]["status_code"] != 200)
+        content = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in outputs).encode("utf-8")
+        output_file = self.add_file(f"{batch_id}_output.jsonl", content, "batch_output")
+        with self._lock:
+            cancelled = batch["status"] == "cancelling"
+            batch.update({
+                "status": "cancelled" if cancelled else "completed",
+                "output_file_id": output_file["id"],
+                "completed_at": int(time.time()),
+                "request_counts": {"total": len(lines), "completed": len(lines) - failed, "failed": failed},
+            })
+        log.info(f"Batch {batch_id}: {len(lines)} istek işlendi ({failed} hatalı).")
+
+# =================================================================
+# 2. HTTP UÇ NOKTALARI (/v1/files, /v1/batches)
+# =================================================================
+
+def _make_handler(store: LocalBatchStore):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            log.debug(format % args)
+
+        def _send(self, status_code: int, payload=None, raw: bytes = None):
+            body = raw if raw is not None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/octet-stream" if raw is not None else "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def _route(self) -> list:
+            parts = [p for p in self.path.split("?")[0].split("/") if p]
+            return parts[1:] if parts[:1] == ["v1"] else parts
+
+        def do_GET(self):
+            route = self._route()
+            try:
+                if len(route) == 3 and route[0] == "files" and route[2] == "content":
+                    return self._send(200, raw=store.file_content(route[1]))
+                if len(route) == 2 and route[0] == "batches":
+                    return self._send(200, store.get_batch(route[1]))
+            except KeyError as e:
+                return self._send(404, {"error": {"message": f"Bulunamadı: {e}"}})
+            self._send(404, {"error": {"message": "Bilinmeyen adres"}})
+
+        def do_POST(self):
+            route = self._route()
+            body = self._body()
+            try:
+                if route == ["files"]:
+                    message = BytesParser(policy=HTTP).parsebytes(
+                        f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode() + body
+                    )
+                    fields = {part.get_param("name", header="content-disposition"): part for part in message.iter_parts()}
+                    upload = fields.get("file")
+                    if upload is None:
+                        return self._send(400, {"error": {"message": "'file' alanı eksik"}})
+                    purpose = (fields["purpose"].get_content() if "purpose" in fields else "batch").strip()
+                    return self._send(200, store.add_file(upload.get_filename() or "input.jsonl",
+                                                          upload.get_payload(decode=True), purpose))
+                if route == ["batches"]:
+                    return self._send(200, store.create_batch(json.loads(body)))
+                if len(route) == 3 and route[0] == "batches" and route[2] == "cancel":
+                    return self._send(200, store.cancel_batch(route[1]))
+            except KeyError as e:
+                return self._send(404, {"error": {"message": f"Bulunamadı: {e}"}})
+            except ValueError as e:
+                return self._send(400, {"error": {"message": str(e)}})
+            self._send(404, {"error": {"message": "Bilinmeyen adres"}})
+
+    return Handler
+
+def start_batch_server(host: str = BATCH_SERVER_HOST, port: int = BATCH_SERVER_PORT, directory: str = None,
+                       completion_delay: float = 1.0, failure_rate: float = 0.0):
+    """
+    Sahte Batch API sunucusunu arka plan thread'inde başlatır.
+    (sunucu, base_url) döndürür; port=0 verilirse boş bir port seçilir.
+    """
+    store = LocalBatchStore(directory or tempfile.mkdtemp(prefix="batch_server_"), completion_delay, failure_rate)
+    server = ThreadingHTTPServer((host, port), _make_handler(store))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}/v1"
+    log.info(f"Sahte Batch API sunucusu {base_url} adresinde dinliyor.")
+    return server, base_url
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Offline deneme için yerel sahte Batch API sunucusu.")
+    parser.add_argument("--host", default=BATCH_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=BATCH_SERVER_PORT)
+    parser.add_argument("--dir", default=None, help="Dosyaların saklandığı klasör (varsayılan: geçici klasör)")
+    parser.add_argument("--delay-seconds", type=float, default=1.0, help="Her batch'in tamamlanma gecikmesi")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="500 hatasıyla dönen istek oranı")
+    args = parser.parse_args()
+
+    server, _ = start_batch_server(args.host, args.port, args.dir, args.delay_seconds, args.failure_rate)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,513 @@
+# src/benchmark.py
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.config import BENCHMARK_RESULTS_PATH
+
+# Not: src.models ve ona bağlı modüller (compliance_chain, main) fonksiyonların
+# içinde import edilir; böylece benchmark veritabanı (DATABASE_URL) önceden ayarlanabilir.
+
+log = logging.getLogger("benchmark")
+
+# Karşılaştırmada kötüleşme sayılan varsayılan fark oranı
+_REGRESSION_TOLERANCE = 0.10
+
+# =================================================================
+# 1. SENTETİK VERİ: TRANSKRİPTLER VE BDDK KORPUSU
+# =================================================================
+
+# (konu, müşteri sorusu, temsilci cevabı, ilgili mevzuat cümlesi)
+_TOPICS = [
+    ("ihtiyaç kredisi vade",
+     "150 bin TL ihtiyaç kredisi çekmek istiyorum, en fazla kaç ay vade yapabiliyorsunuz?",
+     "Size 48 ay vade yapabiliriz efendim.",
+     "Tüketici kredilerinde vade, kredi tutarına göre en fazla 36 ay olarak uygulanır."),
+    ("kredi kartı taksit",
+     "Televizyon alacağım, kredi kartına 12 taksit yapabiliyor musunuz?",
+     "Elektronik eşyada taksit sayısı sınırlıdır, en fazla 3 taksit yapılabilir.",
+     "Kredi kartıyla yapılan elektronik eşya alımlarında taksit süresi 3 ayı geçemez."),
+    ("akdi faiz",
+     "Kartınızın faizi çok yüksek, yasal sınır ne kadar?",
+     "Bizim faiz oranımız piyasa koşullarına göre belirleniyor.",
+     "Kredi kartı işlemlerinde uygulanacak azami akdi faiz oranı Merkez Bankasınca belirlenir ve müşteriye bildirilir."),
+    ("gecikme faizi",
+     "Ödememi bir hafta geciktirirsem ne kadar faiz işler?",
+     "Gecikme faizi akdi faizin üzerine eklenir, oranı yasal tavanı geçmez.",
+     "Gecikme faizi oranı, akdi faiz oranına yüzde otuz eklenerek bulunan oranı aşamaz."),
+    ("borç yapılandırma",
+     "Ekstrem çok yüksek geldi, borcumu bölebilir miyiz?",
+     "Borcunuzu 24 aya kadar yapılandırabiliriz.",
+     "Kredi kartı borçlarının yapılandırılmasında vade 60 ayı geçemez ve yapılandırma koşulları yazılı olarak bildirilir."),
+    ("kart aidatı",
+     "Kart aidatımı iade alabilir miyim?",
+     "Aidat iadesi yapılamıyor maalesef.",
+     "Bankalar kart üyelik ücreti tahsil edilmeyen bir kart seçeneğini müşteriye sunmakla yükümlüdür."),
+    ("erken kapama",
+     "Kredimi erken kapatırsam ceza öder miyim?",
+     "Erken kapamada herhangi bir ücret alınmaz.",
+     "Sabit faizli kredilerin erken ödenmesinde kalan anaparanın yüzde ikisini aşmayan erken ödeme tazminatı talep edilebilir."),
+    ("konut kredisi",
+     "Ev alacağım, değerin tamamı kadar kredi verebilir misiniz?",
+     "Ekspertiz değerinin yüzde 90'ına kadar kredi kullandırabiliyoruz.",
+     "Konut kredilerinde kullandırılacak kredi tutarı konutun ekspertiz değerinin belirli bir oranını aşamaz."),
+]
+
+_CHITCHAT = [
+    ("Merhaba, kimlik doğrulaması için doğum tarihim 01.01.1980.", "Teşekkür ederim, doğrulama tamamlandı."),
+    ("Sesim geliyor mu?", "Evet, sizi net duyuyorum."),
+    ("Bir dakika bekler misiniz?", "Tabii, bekliyorum."),
+]
+
+_QUERY_PREFIXES = ["", "Bir sorum olacak. ", "Şunu merak ediyorum: ", "Geçen ay da sormuştum, ", "Açıkçası emin değilim, "]
+_FILLER_SENTENCES = [
+    "Daha önce başka bir bankada da benzer bir durum yaşamıştım.",
+    "Eşim de aynı konuyu sormamı istedi.",
+    "Mobil uygulamada bu bilgiyi bulamadım.",
+    "Maaşımı da sizin bankanızdan alıyorum.",
+]
+
+_REGULATIONS = [
+    "Tüketici Kredileri Yönetmeliği",
+    "Banka Kartları ve Kredi Kartları Yönetmeliği",
+    "Bankaların Kredi İşlemlerine İlişkin Yönetmelik",
+    "Finansal Tüketicilerden Alınacak Ücretlere İlişkin Yönetmelik",
+]
+
+def generate_transcripts(count: int, min_segments: int = 1, max_segments: int = 8, seed: int = 0) -> List[str]:
+    """
+    'Müşteri:/Temsilci:' formatında, segment sayısı ve uzunluğu değişen
+    deterministik sentetik Türkçe çağrı transkriptleri üretir.
+    """
+    rng = random.Random(seed)
+    transcripts = []
+    for _ in range(count):
+        lines = ["Temsilci: Bankamıza hoş geldiniz, size nasıl yardımcı olabilirim?"]
+        greeting = rng.choice(_CHITCHAT)
+        lines += [f"Müşteri: {greeting[0]}", f"Temsilci: {greeting[1]}"]
+        for _ in range(rng.randint(min_segments, max_segments)):
+            _, query, answer, _ = rng.choice(_TOPICS)
+            filler = " ".join(rng.sample(_FILLER_SENTENCES, rng.randint(0, len(_FILLER_SENTENCES))))
+            lines.append(f"Müşteri: {rng.choice(_QUERY_PREFIXES)}{query} {filler}".rstrip())
+            lines.append(f"Temsilci: {answer}")
+            if rng.random() < 0.3:
+                chitchat = rng.choice(_CHITCHAT)
+                lines += [f"Müşteri: {chitchat[0]}", f"Temsilci: {chitchat[1]}"]
+        lines.append("Temsilci: Başka bir konuda yardımcı olabilir miyim? İyi günler dileriz.")
+        transcripts.append("\n".join(lines))
+    return transcripts
+
+def generate_corpus(size: int = 300, seed: int = 0) -> List[dict]:
+    """Sentetik BDDK mevzuat parçaları: (id, text, metadata) kayıtları."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(size):
+        regulation = _REGULATIONS[i % len(_REGULATIONS)]
+        _, _, _, rule = _TOPICS[i % len(_TOPICS)]
+        extra = " ".join(rng.sample([t[3] for t in _TOPICS], 2))
+        text = f"{regulation} Madde {i // len(_REGULATIONS) + 1} - {rule} {extra}"
+        records.append({
+            "id": f"synthetic-{i}",
+            "text": text,
+            "metadata": {"source": f"{regulation}.pdf", "page": i // 10}
+        })
+    return records
+
+class HashingEmbeddings(Embeddings):
+    """
+    Model indirmeden çalışan deterministik embedding: kelimeler hash'lenerek
+    sabit boyutlu, normalize bir vektöre yerleştirilir (offline benchmark için).
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            h = zlib.crc32(token.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+def build_synthetic_index(index_path: str, embeddings: Embeddings, size: int = 300, seed: int = 0):
+    """Sentetik korpusu NumPy index formatında (embeddings.npy + documents.jsonl) yazar ve yükler."""
+    from src.numpy_index import NumpyVectorIndex, _MATRIX_FILENAME, _DOCUMENTS_FILENAME
+
+    records = generate_corpus(size, seed)
+    os.makedirs(index_path, exist_ok=True)
+    matrix = np.asarray(embeddings.embed_documents([r["text"] for r in records]), dtype=np.float32)
+    np.save(os.path.join(index_path, _MATRIX_FILENAME), matrix)
+    with open(os.path.join(index_path, _DOCUMENTS_FILENAME), "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return NumpyVectorIndex(index_path)
+
+# =================================================================
+# 2. AŞAMA SÜRESİ ÖLÇÜMÜ
+# =================================================================
+
+def percentiles(values: List[float]) -> dict:
+    """Süre listesinin (saniye) milisaniye cinsinden özet istatistikleri."""
+    if not values:
+        return {"count": 0}
+    array = np.asarray(values) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": round(float(array.mean()), 2),
+        "p50_ms": round(float(np.percentile(array, 50)), 2),
+        "p90_ms": round(float(np.percentile(array, 90)), 2),
+        "p99_ms": round(float(np.percentile(array, 99)), 2),
+        "max_ms": round(float(array.max()), 2),
+    }
+
+class StageRecorder:
+    """Aşama adı -> süre örnekleri."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def record(self, stage: str, seconds: float):
+        self.samples[stage].append(seconds)
+
+    def summary(self) -> dict:
+        return {stage: percentiles(values) for stage, values in sorted(self.samples.items())}
+
+class TimedChain:
+    """Sarmalanmış zincirin her ainvoke süresini (tekrar denemeler dahil) kaydeder."""
+
+    def __init__(self, inner, stage: str, recorder: StageRecorder):
+        self.inner = inner
+        self.stage = stage
+        self.recorder = recorder
+
+    async def ainvoke(self, inputs: dict, config=None):
+        start = time.perf_counter()
+        try:
+            return await self.inner.ainvoke(inputs, config=config)
+        finally:
+            self.recorder.record(self.stage, time.perf_counter() - start)
+
+class TimedRetriever:
+    """Toplu aramanın (embedding + vektör araması) süresini kaydeder."""
+
+    def __init__(self, inner, recorder: StageRecorder):
+        self.inner = inner
+        self.embeddings = inner.embeddings
+        self.recorder = recorder
+
+    def batch_search(self, queries: List[str], k: int = None, where: dict = None):
+        start = time.perf_counter()
+        try:
+            return self.inner.batch_search(queries, k, where=where)
+        finally:
+            self.recorder.record("retrieval", time.perf_counter() - start)
+
+def peak_rss_mb() -> float:
+    """Sürecin şimdiye kadarki en yüksek bellek kullanımı (RSS, MB)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux'ta KB, macOS'ta bayt cinsindendir
+        return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+    except ImportError:
+        return None
+
+def code_version() -> str:
+    try:
+        completed = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+        if completed.returncode == 0:
+            return completed.stdout.strip()
+    except OSError:
+        pass
+    return "unknown"
+
+# =================================================================
+# 3. SENARYOLAR
+# =================================================================
+
+def setup_pipeline(args, recorder: StageRecorder, work_dir: str):
+    """Zincirleri sahte LLM ile, retriever'ı sentetik index ile kurar."""
+    from src.fake_llm import FakeChatModel
+    from src.llm_scheduler import LLMScheduler
+    from src.numpy_index import NumpyRetriever
+    from src.relevance_gate import RelevanceGate, build_topic_centroids
+    from src.semantic_cache import SemanticQueryCache
+    from src.context_assembly import ContextAssembler
+    from src import compliance_chain
+
+    llm = FakeChatModel(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_ms / 4,
+        failure_rate=args.failure_rate,
+        seed=args.seed
+    )
+    scheduler = LLMScheduler(requests_per_minute=args.rpm, tokens_per_minute=args.tpm, base_delay=args.retry_delay)
+    chains = compliance_chain.build_chains(llm=llm, scheduler=scheduler, use_cache=False)
+    chains = {stage: TimedChain(chain, stage, recorder) for stage, chain in chains.items()}
+
+    embeddings = HashingEmbeddings()
+    index = build_synthetic_index(os.path.join(work_dir, "numpy_index"), embeddings, args.corpus_size, args.seed)
+    retriever = TimedRetriever(NumpyRetriever(index=index, embeddings=embeddings), recorder)
+    # İlgililik filtresinin konu merkezleri sentetik index'ten hesaplanır (diske yazılmaz)
+    relevance_gate = RelevanceGate(embeddings, build_topic_centroids(index.matrix))
+    # Anlamsal sorgu önbelleği boş başlar ve çalışma dizininde tutulur
+    semantic_cache = SemanticQueryCache(embeddings, "hashing", "benchmark",
+                                        path=os.path.join(work_dir, "semantic_query_cache.sqlite"))
+    # Cross-encoder indirilmez: adaylar retrieval skoruyla sıralanıp derlenir
+    compliance_chain.configure(chains=chains, retriever=retriever, relevance_gate=relevance_gate,
+                               semantic_cache=semantic_cache, context_assembler=ContextAssembler())
+    return scheduler
+
+async def _run_direct(transcripts: List[str], concurrency: int) -> dict:
+    from src.compliance_chain import run_compliance_analysis
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failed = 0
+    segments = 0
+
+    async def one(transcript: str):
+        nonlocal failed, segments
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                # await, '+=' okumasından önce yapılmalı; aksi halde eşzamanlı güncellemeler kaybolur
+                results = await run_compliance_analysis(transcript)
+                segments += len(results)
+            except Exception:
+                failed += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(t) for t in transcripts))
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "calls": len(transcripts),
+        "failed": failed,
+        "segments": segments,
+        "seconds": round(elapsed, 3),
+        "calls_per_second": round((len(transcripts) - failed) / elapsed, 3),
+        "call_latency": percentiles(latencies),
+    }
+
+def run_direct_benchmark(transcripts: List[str], concurrency_levels: List[int]) -> List[dict]:
+    """run_compliance_analysis'i farklı eşzamanlılık seviyelerinde doğrudan çalıştırır."""
+    results = []
+    for concurrency in concurrency_levels:
+        result = asyncio.run(_run_direct(transcripts, concurrency))
+        log.info(f"Doğrudan analiz, eşzamanlılık {concurrency}: {result['calls_per_second']} çağrı/sn")
+        results.append(result)
+    return results
+
+def run_worker_benchmark(transcripts: List[str], concurrency_levels: List[int], recorder: StageRecorder) -> List[dict]:
+    """
+    main.py worker'ını (kuyruk talebi + analiz + toplu DB yazımı) benchmark
+    veritabanı üzerinde farklı in-flight pencere boyutlarıyla çalıştırır.
+    """
+    from sqlalchemy import select
+    import src.main as main_module
+    from src.models import engine, create_db_and_tables, CallInput, insert_ignore
+
+    create_db_and_tables()
+    run_id = f"{int(time.time())}-{random.randrange(10**6)}"
+
+    # Worker'ın DB yazım adımını ölçmek için yazıcı fonksiyonu sarmalanır
+    original_writer = main_module.write_call_results
+    def timed_writer(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original_writer(*args, **kwargs)
+        finally:
+            recorder.record("db_write", time.perf_counter() - start)
+    main_module.write_call_results = timed_writer
+    # Benchmark metrikleri üretim textfile'ının üzerine yazılmaz
+    original_metrics_path = main_module.METRICS_TEXTFILE_PATH
+    main_module.METRICS_TEXTFILE_PATH = None
+
+    results = []
+    try:
+        for concurrency in concurrency_levels:
+            prefix = f"bench-{run_id}-w{concurrency}-"
+            rows = [{"call_id": f"{prefix}{i}", "transcript": t, "status": "pending"} for i, t in enumerate(transcripts)]
+            with engine.begin() as connection:
+                connection.execute(insert_ignore(CallInput), rows)
+
+            start = time.perf_counter()
+            asyncio.run(main_module.run_worker(max_in_flight=concurrency))
+            elapsed = time.perf_counter() - start
+
+            with engine.connect() as connection:
+                processed = connection.execute(
+                    select(CallInput.status).where(CallInput.call_id.like(f"{prefix}%"))
+                ).scalars().all()
+            done = sum(1 for status in processed if status.startswith("processed"))
+            result = {
+                "concurrency": concurrency,
+                "calls": len(transcripts),
+                "processed": done,
+                "seconds": round(elapsed, 3),
+                "calls_per_second": round(done / elapsed, 3),
+            }
+            log.info(f"Worker, in-flight {concurrency}: {result['calls_per_second']} çağrı/sn")
+            results.append(result)
+    finally:
+        main_module.write_call_results = original_writer
+        main_module.METRICS_TEXTFILE_PATH = original_metrics_path
+    return results
+
+# =================================================================
+# 4. KAYIT VE KARŞILAŞTIRMA
+# =================================================================
+
+def save_results(report: dict, output_dir: str = BENCHMARK_RESULTS_PATH) -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(report["timestamp"]))
+    path = os.path.join(output_dir, f"{timestamp}-{report['version']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return path
+
+def _comparable_metrics(report: dict) -> dict:
+    """Karşılaştırılacak metrikler: ad -> (değer, büyük olan mı iyi)."""
+    metrics = {}
+    for entry in report.get("direct", []):
+        c = entry["concurrency"]
+        metrics[f"direct[c={c}].calls_per_second"] = (entry["calls_per_second"], True)
+        metrics[f"direct[c={c}].call_latency.p50_ms"] = (entry["call_latency"].get("p50_ms"), False)
+        metrics[f"direct[c={c}].call_latency.p90_ms"] = (entry["call_latency"].get("p90_ms"), False)
+    for entry in report.get("worker", []):
+        metrics[f"worker[c={entry['concurrency']}].calls_per_second"] = (entry["calls_per_second"], True)
+    for stage, summary in report.get("stages", {}).items():
+        metrics[f"stages.{stage}.p50_ms"] = (summary.get("p50_ms"), False)
+        metrics[f"stages.{stage}.p99_ms"] = (summary.get("p99_ms"), False)
+    metrics["memory.peak_rss_mb"] = (report.get("memory", {}).get("peak_rss_mb"), False)
+    return metrics
+
+def compare_results(current: dict, baseline: dict, tolerance: float = _REGRESSION_TOLERANCE) -> List[dict]:
+    """
+    İki benchmark sonucunu karşılaştırır. Her ortak metrik için değişim oranını
+    ve 'tolerance'dan fazla kötüleşme varsa regresyon işaretini döndürür.
+    """
+    if current.get("settings") != baseline.get("settings"):
+        log.warning("Benchmark ayarları farklı; karşılaştırma yanıltıcı olabilir.")
+    rows = []
+    baseline_metrics = _comparable_metrics(baseline)
+    for name, (value, higher_is_better) in _comparable_metrics(current).items():
+        old = baseline_metrics.get(name, (None, None))[0]
+        if value is None or not old:
+            continue
+        change = (value - old) / old
+        worse = -change if higher_is_better else change
+        rows.append({
+            "metric": name,
+            "baseline": old,
+            "current": value,
+            "change_pct": round(change * 100, 1),
+            "regression": worse > tolerance,
+        })
+    return rows
+
+# =================================================================
+# 5. KOMUT SATIRI
+# =================================================================
+
+def run_benchmark(args) -> dict:
+    work_dir = tempfile.mkdtemp(prefix="bank_compliance_bench_")
+    # Benchmark, gerçek çağrı kuyruğuna değil geçici bir veritabanına yazar
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+
+    recorder = StageRecorder()
+    scheduler = setup_pipeline(args, recorder, work_dir)
+    transcripts = generate_transcripts(args.calls, args.min_segments, args.max_segments, args.seed)
+    concurrency_levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    if not args.verbose:
+        # Pipeline'ın çağrı başına INFO logları ölçümü gölgelemesin
+        logging.getLogger().setLevel(logging.WARNING)
+        log.setLevel(logging.INFO)
+
+    direct = run_direct_benchmark(transcripts, concurrency_levels)
+    memory = {"peak_rss_mb_after_direct": peak_rss_mb()}
+    worker = [] if args.skip_worker else run_worker_benchmark(transcripts, concurrency_levels, recorder)
+    memory["peak_rss_mb"] = peak_rss_mb()
+
+    return {
+        "version": code_version(),
+        "timestamp": time.time(),
+        "settings": {
+            "calls": args.calls,
+            "min_segments": args.min_segments,
+            "max_segments": args.max_segments,
+            "concurrency": concurrency_levels,
+            "latency_ms": args.latency_ms,
+            "failure_rate": args.failure_rate,
+            "rpm": args.rpm,
+            "tpm": args.tpm,
+            "corpus_size": args.corpus_size,
+            "seed": args.seed,
+        },
+        "direct": direct,
+        "worker": worker,
+        "stages": recorder.summary(),
+        "memory": memory,
+        "scheduler": dict(scheduler.stats),
+    }
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Sahte LLM ve sentetik veri ile offline pipeline benchmark'ı.")
+    parser.add_argument("--calls", type=int, default=50, help="Her eşzamanlılık seviyesinde işlenecek çağrı sayısı")
+    parser.add_argument("--min-segments", type=int, default=1)
+    parser.add_argument("--max-segments", type=int, default=8)
+    parser.add_argument("--concurrency", default="1,4,16", help="Virgülle ayrılmış eşzamanlılık seviyeleri")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Sahte LLM'in ortalama cevap süresi")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Sahte LLM'in geçici hata (5xx) oranı")
+    parser.add_argument("--rpm", type=float, default=100_000, help="Zamanlayıcının RPM bütçesi")
+    parser.add_argument("--tpm", type=float, default=10**9, help="Zamanlayıcının TPM bütçesi")
+    parser.add_argument("--retry-delay", type=float, default=0.1, help="Tekrar denemelerde temel bekleme (sn)")
+    parser.add_argument("--corpus-size", type=int, default=300, help="Sentetik mevzuat parçası sayısı")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-worker", action="store_true", help="main.py worker senaryosunu atla")
+    parser.add_argument("--database-url", default=None, help="Worker senaryosu için veritabanı (varsayılan: geçici SQLite)")
+    parser.add_argument("--output-dir", default=BENCHMARK_RESULTS_PATH)
+    parser.add_argument("--compare", default=None, help="Karşılaştırılacak önceki sonuç dosyası")
+    parser.add_argument("--tolerance", type=float, default=_REGRESSION_TOLERANCE)
+    parser.add_argument("--fail-on-regression", action="store_true", help="Regresyon varsa çıkış kodu 1")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    path = save_results(report, args.output_dir)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    log.info(f"Benchmark sonuçları kaydedildi: {path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            comparison = compare_results(report, json.load(f), args.tolerance)
+        for row in comparison:
+            flag = "REGRESYON" if row["regression"] else ""
+            print(f"{row['metric']:<45} {row['baseline']:>12} -> {row['current']:>12} ({row['change_pct']:+.1f}%) {flag}")
+        if args.fail_on_regression and any(row["regression"] for row in comparison):
+            sys.exit(1)
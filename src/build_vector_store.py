@@ -1,18 +1,36 @@
 # src/build_vector_store.py
 import os
+import json
 import shutil
+import hashlib
 import logging
+import argparse
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from langchain_community.document_loaders import PyMuPDFLoader
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from src.config import (
-    DOCUMENTS_PATH, 
-    CHROMA_DB_PATH, 
-    EMBEDDING_MODEL_NAME, 
-    EMBEDDING_DEVICE
+    DOCUMENTS_PATH,
+    CHROMA_DB_PATH,
+    RETRIEVER_BACKEND,
+    EMBEDDING_DEVICE,
+    VECTOR_STORE_MANIFEST_FILENAME,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    CHUNKING_STRATEGY,
+    ARTICLE_CHUNK_MAX_CHARS,
+    INGEST_WORKERS,
+    INGEST_QUEUE_SIZE,
+    EMBEDDING_BATCH_SIZE
 )
+from src.embedding_cache import create_embedding_model, embedding_model_id
+from src.numpy_index import build_numpy_index
+from src.legal_chunking import chunk_by_article
+from src.index_versions import active_index, start_version, validate_version, activate_version, prune_versions
 
 # Loglama ayarları
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -24,79 +42,399 @@ def load_all_documents(directory_path: str):
     """
     all_docs = []
     log.info(f"'{directory_path}' klasöründeki dokümanlar yükleniyor...")
-    
+
     if not os.path.exists(directory_path):
         log.error(f"HATA: Doküman klasörü bulunamadı: {directory_path}")
         return []
 
-    for filename in os.listdir(directory_path):
-        if filename.endswith(".pdf"):
-            file_path = os.path.join(directory_path, filename)
-            try:
-                loader = PyMuPDFLoader(file_path)
-                docs = loader.load()
-                log.info(f" -> {filename} yüklendi ({len(docs)} sayfa).")
-                all_docs.extend(docs)
-            except Exception as e:
-                log.warning(f"'{filename}' yüklenirken hata oluştu: {e}")
-                
+    for filename in list_pdf_files(directory_path):
+        file_path = os.path.join(directory_path, filename)
+        try:
+            loader = PyMuPDFLoader(file_path)
+            docs = loader.load()
+            log.info(f" -> {filename} yüklendi ({len(docs)} sayfa).")
+            all_docs.extend(docs)
+        except Exception as e:
+            log.warning(f"'{filename}' yüklenirken hata oluştu: {e}")
+
     return all_docs
 
-def build_vector_store():
+def list_pdf_files(directory_path: str):
+    """Klasördeki PDF dosyalarının adlarını sıralı olarak döndürür."""
+    return sorted(f for f in os.listdir(directory_path) if f.endswith(".pdf"))
+
+def create_text_splitter():
+    """
+    Hukuki metinler için paragrafları ve maddeleri korumak önemlidir.
+    Bu ayırıcı, önce çift satır boşluğuna (\\n\\n), sonra tek satır boşluğuna (\\n)
+    göre bölmeyi dener. Bu, yönetmelik maddelerini bir arada tutmaya yardımcı olur.
+    """
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        separators=["\n\n", "\n", " ", ""] # Bölme öncelik sırası
+    )
+
+def chunk_documents(docs):
+    """
+    Bir PDF'in sayfalarını parçalara böler. "article" stratejisinde mevzuat
+    madde sınırlarından bölünür; madde yapısı bulunamayan dokümanlar (rehber,
+    duyuru vb.) karakter bazlı ayırıcıya düşer.
+    """
+    if CHUNKING_STRATEGY == "article":
+        chunks = chunk_by_article(docs)
+        if chunks:
+            return chunks
+    return create_text_splitter().split_documents(docs)
+
+def create_embeddings():
+    """Lokal (Hugging Face) embedding modelini yükler."""
+    log.info(f"Lokal embedding modeli '{embedding_model_id()}' yükleniyor...")
+    log.info(f"Kullanılan cihaz: {EMBEDDING_DEVICE}")
+    embeddings = create_embedding_model()
+    log.info("Embedding modeli başarıyla yüklendi.")
+    return embeddings
+
+# =================================================================
+# ARTIMLI (INCREMENTAL) BUILD YARDIMCILARI
+# =================================================================
+
+def file_sha256(file_path: str) -> str:
+    """Dosyanın içerik hash'ini (sha256) parça parça okuyarak hesaplar."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def assign_chunk_ids(filename: str, chunks) -> list:
+    """
+    Her chunk için içerikten türetilmiş, kararlı bir ID üretir.
+    Aynı dosyada aynı sayfada birebir aynı metin birden fazla kez geçerse
+    sıra numarası eklenerek ID'lerin benzersiz kalması sağlanır.
+    """
+    ids = []
+    seen = {}
+    for chunk in chunks:
+        page = chunk.metadata.get("page", "")
+        base = hashlib.sha256(f"{filename}|{page}|{chunk.page_content}".encode("utf-8")).hexdigest()
+        occurrence = seen.get(base, 0)
+        seen[base] = occurrence + 1
+        ids.append(base if occurrence == 0 else f"{base}-{occurrence}")
+    return ids
+
+def build_settings() -> dict:
+    """Değişmesi durumunda tüm index'in geçersiz sayılacağı build ayarları."""
+    return {
+        "embedding_model": embedding_model_id(),
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "chunking_strategy": CHUNKING_STRATEGY,
+        "article_chunk_max_chars": ARTICLE_CHUNK_MAX_CHARS,
+        "normalize_embeddings": True,
+    }
+
+def manifest_path(db_path: str = CHROMA_DB_PATH) -> str:
+    return os.path.join(db_path, VECTOR_STORE_MANIFEST_FILENAME)
+
+def load_manifest(db_path: str = CHROMA_DB_PATH) -> dict:
+    """Manifest'i okur. Yoksa veya bozuksa None döner."""
+    path = manifest_path(db_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        log.warning(f"Manifest okunamadı ({e}). Tam yeniden oluşturma yapılacak.")
+        return None
+
+def save_manifest(manifest: dict, db_path: str = CHROMA_DB_PATH):
+    """Manifest'i atomik olarak (geçici dosya + rename) diske yazar."""
+    os.makedirs(db_path, exist_ok=True)
+    path = manifest_path(db_path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+# =================================================================
+# PARALEL / AKIŞLI (STREAMING) INGESTION
+# =================================================================
+
+def parse_and_chunk_file(file_path: str):
+    """
+    (Worker süreci) Tek bir PDF'i yükler, chunk'lara böler ve ID'lerini atar.
+    Süreçler arası taşınabilmesi için sade (id, metin, metadata) demetleri döndürür.
+    """
+    filename = os.path.basename(file_path)
+    docs = PyMuPDFLoader(file_path).load()
+    chunks = chunk_documents(docs)
+    ids = assign_chunk_ids(filename, chunks)
+    records = [(cid, chunk.page_content, chunk.metadata) for cid, chunk in zip(ids, chunks)]
+    return filename, len(docs), records
+
+def _put(out_queue, item, stop_event):
+    """Tüketici durduysa sonsuza kadar bloklanmadan kuyruğa yazar."""
+    while not stop_event.is_set():
+        try:
+            out_queue.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _produce_chunks(file_paths, out_queue, stop_event, workers):
+    """
+    (Üretici thread) PDF'leri süreç havuzunda paralel olarak parse eder ve
+    chunk'ları sınırlı kuyruğa akıtır. Aynı anda en fazla 2 x worker dosya
+    işlemde tutulur; böylece bellek korpus boyutuyla büyümez.
+    """
+    try:
+        # Embedding modeli (torch) ana süreçte yüklü olabileceği için 'fork' yerine 'spawn'
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            paths = iter(file_paths)
+            in_flight = {}
+
+            def submit_next():
+                path = next(paths, None)
+                if path is not None:
+                    in_flight[pool.submit(parse_and_chunk_file, path)] = path
+
+            for _ in range(workers * 2):
+                submit_next()
+
+            while in_flight and not stop_event.is_set():
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = in_flight.pop(future)
+                    filename = os.path.basename(path)
+                    try:
+                        filename, page_count, records = future.result()
+                    except Exception as e:
+                        _put(out_queue, ("file_error", filename, str(e)), stop_event)
+                    else:
+                        for record in records:
+                            if not _put(out_queue, ("chunk", filename, record), stop_event):
+                                return
+                        chunk_ids = [cid for cid, _, _ in records]
+                        del records
+                        _put(out_queue, ("file_done", filename, (page_count, chunk_ids)), stop_event)
+                    submit_next()
+
+            for future in in_flight:
+                future.cancel()
+    except Exception as e:
+        log.error(f"Paralel ingestion sırasında hata: {e}")
+    finally:
+        _put(out_queue, ("end", None, None), stop_event)
+
+def stream_chunks(file_paths, workers: int = None, queue_size: int = INGEST_QUEUE_SIZE):
+    """
+    PDF'leri paralel parse edip chunk mesajlarını akış halinde üretir:
+      ("chunk", dosya, (id, metin, metadata))
+      ("file_done", dosya, (sayfa_sayısı, tüm_chunk_id'leri))
+      ("file_error", dosya, hata_mesajı)
+    """
+    workers = workers or INGEST_WORKERS or os.cpu_count() or 1
+    out_queue = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+    producer = threading.Thread(
+        target=_produce_chunks,
+        args=(file_paths, out_queue, stop_event, workers),
+        daemon=True
+    )
+    producer.start()
+    try:
+        while True:
+            kind, filename, payload = out_queue.get()
+            if kind == "end":
+                break
+            yield kind, filename, payload
+    finally:
+        stop_event.set()
+        producer.join()
+
+def build_vector_store(full_rebuild: bool = False):
     """
     1. BDDK dokümanlarını yükler.
     2. Anlamsal olarak parçalara ayırır (chunking).
     3. Lokal (Hugging Face) model ile vektörleştirir.
     4. ChromaDB'ye kaydeder.
+
+    Varsayılan olarak artımlı çalışır: manifest'teki dosya hash'leri ile
+    karşılaştırılıp yalnızca yeni/değişen PDF'ler işlenir, silinen veya değişen
+    PDF'lere ait eski chunk'lar index'ten kaldırılır.
+
+    Değişiklikler etkin index sürümüne değil, onun kopyası olan yeni bir sürüm
+    klasörüne yazılır; sürüm doğrulandıktan sonra atomik olarak etkinleştirilir.
+    Çalışan worker'lar build boyunca eski sürümden okumaya devam eder.
     """
-    
-    # 1. Dokümanları Yükle
-    documents = load_all_documents(DOCUMENTS_PATH)
-    if not documents:
-        log.error("Hiç doküman yüklenemedi. İşlem durduruluyor.")
+    if not os.path.exists(DOCUMENTS_PATH):
+        log.error(f"HATA: Doküman klasörü bulunamadı: {DOCUMENTS_PATH}")
         return
 
-    # 2. Parçalara Ayır (Chunking)
-    # Hukuki metinler için paragrafları ve maddeleri korumak önemlidir.
-    # Bu ayırıcı, önce çift satır boşluğuna (\n\n), sonra tek satır boşluğuna (\n)
-    # göre bölmeyi dener. Bu, yönetmelik maddelerini bir arada tutmaya yardımcı olur.
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,      # Her parçanın maksimum boyutu (karakter)
-        chunk_overlap=200,    # Parçalar arası bağlamı korumak için çakışma payı
-        separators=["\n\n", "\n", " ", ""] # Bölme öncelik sırası
-    )
-    
-    chunks = text_splitter.split_documents(documents)
-    log.info(f"Toplam {len(documents)} sayfa, {len(chunks)} adet anlamsal parçaya (chunk) bölündü.")
+    settings = build_settings()
+    active = active_index()
+    manifest = None if full_rebuild else load_manifest(active["chroma_path"])
 
-    # 3. Lokal Embedding Modelini Hazırla
-    log.info(f"Lokal embedding modeli '{EMBEDDING_MODEL_NAME}' yükleniyor...")
-    log.info(f"Kullanılan cihaz: {EMBEDDING_DEVICE}")
-    
-    embeddings = HuggingFaceEmbeddings(
-        model_name=EMBEDDING_MODEL_NAME,
-        model_kwargs={'device': EMBEDDING_DEVICE}
-    )
-    log.info("Embedding modeli başarıyla yüklendi.")
+    if manifest is not None and manifest.get("settings") != settings:
+        log.warning("Build ayarları (model/chunk) değişmiş. Tam yeniden oluşturma yapılacak.")
+        manifest = None
 
-    # 4. Vektör Veritabanını Oluştur ve Kaydet
-    # Önceki veritabanını (varsa) temizle
-    if os.path.exists(CHROMA_DB_PATH):
-        log.warning(f"Mevcut veritabanı '{CHROMA_DB_PATH}' siliniyor...")
-        shutil.rmtree(CHROMA_DB_PATH)
-
-    log.info("Vektör veritabanı oluşturuluyor ve dokümanlar vektörize ediliyor...")
-    log.info("BU İŞLEM CPU ÜZERİNDE ZAMAN ALACAKTIR. LÜTFEN BEKLEYİN...")
-    
-    # Dokümanları vektörleştirir ve ChromaDB'ye kaydeder
-    vector_store = Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
-        persist_directory=CHROMA_DB_PATH
-    )
-    
-    log.info(f"Vektör veritabanı başarıyla '{CHROMA_DB_PATH}' adresine kaydedildi!")
-    log.info(f"Toplam {vector_store._collection.count()} adet vektör eklendi.")
+    # 1. Değişiklikleri Tespit Et (sadece dosya hash'leri; PDF açılmaz)
+    current_hashes = {}
+    for filename in list_pdf_files(DOCUMENTS_PATH):
+        current_hashes[filename] = file_sha256(os.path.join(DOCUMENTS_PATH, filename))
+
+    known_files = manifest["files"] if manifest else {}
+    removed = [f for f in known_files if f not in current_hashes]
+    changed = [f for f, h in current_hashes.items() if known_files.get(f, {}).get("file_hash") != h]
+
+    if manifest is not None and not removed and not changed:
+        log.info(f"Dokümanlarda değişiklik yok. Vektör veritabanı (sürüm '{active['version']}') güncel.")
+        if RETRIEVER_BACKEND == "numpy" and not os.path.exists(active["numpy_path"]):
+            build_numpy_index(active["chroma_path"], active["numpy_path"])
+        return
+
+    log.info(f"{len(changed)} yeni/değişen, {len(removed)} silinen doküman tespit edildi.")
+
+    # Yeni sürüm: artımlı build'de etkin sürümün kopyası, tam build'de boş klasör
+    target = start_version(active if manifest is not None else None)
+    db_path = target["chroma_path"]
+    manifest = load_manifest(db_path)
+    if manifest is not None and manifest.get("settings") != settings:
+        # Farklı ayarlarla yarıda kalmış bir build'in klasörü: baştan başlanır
+        shutil.rmtree(db_path)
+        manifest = None
+    manifest = manifest or {"settings": settings, "files": {}}
+    known_files = manifest["files"]
+    removed = [f for f in known_files if f not in current_hashes]
+    changed = [f for f, h in current_hashes.items() if known_files.get(f, {}).get("file_hash") != h]
+    log.info(f"Yeni index sürümü '{target['version']}' oluşturuluyor ({db_path}).")
+
+    embeddings = None
+    vector_store = None
+
+    def get_vector_store():
+        nonlocal embeddings, vector_store
+        if vector_store is None:
+            # 3. Lokal Embedding Modelini Hazırla (yalnızca gerçekten iş varsa)
+            embeddings = create_embeddings()
+            vector_store = Chroma(
+                persist_directory=db_path,
+                embedding_function=embeddings
+            )
+        return vector_store
+
+    # 2. Silinen dokümanların chunk'larını kaldır
+    for filename in removed:
+        old_ids = known_files[filename].get("chunk_ids", [])
+        if old_ids:
+            get_vector_store().delete(ids=old_ids)
+        del known_files[filename]
+        save_manifest(manifest, db_path)
+        log.info(f" -> {filename} index'ten kaldırıldı ({len(old_ids)} chunk).")
+
+    # 3. Yeni/değişen dokümanları akış halinde işle:
+    #    Süreç havuzu PDF'leri paralel parse eder, chunk'lar sınırlı kuyruktan
+    #    sabit boyutlu batch'ler halinde vektörize edilip Chroma'ya yazılır.
+    #    Sadece daha önce index'te olmayan chunk'lar vektörize edilir.
+    if changed:
+        log.info("Dokümanlar paralel olarak işleniyor ve vektörize ediliyor...")
+    total_added = 0
+    total_deleted = 0
+    old_id_sets = {}
+    fresh_counts = {}
+    batch = []
+    completed_files = []
+
+    def flush_batch():
+        nonlocal total_added
+        if batch:
+            get_vector_store().add_texts(
+                texts=[text for _, text, _ in batch],
+                metadatas=[metadata for _, _, metadata in batch],
+                ids=[cid for cid, _, _ in batch]
+            )
+            total_added += len(batch)
+            batch.clear()
+        # Tüm chunk'ları yazılmış dosyaları manifest'e işle:
+        # yarıda kesilen build bir sonraki çalıştırmada kaldığı yerden devam eder.
+        if completed_files:
+            for filename, entry in completed_files:
+                known_files[filename] = entry
+            completed_files.clear()
+            save_manifest(manifest, db_path)
+
+    changed_paths = [os.path.join(DOCUMENTS_PATH, f) for f in changed]
+    for kind, filename, payload in (stream_chunks(changed_paths) if changed_paths else []):
+        if kind == "file_error":
+            log.warning(f"'{filename}' yüklenirken hata oluştu: {payload}")
+            continue
+
+        if filename not in old_id_sets:
+            old_id_sets[filename] = set(known_files.get(filename, {}).get("chunk_ids", []))
+        old_ids = old_id_sets[filename]
+
+        if kind == "chunk":
+            if payload[0] not in old_ids:
+                batch.append(payload)
+                fresh_counts[filename] = fresh_counts.get(filename, 0) + 1
+                if len(batch) >= EMBEDDING_BATCH_SIZE:
+                    flush_batch()
+            continue
+
+        # kind == "file_done": değişen dosyanın artık geçersiz chunk'larını sil
+        page_count, new_ids = payload
+        new_id_set = set(new_ids)
+        stale_ids = [cid for cid in old_ids if cid not in new_id_set]
+        if stale_ids:
+            get_vector_store().delete(ids=stale_ids)
+        total_deleted += len(stale_ids)
+        completed_files.append((filename, {
+            "file_hash": current_hashes[filename],
+            "chunk_ids": new_ids,
+        }))
+        del old_id_sets[filename]
+
+        fresh = fresh_counts.pop(filename, 0)
+        log.info(
+            f" -> {filename}: {page_count} sayfa, {len(new_ids)} chunk "
+            f"({fresh} eklendi, {len(stale_ids)} silindi, "
+            f"{len(new_ids) - fresh} değişmedi)."
+        )
+
+    flush_batch()
+
+    log.info(f"Vektör veritabanı '{db_path}' güncellendi: {total_added} chunk eklendi, {total_deleted} chunk silindi.")
+    if vector_store is not None:
+        log.info(f"Toplam {vector_store._collection.count()} adet vektör mevcut.")
+    else:
+        # Hiç yazma yapılmadıysa (örn. sadece kopyalanan sürüm) manifest yine de yeni klasörde olmalı
+        save_manifest(manifest, db_path)
+
+    # 4. NumPy backend'i için embedding matrisini Chroma'dan dışa aktar (yeniden vektörize etmeden)
+    if RETRIEVER_BACKEND == "numpy" or os.path.exists(active["numpy_path"]):
+        build_numpy_index(db_path, target["numpy_path"])
+
+    # 5. Doğrula, atomik olarak etkinleştir ve eski sürümleri temizle.
+    #    Doğrulanamayan sürüm etkinleştirilmez; worker'lar eski sürümle devam eder.
+    try:
+        report = validate_version(target, embeddings)
+    except Exception as e:
+        log.error(f"Index sürümü '{target['version']}' doğrulanamadı, etkinleştirilmedi: {e}")
+        raise
+    log.info(f"Index sürümü doğrulandı: {report}")
+    activate_version(target["version"])
+    prune_versions()
 
 if __name__ == "__main__":
-    build_vector_store()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="BDDK vektör veritabanını oluşturur/günceller.")
+    parser.add_argument(
+        "--full", action="store_true",
+        help="Manifest'i yok sayıp veritabanını sıfırdan oluşturur."
+    )
+    args = parser.parse_args()
+    build_vector_store(full_rebuild=args.full)
@@ -0,0 +1,141 @@
+# src/call_queue.py
+import os
+import uuid
+import socket
+import logging
+import datetime
+from typing import List
+
+from sqlalchemy import update, or_, and_
+
+from src.models import CallInput
+
+log = logging.getLogger("call_queue")
+
+# Bir worker'ın aldığı çağrı üzerindeki kiralama (lease) süresi.
+# Worker çalıştığı sürece kiralamayı düzenli olarak yeniler; çökerse süre dolunca
+# çağrı başka bir worker tarafından otomatik olarak geri alınır.
+LEASE_SECONDS = 600
+
+def utcnow() -> datetime.datetime:
+    """Kiralama zamanları için saat dilimsiz (naive) UTC zaman."""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+def new_worker_id() -> str:
+    """Süreçler ve makineler arasında benzersiz worker kimliği üretir."""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+def _claimable(now: datetime.datetime, worker_id: str):
+    """
+    Talep edilebilir çağrılar: 'pending' veya başka bir worker'ın kiralaması dolmuş
+    'in_progress' çağrıları. Bu worker'ın kendi süresi dolmuş çağrıları hariçtir:
+    hâlâ işlemde olabilirler (örn: kiralama yenilenemediyse) ve tekrar talep
+    edilirlerse aynı worker'da iki kez analiz edilirler.
+    """
+    return or_(
+        CallInput.status == "pending",
+        and_(
+            CallInput.status == "in_progress",
+            CallInput.lease_expires_at < now,
+            or_(CallInput.worker_id.is_(None), CallInput.worker_id != worker_id)
+        )
+    )
+
+def claim_calls(db_session, worker_id: str, limit: int, lease_seconds: int = LEASE_SECONDS) -> List[tuple]:
+    """
+    En fazla 'limit' kadar çağrıyı atomik olarak bu worker adına talep eder.
+    Aday satırlar koşullu bir UPDATE (compare-and-set) ile alınır; aynı satırı
+    aynı anda talep eden iki worker'dan yalnızca biri başarılı olur.
+    (id, call_id, transcript) listesi döndürür.
+    """
+    if limit <= 0:
+        return []
+
+    # Adayların tamamı başka bir worker'a kaptırıldıysa (yarış), kalan adaylarla
+    # tekrar dene; yalnızca talep edilebilir hiçbir çağrı kalmadığında boş döner.
+    while True:
+        now = utcnow()
+        candidate_ids = [
+            row[0] for row in db_session.query(CallInput.id)
+            .filter(_claimable(now, worker_id))
+            .order_by(CallInput.id)
+            .limit(limit)
+            .all()
+        ]
+        if not candidate_ids:
+            db_session.commit()
+            return []
+
+        expired = db_session.query(CallInput.id).filter(
+            CallInput.id.in_(candidate_ids), CallInput.status == "in_progress"
+        ).count()
+        if expired:
+            log.warning(f"Kiralama süresi dolmuş {expired} çağrı geri alınıyor.")
+
+        db_session.execute(
+            update(CallInput)
+            .where(CallInput.id.in_(candidate_ids), _claimable(now, worker_id))
+            .values(
+                status="in_progress",
+                worker_id=worker_id,
+                lease_expires_at=now + datetime.timedelta(seconds=lease_seconds)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db_session.commit()
+
+        claimed = db_session.query(CallInput.id, CallInput.call_id, CallInput.transcript).filter(
+            CallInput.id.in_(candidate_ids),
+            CallInput.status == "in_progress",
+            CallInput.worker_id == worker_id
+        ).order_by(CallInput.id).all()
+        if claimed:
+            return claimed
+
+def renew_leases(db_session, worker_id: str, call_ids, lease_seconds: int = LEASE_SECONDS) -> int:
+    """Bu worker'ın hâlâ işlediği çağrıların kiralama süresini uzatır."""
+    if not call_ids:
+        return 0
+    result = db_session.execute(
+        update(CallInput)
+        .where(
+            CallInput.id.in_(list(call_ids)),
+            CallInput.status == "in_progress",
+            CallInput.worker_id == worker_id
+        )
+        .values(lease_expires_at=utcnow() + datetime.timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    db_session.commit()
+    return result.rowcount
+
+def complete_call(db_session, call_pk: int, worker_id: str, status: str) -> bool:
+    """
+    Çağrının son durumunu yazar ve kiralamayı bırakır. Kiralama başka bir
+    worker'a geçmişse hiçbir şey yapmaz ve False döner (sonuç yazılmamalıdır).
+    Commit işlemi çağırana aittir.
+    """
+    result = db_session.execute(
+        update(CallInput)
+        .where(
+            CallInput.id == call_pk,
+            CallInput.status == "in_progress",
+            CallInput.worker_id == worker_id
+        )
+        .values(status=status, worker_id=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def owned_calls(db_session, worker_id: str, lease_seconds: int = LEASE_SECONDS) -> List[tuple]:
+    """
+    Bu worker kimliğiyle hâlâ 'in_progress' olan çağrıları döndürür ve kiralamalarını
+    uzatır (yarıda kalan bir toplu çalıştırmaya aynı kimlikle devam edilirken).
+    (id, call_id, transcript) listesi döndürür.
+    """
+    calls = db_session.query(CallInput.id, CallInput.call_id, CallInput.transcript).filter(
+        CallInput.status == "in_progress",
+        CallInput.worker_id == worker_id
+    ).order_by(CallInput.id).all()
+    renew_leases(db_session, worker_id, [call[0] for call in calls], lease_seconds)
+    return calls
@@ -0,0 +1,139 @@
+# src/checkpoints.py
+import json
+import hashlib
+import logging
+import argparse
+from typing import Dict
+
+from sqlalchemy import select, delete, update, func
+
+from src.models import SessionLocal, CallInput, CallCheckpoint, insert_ignore, create_db_and_tables
+from src.metrics import REGISTRY
+
+log = logging.getLogger("checkpoints")
+
+# Çağrı geneli adımların (segmentasyon) segment numarası
+CALL_LEVEL = 0
+
+def transcript_hash(transcript: str) -> str:
+    return hashlib.sha256(transcript.encode("utf-8")).hexdigest()
+
+# =================================================================
+# 1. ÇAĞRI BAŞINA ARA SONUÇ KAYDI
+# =================================================================
+
+class CallCheckpointer:
+    """
+    Bir çağrının tamamlanan analiz adımlarını 'analysis_checkpoints' tablosuna yazar
+    ve çağrı (çökme, kiralama süresinin dolması veya 'failed' durumundan tekrar
+    kuyruğa alınma sonrası) yeniden işlendiğinde bu adımları geri verir.
+    Her kayıt kendi kısa transaction'ında commit edilir; worker'ın toplu sonuç
+    yazımını beklemez. Kayıtlar transkriptin hash'ine bağlıdır.
+    """
+
+    def __init__(self, call_pk: int, transcript: str):
+        self.call_pk = call_pk
+        self.transcript_hash = transcript_hash(transcript)
+        self._steps: Dict[tuple, object] = {}
+        self._loaded = False
+
+    def load(self) -> int:
+        """Çağrının önceki kayıtlarını okur; bulunan adım sayısını döndürür."""
+        with SessionLocal() as db_session:
+            rows = db_session.execute(
+                select(CallCheckpoint.stage, CallCheckpoint.segment_index, CallCheckpoint.payload)
+                .where(
+                    CallCheckpoint.input_call_id == self.call_pk,
+                    CallCheckpoint.transcript_hash == self.transcript_hash
+                )
+            ).all()
+        self._steps = {(stage, segment_index): json.loads(payload) for stage, segment_index, payload in rows}
+        self._loaded = True
+        return len(self._steps)
+
+    def get(self, stage: str, segment_index: int = CALL_LEVEL):
+        """Kayıtlı adımın içeriği; yoksa None. Bulunan her adım metriklere 'reused' olarak yazılır."""
+        if not self._loaded:
+            self.load()
+        payload = self._steps.get((stage, segment_index))
+        if payload is not None:
+            REGISTRY.inc("compliance_checkpoint_steps_total", stage=stage, outcome="reused")
+        return payload
+
+    def save_many(self, stage: str, payloads: Dict[int, object]):
+        """{segment_index: içerik} adımlarını yazar; zaten kayıtlı olanlar atlanır."""
+        if not payloads:
+            return
+        rows = [
+            {
+                "input_call_id": self.call_pk,
+                "transcript_hash": self.transcript_hash,
+                "stage": stage,
+                "segment_index": segment_index,
+                "payload": json.dumps(payload, ensure_ascii=False),
+            }
+            for segment_index, payload in payloads.items()
+        ]
+        with SessionLocal() as db_session:
+            db_session.execute(insert_ignore(CallCheckpoint), rows)
+            db_session.commit()
+        for segment_index, payload in payloads.items():
+            self._steps[(stage, segment_index)] = payload
+        REGISTRY.inc("compliance_checkpoint_steps_total", len(rows), stage=stage, outcome="saved")
+
+    def save(self, stage: str, payload, segment_index: int = CALL_LEVEL):
+        self.save_many(stage, {segment_index: payload})
+
+def delete_checkpoints(db_session, call_pks) -> int:
+    """
+    Sonuçları yazılan çağrıların ara kayıtlarını siler. Commit işlemi çağırana
+    aittir; sonuç yazımı geri alınırsa kayıtlar da korunur.
+    """
+    call_pks = list(call_pks)
+    if not call_pks:
+        return 0
+    result = db_session.execute(
+        delete(CallCheckpoint)
+        .where(CallCheckpoint.input_call_id.in_(call_pks))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+# =================================================================
+# 2. BAŞARISIZ ÇAĞRILARI TEKRAR KUYRUĞA ALMA
+# =================================================================
+
+def requeue_failed(statuses=("failed", "failed_writing_db")) -> int:
+    """
+    Başarısız çağrıları tekrar 'pending' yapar. Ara kayıtları silinmediği için
+    bu çağrılar worker'da kaldıkları adımdan devam eder.
+    """
+    with SessionLocal() as db_session:
+        result = db_session.execute(
+            update(CallInput)
+            .where(CallInput.status.in_(statuses))
+            .values(status="pending", worker_id=None, lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        db_session.commit()
+    return result.rowcount
+
+def checkpoint_stats() -> dict:
+    with SessionLocal() as db_session:
+        rows = db_session.execute(
+            select(CallCheckpoint.stage, func.count(), func.count(func.distinct(CallCheckpoint.input_call_id)))
+            .group_by(CallCheckpoint.stage)
+        ).all()
+    return {stage: {"steps": steps, "calls": calls} for stage, steps, calls in rows}
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Yarıda kalan çağrıların ara sonuç kayıtları.")
+    parser.add_argument("--requeue-failed", action="store_true",
+                        help="'failed' çağrıları kaldıkları adımdan devam etmek üzere tekrar kuyruğa alır.")
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    if args.requeue_failed:
+        log.info(f"{requeue_failed()} başarısız çağrı tekrar kuyruğa alındı.")
+    print(json.dumps(checkpoint_stats(), indent=2))
@@ -1,22 +1,49 @@
 # src/compliance_chain.py
+import sys
+import json
+import time
+import asyncio
 import logging
-from langchain_openai import ChatOpenAI
+import argparse
+import threading
+import subprocess
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.runnables import RunnableLambda
 from pydantic import BaseModel, Field
-from typing import List 
+from typing import List, Optional
 
+# Not: Ağır bağımlılıklar (langchain_openai, Chroma/langchain_community,
+# sentence-transformers) modül import edilirken değil, ilk kullanımda yüklenir.
 from src.config import (
-    OPENAI_API_KEY, 
+    require_openai_api_key,
     LLM_MODEL, 
-    CHROMA_DB_PATH, 
-    EMBEDDING_MODEL_NAME, 
-    EMBEDDING_DEVICE
+    LLM_PROVIDER,
+    LLM_CACHE_ENABLED,
+    RETRIEVER_BACKEND,
+    RETRIEVER_K,
+    SEGMENT_CONCURRENCY,
+    SEGMENTATION_WINDOWING_ENABLED,
+    SEGMENTATION_WINDOW_MIN_CHARS,
+    RELEVANCE_GATE_ENABLED,
+    SEMANTIC_CACHE_ENABLED,
+    CONTEXT_ASSEMBLY_ENABLED,
+    RAG_CANDIDATE_K,
+    INDEX_RELOAD_CHECK_SECONDS
 )
 # 'TranscriptSegments' ve 'AnalysisResult' modellerini models.py'dan alıyoruz
-from src.models import TranscriptSegments, AnalysisResult 
+from src.models import TranscriptSegments, AnalysisResult, Segment
+from src.embedding_cache import create_embedding_model
+from src.retrieval import RetrievalBatcher, chunk_reference, retriever_embeddings
+from src.segmentation import split_turns, build_windows, merge_window_segments
+from src.relevance_gate import RelevanceGate, create_relevance_gate
+from src.semantic_cache import SemanticQueryCache, seed_from_results, dialog_text
+from src.context_assembly import ContextAssembler, CONTEXT_SEPARATOR, create_context_assembler
+from src.index_versions import active_index
+from src.checkpoints import CallCheckpointer, CALL_LEVEL
+from src.llm_scheduler import ScheduledChain
+from src.llm_cache import CachedChain, prompt_template_hash
+from src.metrics import REGISTRY, trace_call, span
 
 log = logging.getLogger("compliance_chain")
 
@@ -24,35 +51,57 @@ log = logging.getLogger("compliance_chain")
 # 1. VEKTÖR VERİTABANI YÜKLEYİCİ
 # =================================================================
 
-def load_vector_store_retriever():
+def load_vector_store_retriever(index: dict = None, embeddings=None):
     """
     Diske kaydedilmiş ChromaDB'yi ve lokal embedding modelini yükler.
     Bir 'retriever' nesnesi döndürür.
+    (Embedding modeli disk önbelleği üzerinden çalışır; tekrar eden sorgular
+    için model yeniden çalıştırılmaz.)
+    index verilmezse etkin index sürümü kullanılır; embeddings verilirse
+    (sürüm değişiminde) zaten yüklü model yeniden yüklenmez.
     """
-    log.info("Lokal embedding modeli yükleniyor...")
-    embeddings = HuggingFaceEmbeddings(
-        model_name=EMBEDDING_MODEL_NAME,
-        model_kwargs={'device': EMBEDDING_DEVICE}
-    )
+    index = index or active_index()
+    if embeddings is None:
+        log.info("Lokal embedding modeli yükleniyor...")
+        embeddings = create_embedding_model()
     
-    log.info(f"ChromaDB '{CHROMA_DB_PATH}' adresinden yükleniyor...")
+    if RETRIEVER_BACKEND == "numpy":
+        # Bellek içi (memmap) NumPy index'i: Chroma istemci katmanı olmadan arama
+        from src.numpy_index import NumpyVectorIndex, NumpyRetriever
+        log.info(f"NumPy vektör index'i (sürüm '{index['version']}') yükleniyor...")
+        return NumpyRetriever(index=NumpyVectorIndex(index["numpy_path"]), embeddings=embeddings, k=RETRIEVER_K)
+
+    from langchain_community.vectorstores import Chroma
+    log.info(f"ChromaDB '{index['chroma_path']}' (sürüm '{index['version']}') adresinden yükleniyor...")
     vector_store = Chroma(
-        persist_directory=CHROMA_DB_PATH,
+        persist_directory=index["chroma_path"],
         embedding_function=embeddings
     )
     
-    # Retriever'ı k=3 olarak ayarlıyoruz.
-    return vector_store.as_retriever(search_kwargs={"k": 3})
+    # Retriever'ı k=3 (RETRIEVER_K) olarak ayarlıyoruz.
+    return vector_store.as_retriever(search_kwargs={"k": RETRIEVER_K})
+
+def create_llm():
+    """
+    Zincirlerde kullanılan sohbet modelini oluşturur.
+    Tekrar deneme ve hız sınırlama süreç geneli zamanlayıcıda (llm_scheduler)
+    yapıldığı için istemcinin kendi tekrar denemeleri kapatılır.
+    """
+    if LLM_PROVIDER == "fake":
+        from src.fake_llm import FakeChatModel
+        return FakeChatModel()
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model=LLM_MODEL, openai_api_key=require_openai_api_key(), temperature=0, max_retries=0)
 
 # =================================================================
 # 2. ZİNCİR 1: TRANSKRİPT SEGMENTASYON ZİNCİRİ
 # =================================================================
 
-def create_segmentation_chain():
+def create_segmentation_chain(llm=None):
     """
     LLM Zincir 1: Ham transkripti alır, Soru-Cevap segmentlerine ayırır.
     """
-    llm = ChatOpenAI(model=LLM_MODEL, openai_api_key=OPENAI_API_KEY, temperature=0)
+    llm = llm if llm is not None else create_llm()
     
     parser = PydanticOutputParser(pydantic_object=TranscriptSegments)
     
@@ -89,11 +138,11 @@ class SearchQuery(BaseModel):
     """BDDK Vektör Veritabanı için zenginleştirilmiş, resmi arama sorgusu."""
     search_query: str = Field(description="BDDK mevzuat veritabanında arama yapmak için optimize edilmiş, resmi ve anahtar kelime bakımından zengin sorgu.")
 
-def create_query_transformation_chain():
+def create_query_transformation_chain(llm=None):
     """
     LLM Zincir 1.5: Günlük konuşmayı alır, resmi bir RAG arama sorgusuna dönüştürür.
     """
-    llm = ChatOpenAI(model=LLM_MODEL, openai_api_key=OPENAI_API_KEY, temperature=0)
+    llm = llm if llm is not None else create_llm()
     
     # Basit bir Pydantic parser yerine StrOutputParser da kullanabilirdik,
     # ancak Pydantic yapıya zorlayarak daha tutarlı sonuç alırız.
@@ -136,11 +185,11 @@ def create_query_transformation_chain():
 # 4. ZİNCİR 2: UYUMLULUK ANALİZ ZİNCİRİ
 # =================================================================
 
-def create_analysis_chain():
+def create_analysis_chain(llm=None):
     """
     LLM Zincir 2: Soru, Cevap ve RAG Mevzuatını alıp analiz eder.
     """
-    llm = ChatOpenAI(model=LLM_MODEL, openai_api_key=OPENAI_API_KEY, temperature=0)
+    llm = llm if llm is not None else create_llm()
     
     parser = PydanticOutputParser(pydantic_object=AnalysisResult)
     
@@ -181,23 +230,454 @@ def create_analysis_chain():
 # 5. ORKESTRASYON (TÜM ADIMLARI BİRLEŞTİRME) - GÜNCELLENDİ
 # =================================================================
 
-# Ana zincirleri bir kez oluşturup hafızada tut
-_SEGMENTATION_CHAIN = create_segmentation_chain()
-_QUERY_TRANSFORM_CHAIN = create_query_transformation_chain() # YENİ
-_ANALYSIS_CHAIN = create_analysis_chain()
-_RETRIEVER = load_vector_store_retriever()
+def wrap_chain(chain, stage: str, output_model, scheduler=None, use_cache: bool = LLM_CACHE_ENABLED):
+    """
+    Zinciri çalışma zamanı katmanlarıyla sarmalar:
+    kalıcı cevap önbelleği -> süreç geneli zamanlayıcı -> LLM.
+    """
+    wrapped = ScheduledChain(chain, stage, scheduler=scheduler)
+    if use_cache:
+        wrapped = CachedChain(wrapped, chain, stage, output_model)
+    return wrapped
+
+def build_chains(llm=None, scheduler=None, use_cache: bool = LLM_CACHE_ENABLED) -> dict:
+    """Üç zinciri sarmalanmış olarak oluşturur (aşama adı -> zincir)."""
+    return {
+        "segmentation": wrap_chain(create_segmentation_chain(llm), "segmentation", TranscriptSegments, scheduler, use_cache),
+        "query_transform": wrap_chain(create_query_transformation_chain(llm), "query_transform", SearchQuery, scheduler, use_cache),
+        "analysis": wrap_chain(create_analysis_chain(llm), "analysis", AnalysisResult, scheduler, use_cache),
+    }
+
+# Zincirler ve retriever ilk kullanımda bir kez oluşturulup hafızada tutulur.
+# Her zincir önce kalıcı önbelleğe bakar, sonra RPM/TPM bütçesini uygulayan
+# süreç geneli zamanlayıcıdan geçer.
+_CHAINS = None
+_RETRIEVAL_BATCHER = None
+_RELEVANCE_GATE = None
+_SEMANTIC_CACHE = None
+_CONTEXT_ASSEMBLER = None
+_ACTIVE_INDEX = None # Yüklü retriever'ın index sürümü ve yolları (index_versions.active_index)
+_LAST_INDEX_CHECK = 0.0
+_CHAINS_LOCK = threading.Lock()
+_RETRIEVER_LOCK = threading.Lock()
+_GATE_LOCK = threading.Lock()
+_SEMANTIC_CACHE_LOCK = threading.Lock()
+_ASSEMBLER_LOCK = threading.Lock()
+_RELOAD_LOCK = threading.Lock()
+
+# Bağlam derleme açıkken yeniden sıralama için sorgu başına daha fazla aday getirilir
+_RETRIEVAL_K = RAG_CANDIDATE_K if CONTEXT_ASSEMBLY_ENABLED else None
+
+def get_chains() -> dict:
+    """Sarmalanmış üç zinciri (aşama adı -> zincir) döndürür; ilk çağrıda oluşturur."""
+    global _CHAINS
+    with _CHAINS_LOCK:
+        if _CHAINS is None:
+            _CHAINS = build_chains()
+        return _CHAINS
+
+def get_retrieval_batcher() -> RetrievalBatcher:
+    """
+    Retriever'ı (embedding modeli + vektör index'i) ilk çağrıda yükler.
+    Eşzamanlı çağrıların retrieval isteklerini tek aramada birleştiren batcher'ı döndürür.
+    """
+    global _RETRIEVAL_BATCHER, _ACTIVE_INDEX
+    with _RETRIEVER_LOCK:
+        if _RETRIEVAL_BATCHER is None:
+            index = active_index()
+            _RETRIEVAL_BATCHER = RetrievalBatcher(
+                load_vector_store_retriever(index), k=_RETRIEVAL_K, index_version=index["version"]
+            )
+            _ACTIVE_INDEX = index
+        return _RETRIEVAL_BATCHER
+
+def loaded_index_version() -> Optional[str]:
+    """Yüklü retriever'ın index sürümü (henüz yüklenmediyse ya da configure() ile verildiyse None)."""
+    batcher = _RETRIEVAL_BATCHER
+    return batcher.index_version if batcher is not None else None
+
+def reload_index_if_changed(force_check: bool = False) -> bool:
+    """
+    Etkin index sürümü (CURRENT işaretçisi) değiştiyse yeni sürümü yükler ve
+    retriever'ı atomik olarak değiştirir. Yükleme sırasında eski sürüm hizmet
+    vermeye devam eder; o anda çalışan çağrılar başladıkları retriever ile biter.
+    İşaretçi en fazla INDEX_RELOAD_CHECK_SECONDS'ta bir okunur.
+    configure() ile verilmiş retriever'lar (sürümü olmayan) değiştirilmez.
+    """
+    global _RETRIEVAL_BATCHER, _ACTIVE_INDEX, _RELEVANCE_GATE, _LAST_INDEX_CHECK
+    now = time.monotonic()
+    if not force_check and now - _LAST_INDEX_CHECK < INDEX_RELOAD_CHECK_SECONDS:
+        return False
+    _LAST_INDEX_CHECK = now
+    batcher = _RETRIEVAL_BATCHER
+    if batcher is None or batcher.index_version is None:
+        return False
+    index = active_index()
+    if index["version"] == batcher.index_version:
+        return False
+    # Aynı anda başka bir çağrı yeniden yüklüyorsa beklenmez
+    if not _RELOAD_LOCK.acquire(blocking=False):
+        return False
+    try:
+        start = time.perf_counter()
+        retriever = load_vector_store_retriever(index, embeddings=retriever_embeddings(batcher.retriever))
+        new_batcher = RetrievalBatcher(retriever, k=_RETRIEVAL_K, index_version=index["version"])
+        with _RETRIEVER_LOCK:
+            _RETRIEVAL_BATCHER = new_batcher
+            _ACTIVE_INDEX = index
+        # İlgililik filtresinin konu merkezleri sürüme bağlıdır. Anlamsal önbellek
+        # değildir (embedding modeli ve şablonla anahtarlanır, aynı embedding nesnesi
+        # kullanılır); çalışan çağrılar kullanmaya devam edebilsin diye korunur.
+        with _GATE_LOCK:
+            _RELEVANCE_GATE = None
+        REGISTRY.inc("compliance_index_reloads_total")
+        log.info(
+            f"Index sürümü '{batcher.index_version}' -> '{index['version']}' "
+            f"{time.perf_counter() - start:.2f} sn'de yüklendi."
+        )
+        return True
+    finally:
+        _RELOAD_LOCK.release()
+
+def get_relevance_gate() -> RelevanceGate:
+    """
+    Yerel ilgililik filtresini retriever'ın embedding modeli ve index'i ile
+    ilk çağrıda oluşturur (konu merkezleri diskte yoksa index'ten hesaplanır).
+    """
+    global _RELEVANCE_GATE
+    with _GATE_LOCK:
+        if _RELEVANCE_GATE is None:
+            retriever = get_retrieval_batcher().retriever
+            centroids_path = _ACTIVE_INDEX["centroids_path"] if _ACTIVE_INDEX else None
+            _RELEVANCE_GATE = create_relevance_gate(retriever, centroids_path=centroids_path)
+        return _RELEVANCE_GATE
+
+def get_semantic_cache() -> SemanticQueryCache:
+    """
+    Sorgu zenginleştirme anlamsal önbelleğini retriever'ın embedding modeliyle
+    ilk çağrıda açar; önbellek boşsa geçmiş analiz sonuçlarından doldurur.
+    """
+    global _SEMANTIC_CACHE
+    from src.embedding_cache import embedding_model_id
+
+    with _SEMANTIC_CACHE_LOCK:
+        if _SEMANTIC_CACHE is None:
+            # Şablon hash'i için model gerekmez: prompt, yer tutucu bir adımla zincirlenir
+            template_hash = prompt_template_hash(create_query_transformation_chain(llm=RunnableLambda(lambda x: x)))
+            embeddings = retriever_embeddings(get_retrieval_batcher().retriever)
+            cache = SemanticQueryCache(embeddings, embedding_model_id(), template_hash)
+            if len(cache) == 0:
+                try:
+                    seed_from_results(cache)
+                except Exception as e:
+                    log.warning(f"Anlamsal önbellek geçmiş sonuçlardan doldurulamadı: {e}")
+            _SEMANTIC_CACHE = cache
+        return _SEMANTIC_CACHE
+
+def get_context_assembler() -> ContextAssembler:
+    """Bağlam derleyicisini oluşturur (cross-encoder ilk yeniden sıralamada yüklenir)."""
+    global _CONTEXT_ASSEMBLER
+    with _ASSEMBLER_LOCK:
+        if _CONTEXT_ASSEMBLER is None:
+            _CONTEXT_ASSEMBLER = create_context_assembler()
+        return _CONTEXT_ASSEMBLER
+
+def configure(chains: dict = None, retriever=None, relevance_gate: RelevanceGate = None,
+              semantic_cache: SemanticQueryCache = None, context_assembler: ContextAssembler = None):
+    """
+    Varsayılan kaynaklar yerine verilen zincirleri, retriever'ı, ilgililik filtresini,
+    anlamsal önbelleği ve/veya bağlam derleyicisini kullanır (offline benchmark, sahte
+    LLM ile deneme vb.). Verilmeyenler değişmez; yalnızca retriever verilirse embedding
+    modeline bağlı filtre ve önbellek yeni retriever'dan tekrar oluşturulur.
+    """
+    global _CHAINS, _RETRIEVAL_BATCHER, _ACTIVE_INDEX, _RELEVANCE_GATE, _SEMANTIC_CACHE, _CONTEXT_ASSEMBLER
+    if chains is not None:
+        with _CHAINS_LOCK:
+            _CHAINS = chains
+    if retriever is not None:
+        with _RETRIEVER_LOCK:
+            _RETRIEVAL_BATCHER = RetrievalBatcher(retriever, k=_RETRIEVAL_K)
+            _ACTIVE_INDEX = None
+    if retriever is not None or relevance_gate is not None:
+        with _GATE_LOCK:
+            _RELEVANCE_GATE = relevance_gate
+    if retriever is not None or semantic_cache is not None:
+        with _SEMANTIC_CACHE_LOCK:
+            _SEMANTIC_CACHE = semantic_cache
+    if context_assembler is not None:
+        with _ASSEMBLER_LOCK:
+            _CONTEXT_ASSEMBLER = context_assembler
+
+def warm_up(retriever: bool = True) -> dict:
+    """
+    Zincirleri ve (istenirse) retriever'ı önceden yükler; ilk çağrının yükleme
+    maliyetini ödememesi için worker/servis başlangıcında çağrılır.
+    Her kaynağın yüklenme süresini (saniye) döndürür.
+    """
+    timings = {}
+    start = time.perf_counter()
+    get_chains()
+    timings["chains_seconds"] = round(time.perf_counter() - start, 3)
+    if retriever:
+        start = time.perf_counter()
+        batcher = get_retrieval_batcher()
+        # Embedding modelini ilk encode'a kadar tembel yükleyen sürümler için bir sorgu vektörize et
+        embeddings = retriever_embeddings(batcher.retriever)
+        if embeddings is not None:
+            embeddings.embed_query("ısınma")
+        timings["retriever_seconds"] = round(time.perf_counter() - start, 3)
+        if RELEVANCE_GATE_ENABLED:
+            start = time.perf_counter()
+            try:
+                get_relevance_gate()
+                timings["relevance_gate_seconds"] = round(time.perf_counter() - start, 3)
+            except Exception as e:
+                # Filtre olmadan da analiz yapılabilir (gate_segments tüm segmentleri geçirir)
+                log.warning(f"İlgililik filtresi yüklenemedi: {e}")
+        if SEMANTIC_CACHE_ENABLED:
+            start = time.perf_counter()
+            try:
+                get_semantic_cache()
+                timings["semantic_cache_seconds"] = round(time.perf_counter() - start, 3)
+            except Exception as e:
+                log.warning(f"Anlamsal sorgu önbelleği yüklenemedi: {e}")
+        if CONTEXT_ASSEMBLY_ENABLED:
+            start = time.perf_counter()
+            try:
+                reranker = get_context_assembler().reranker
+                if reranker is not None:
+                    reranker.load()
+                timings["reranker_seconds"] = round(time.perf_counter() - start, 3)
+            except Exception as e:
+                # Yeniden sıralama olmadan adaylar retrieval skoruna göre derlenir
+                log.warning(f"Cross-encoder yüklenemedi: {e}")
+    log.info(f"Kaynaklar hazır: {timings}")
+    return timings
+
+async def segment_transcript(segmentation_chain, full_transcript: str) -> list:
+    """
+    Transkripti Soru-Cevap segmentlerine ayırır. Kısa transkriptler tek istekle
+    segmentlenir; SEGMENTATION_WINDOW_MIN_CHARS'ı aşanlar çakışan konuşma sırası
+    pencerelerine bölünür, pencereler eşzamanlı segmentlenir ve çakışma
+    bölgelerindeki tekrar eden segmentler birleştirilir. Bir pencere bile başarısız
+    olursa hata yükseltilir ve çağrı 'failed' olur: eksik segmentlerle 'processed'
+    sayılan bir denetim, boşluğu gizler. Başarılı pencereler LLM önbelleğinde
+    olduğundan tekrar denemede yalnızca başarısız pencereler LLM'e gider.
+    """
+    windows = []
+    if SEGMENTATION_WINDOWING_ENABLED and len(full_transcript) > SEGMENTATION_WINDOW_MIN_CHARS:
+        windows = build_windows(split_turns(full_transcript))
+
+    if len(windows) <= 1:
+        with span("segmentation"):
+            return (await segmentation_chain.ainvoke({"transcript": full_transcript})).segments
+
+    log.info(f"Uzun transkript ({len(full_transcript)} karakter) {len(windows)} pencerede segmentleniyor...")
+
+    async def segment_window(w: int, window: str):
+        try:
+            with span("segmentation", window=w + 1):
+                return (await segmentation_chain.ainvoke({"transcript": window})).segments
+        except Exception as e:
+            log.error(f"Segmentasyon penceresi {w+1}/{len(windows)} hatası: {e}")
+            return e
+
+    results = await asyncio.gather(*(segment_window(w, window) for w, window in enumerate(windows)))
+    failed = [r for r in results if isinstance(r, Exception)]
+    REGISTRY.inc("compliance_segmentation_windows_total", len(results) - len(failed), outcome="segmented")
+    if failed:
+        REGISTRY.inc("compliance_segmentation_windows_total", len(failed), outcome="failed")
+        log.error(f"{len(failed)}/{len(windows)} segmentasyon penceresi başarısız; çağrı eksik segmentlerle işlenmeyecek.")
+        raise failed[0]
+    return merge_window_segments(results)
 
-async def run_compliance_analysis(full_transcript: str) -> List[dict]:
+async def gate_segments(segments) -> Optional[List[dict]]:
+    """
+    Segmentleri yerel ilgililik filtresiyle puanlar (LLM çağrısı yapılmaz).
+    Filtre kapalıysa ya da yüklenemezse None döner ve tüm segmentler analiz edilir.
+    """
+    if not RELEVANCE_GATE_ENABLED:
+        return None
+    try:
+        gate = await asyncio.to_thread(get_relevance_gate)
+        with span("relevance_gate", segments=len(segments)):
+            return await asyncio.to_thread(gate.evaluate, segments)
+    except Exception as e:
+        log.warning(f"İlgililik filtresi çalıştırılamadı, tüm segmentler analiz edilecek: {e}")
+        return None
+
+async def cached_search_queries(segments) -> dict:
+    """
+    Soru-cevap çiftlerine anlamsal olarak çok yakın (eşik üstü) geçmiş çiftler için
+    önbellekteki zenginleştirilmiş sorguları döndürür: {liste indeksi: search_query}.
+    Önbellek kapalıysa ya da çalıştırılamazsa boş sözlük döner (tüm sorgular LLM'e gider).
+    """
+    if not SEMANTIC_CACHE_ENABLED or not segments:
+        return {}
+    try:
+        cache = await asyncio.to_thread(get_semantic_cache)
+        with span("semantic_cache", segments=len(segments)):
+            texts = [dialog_text(s.customer_query, s.agent_response) for s in segments]
+            lookups = await asyncio.to_thread(cache.lookup_many, texts)
+    except Exception as e:
+        log.warning(f"Anlamsal sorgu önbelleği çalıştırılamadı, tüm sorgular LLM ile zenginleştirilecek: {e}")
+        return {}
+    return {k: d["search_query"] for k, d in enumerate(lookups) if d["search_query"] is not None}
+
+async def remember_search_queries(segments, search_queries: List[str]):
+    """LLM ile zenginleştirilen sorguları sonraki çağrılar için anlamsal önbelleğe ekler."""
+    if not SEMANTIC_CACHE_ENABLED or not segments:
+        return
+    try:
+        cache = await asyncio.to_thread(get_semantic_cache)
+        texts = [dialog_text(s.customer_query, s.agent_response) for s in segments]
+        await asyncio.to_thread(cache.add_many, texts, search_queries)
+    except Exception as e:
+        log.warning(f"Zenginleştirilmiş sorgular anlamsal önbelleğe yazılamadı: {e}")
+
+async def assemble_contexts(queries: List[str], rag_results: List[list]) -> List[dict]:
+    """
+    Her sorgunun aday parçalarından analiz bağlamını derler (yeniden sıralama,
+    aynı sayfadaki çakışan parçaları birleştirme, token bütçesi). Derleme kapalıysa
+    ya da başarısız olursa parçalar önceki gibi olduğu gibi birleştirilir.
+    """
+    if CONTEXT_ASSEMBLY_ENABLED:
+        try:
+            assembler = await asyncio.to_thread(get_context_assembler)
+            with span("context_assembly", queries=len(queries)):
+                return await asyncio.to_thread(assembler.assemble_many, queries, rag_results)
+        except Exception as e:
+            log.warning(f"Bağlam derlenemedi, ilk {RETRIEVER_K} parça kullanılacak: {e}")
+    return [
+        {
+            "context": CONTEXT_SEPARATOR.join(doc.page_content for doc in docs[:RETRIEVER_K]),
+            "docs": docs[:RETRIEVER_K],
+            "context_tokens": None,
+            "tokens_saved": None,
+        }
+        for docs in rag_results
+    ]
+
+async def load_checkpoint(checkpoint: Optional[CallCheckpointer]) -> Optional[CallCheckpointer]:
+    """Çağrının önceki ara kayıtlarını okur; okunamazsa kayıtsız (baştan) devam edilir."""
+    if checkpoint is None:
+        return None
+    try:
+        steps = await asyncio.to_thread(checkpoint.load)
+    except Exception as e:
+        log.warning(f"Ara kayıtlar okunamadı, çağrı baştan analiz edilecek: {e}")
+        return None
+    if steps:
+        log.info(f"Çağrı ara kayıttan devam ediyor: {steps} tamamlanmış adım bulundu.")
+    return checkpoint
+
+async def save_checkpoint(checkpoint: Optional[CallCheckpointer], stage: str, payloads: dict):
+    """Tamamlanan adımları kaydeder. Kayıt hatası analizi durdurmaz (çağrı sadece devam edemez)."""
+    if checkpoint is None or not payloads:
+        return
+    try:
+        await asyncio.to_thread(checkpoint.save_many, stage, payloads)
+    except Exception as e:
+        log.warning(f"'{stage}' ara kaydı yazılamadı: {e}")
+
+def context_record(assembled: dict, index_version: Optional[str]) -> dict:
+    """Derlenmiş bağlamı ara kayda ve sonuca yazılacak biçime (parça referanslarıyla) getirir."""
+    return {
+        "context": assembled["context"],
+        "rag_chunks": [chunk_reference(doc) for doc in assembled["docs"]],
+        "context_tokens": assembled["context_tokens"],
+        "tokens_saved": assembled["tokens_saved"],
+        "index_version": index_version,
+    }
+
+def analyzed_segment_result(i: int, segment, search_query: str, context: dict,
+                            analysis_result: AnalysisResult, relevance_score: Optional[float]) -> dict:
+    """LLM ile analiz edilen segmentin veritabanına eklenecek sonuç kaydı."""
+    return {
+        "segment_index": i + 1,
+        "customer_query": segment.customer_query,
+        "agent_response": segment.agent_response,
+        "search_query": search_query,
+        "rag_context": context["context"], # Hata ayıklama/raporlama için (DB'ye yazılmaz)
+        "context_tokens": context["context_tokens"],
+        "context_tokens_saved": context["tokens_saved"],
+        "index_version": context["index_version"],
+        "rag_chunks": context["rag_chunks"], # DB'de chunk id + skor olarak saklanır
+        "violation_detected": analysis_result.violation_detected,
+        "omission_detected": analysis_result.omission_detected,
+        "analysis": analysis_result.analysis,
+        "suggestion": analysis_result.suggestion,
+        "relevance_score": relevance_score
+    }
+
+def skipped_segment_result(i: int, segment, decision: dict) -> dict:
+    """İlgililik filtresine takılan segment için (LLM'siz) sonuç kaydı."""
+    REGISTRY.inc("compliance_segments_total", outcome="skipped_irrelevant")
+    # Sorgu zenginleştirme + analiz: segment başına iki LLM çağrısı
+    REGISTRY.inc("compliance_llm_calls_avoided_total", 2, reason="relevance_gate")
+    return {
+        "segment_index": i + 1,
+        "customer_query": segment.customer_query,
+        "agent_response": segment.agent_response,
+        "rag_context": "",
+        "rag_chunks": [],
+        "violation_detected": None,
+        "omission_detected": None,
+        "analysis": f"Mevzuatla ilgisiz segment (ilgililik skoru {decision['score']:.2f}); LLM analizi yapılmadı.",
+        "suggestion": None,
+        "relevance_score": decision["score"],
+        "skipped_reason": "relevance_gate"
+    }
+
+async def run_compliance_analysis(full_transcript: str, checkpoint: Optional[CallCheckpointer] = None) -> List[dict]:
     """
     Bir çağrı transkripti için tam "Çift Aşamalı RAG Analizi" akışını çalıştırır.
+    Her aşama ve segment için span'ler, token sayıları ve önbellek isabetleri
+    aktif çağrı izine (src.metrics.trace_call) ve süreç geneli metriklere yazılır.
+    checkpoint verilirse (worker) tamamlanan adımlar kaydedilir ve çağrı daha önce
+    yarıda kaldıysa yalnızca eksik adımlar yapılır.
+    """
+    try:
+        # Yeni index sürümü etkinleştirildiyse çağrılar arasında yüklenir
+        await asyncio.to_thread(reload_index_if_changed)
+    except Exception as e:
+        log.warning(f"Yeni index sürümü yüklenemedi, mevcut sürümle devam ediliyor: {e}")
+    with trace_call() as trace:
+        results = await _analyze_transcript(full_transcript, checkpoint)
+        trace.segments = len(results)
+        trace.segments_skipped = sum(1 for r in results if r.get("skipped_reason"))
+    summary = trace.summary()
+    log.info(
+        f"Çağrı izi: {summary['total_seconds']} sn, aşamalar={summary['stage_seconds']}, "
+        f"atlanan segment={summary['segments_skipped']}/{summary['segments']}, "
+        f"token={summary['prompt_tokens']}+{summary['completion_tokens']}, "
+        f"önbellek={summary['llm_cache_hits']} isabet/{summary['llm_cache_misses']} ıskalama"
+    )
+    return results
+
+async def _analyze_transcript(full_transcript: str, checkpoint: Optional[CallCheckpointer] = None) -> List[dict]:
+    """
+    Segmentasyon -> sorgu zenginleştirme -> toplu RAG -> analiz akışı.
     (GÜNCELLENDİ: Sorgu Zenginleştirme adımı eklendi)
+    (GÜNCELLENDİ: Tüm segmentlerin RAG sorguları tek seferde (batch) aranır;
+    process_batch ile eşzamanlı çalışan çağrıların sorguları da aynı aramada birleşir.)
+    (GÜNCELLENDİ: Segmentasyon ve segment başına sorgu, bağlam ve analiz sonuçları
+    ara kayıt olarak saklanır; yarıda kalan çağrıda kayıtlı adımlar tekrar yapılmaz.)
     """
     log.info("Akış başlatıldı: Adım 1 - Segmentasyon...")
+    chains = get_chains()
+    checkpoint = await load_checkpoint(checkpoint)
     
     try:
         # --- ADIM 1: Transkripti Soru-Cevap segmentlerine ayır ---
-        transcript_segments = await _SEGMENTATION_CHAIN.ainvoke({"transcript": full_transcript})
-        all_segments = transcript_segments.segments
+        saved_segments = checkpoint.get("segmentation") if checkpoint else None
+        if saved_segments is not None:
+            all_segments = [Segment(**segment) for segment in saved_segments]
+            log.info("Segmentasyon ara kayıttan alındı.")
+        else:
+            all_segments = await segment_transcript(chains["segmentation"], full_transcript)
+            if all_segments:
+                await save_checkpoint(checkpoint, "segmentation", {CALL_LEVEL: [s.model_dump() for s in all_segments]})
         
         if not all_segments:
             log.warning("Transkriptte analize uygun segment bulunamadı.")
@@ -209,55 +689,188 @@ async def run_compliance_analysis(full_transcript: str) -> List[dict]:
         log.error(f"Adım 1 (Segmentasyon) hatası: {e}")
         raise
 
-    analysis_results_for_db = []
-    
-    # --- ADIM 1.5, 2 & 3: Her segment için Zenginleştirme, RAG ve Analiz ---
-    for i, segment in enumerate(all_segments):
-        log.info(f"Segment {i+1}/{len(all_segments)} işleniyor: '{segment.customer_query[:50]}...'")
-        
-        try:
-            # --- ADIM 1.5: Sorgu Zenginleştirme (YENİ ADIM) ---
-            log.info(f" -> Adım 1.5: Sorgu Zenginleştirme...")
-            query_input = {
-                "customer_query": segment.customer_query,
-                "agent_response": segment.agent_response
-            }
-            # _QUERY_TRANSFORM_CHAIN bir SearchQuery nesnesi döndürür
-            transformed_query_obj: SearchQuery = await _QUERY_TRANSFORM_CHAIN.ainvoke(query_input)
-            search_query = transformed_query_obj.search_query
-            log.info(f" -> RAG Sorgusu Zenginleştirildi: '{search_query}'")
-            
-            # --- ADIM 2: Hedefli RAG (GÜNCELLENDİ) ---
-            # Zenginleştirilmiş sorgu ile RAG'ı çağır
-            rag_docs = await _RETRIEVER.ainvoke(search_query)
-            
-            rag_context = "\n---\n".join([doc.page_content for doc in rag_docs])
-            
-            # --- ADIM 3: Çapraz Analiz ---
-            log.info(f" -> Adım 3: Çapraz Analiz yapılıyor...")
-            analysis_input = {
-                "rag_context": rag_context,
-                "customer_query": segment.customer_query,
-                "agent_response": segment.agent_response
-            }
-            analysis_result: AnalysisResult = await _ANALYSIS_CHAIN.ainvoke(analysis_input)
-            
-            # Sonucu veritabanına eklenecek formata getir
-            db_entry = {
-                "segment_index": i + 1,
-                "customer_query": segment.customer_query,
-                "agent_response": segment.agent_response,
-                "rag_context": rag_context, # Hata ayıklama için alakasız gelse bile kaydediyoruz
-                "violation_detected": analysis_result.violation_detected,
-                "omission_detected": analysis_result.omission_detected,
-                "analysis": analysis_result.analysis,
-                "suggestion": analysis_result.suggestion
-            }
-            analysis_results_for_db.append(db_entry)
-            
-        except Exception as e:
-            log.error(f"Segment {i+1} işlenirken hata (Zenginleştirme, RAG veya Analiz): {e}")
-            continue 
+    # --- ADIM 1.2: Yerel ilgililik filtresi (selamlaşma, kimlik doğrulama vb. LLM'e gitmez) ---
+    decisions = await gate_segments(all_segments)
+    candidates = [i for i in range(len(all_segments)) if decisions is None or decisions[i]["relevant"]]
+    skipped_results = [
+        skipped_segment_result(i, all_segments[i], decisions[i])
+        for i in range(len(all_segments)) if decisions is not None and not decisions[i]["relevant"]
+    ]
+    if skipped_results:
+        log.info(f"İlgililik filtresi: {len(skipped_results)}/{len(all_segments)} segment LLM'e gönderilmeden atlandı.")
+
+    # Önceki denemede analizi tamamlanan segmentler için hiçbir adım tekrarlanmaz
+    resumed_results = []
+    if checkpoint is not None:
+        for i in list(candidates):
+            saved_result = checkpoint.get("analysis", i + 1)
+            if saved_result is not None:
+                resumed_results.append(saved_result)
+                candidates.remove(i)
+        if resumed_results:
+            log.info(f"{len(resumed_results)} segmentin analizi ara kayıttan alındı.")
+
+    # Segmentler birbirinden bağımsızdır: çağrı başına en fazla SEGMENT_CONCURRENCY
+    # segmentin LLM istekleri aynı anda çalışır.
+    semaphore = asyncio.Semaphore(SEGMENT_CONCURRENCY)
+
+    # --- ADIM 1.5: Her segment için Sorgu Zenginleştirme (eşzamanlı) ---
+    async def transform_segment(i: int, segment) -> Optional[str]:
+        async with semaphore:
+            log.info(f"Segment {i+1}/{len(all_segments)} işleniyor: '{segment.customer_query[:50]}...'")
+            try:
+                log.info(f" -> Adım 1.5: Sorgu Zenginleştirme...")
+                query_input = {
+                    "customer_query": segment.customer_query,
+                    "agent_response": segment.agent_response
+                }
+                # Sorgu zenginleştirme zinciri bir SearchQuery nesnesi döndürür
+                with span("query_transform", segment=i + 1):
+                    transformed_query_obj: SearchQuery = await chains["query_transform"].ainvoke(query_input)
+                search_query = transformed_query_obj.search_query
+                log.info(f" -> RAG Sorgusu Zenginleştirildi: '{search_query}'")
+                return search_query
+
+            except Exception as e:
+                log.error(f"Segment {i+1} işlenirken hata (Zenginleştirme): {e}")
+                REGISTRY.inc("compliance_segments_total", outcome="query_transform_failed")
+                return None
+
+    # Önceki denemede zenginleştirilmiş sorgular ara kayıttan alınır
+    restored = {}
+    if checkpoint is not None:
+        for i in candidates:
+            saved_query = checkpoint.get("search_query", i + 1)
+            if saved_query is not None:
+                restored[i] = saved_query["search_query"]
+    pending = [i for i in candidates if i not in restored]
+
+    # Daha önce çok benzer bir soru için üretilmiş sorgu varsa LLM çağrılmaz
+    cached = await cached_search_queries([all_segments[i] for i in pending])
+    if cached:
+        log.info(f" -> Adım 1.5: {len(cached)}/{len(pending)} sorgu anlamsal önbellekten alındı.")
+    to_transform = [i for k, i in enumerate(pending) if k not in cached]
+
+    transformed = await asyncio.gather(*(transform_segment(i, all_segments[i]) for i in to_transform))
+    generated = {i: q for i, q in zip(to_transform, transformed) if q is not None}
+    await remember_search_queries([all_segments[i] for i in generated], list(generated.values()))
+
+    # segment sırası -> zenginleştirilmiş sorgu (başarısız segmentler atlanır)
+    new_queries = {pending[k]: q for k, q in cached.items()}
+    new_queries.update(generated)
+    await save_checkpoint(checkpoint, "search_query", {i + 1: {"search_query": q} for i, q in new_queries.items()})
+    search_queries = dict(sorted({**restored, **new_queries}.items()))
+
+    if not search_queries:
+        log.info("Tüm akış tamamlandı. 0 adet başarılı analiz sonucu.")
+        return sorted(resumed_results + skipped_results, key=lambda entry: entry["segment_index"])
+
+    # --- ADIM 2: Hedefli RAG (Toplu) ---
+    # Tüm sorgular tek embed_documents çağrısı ve tek çoklu-sorgu arama ile işlenir
+    segment_order = list(search_queries)
+    try:
+        # İlk çağrıda retriever yüklenirken event loop bloklanmaz
+        batcher = await asyncio.to_thread(get_retrieval_batcher)
+        # Kayıtlı bağlamlar yalnızca aynı index sürümünde derlendiyse kullanılır
+        context_by_segment = {}
+        if checkpoint is not None:
+            for i in segment_order:
+                saved_context = checkpoint.get("context", i + 1)
+                if saved_context is not None and saved_context["index_version"] == batcher.index_version:
+                    context_by_segment[i] = saved_context
+    except Exception as e:
+        log.error(f"Adım 2 (RAG) hatası: {e}")
+        raise
+    to_retrieve = [i for i in segment_order if i not in context_by_segment]
+    rag_results = []
+    if to_retrieve:
+        log.info(f" -> Adım 2: {len(to_retrieve)} sorgu için toplu RAG araması...")
+        # Span, toplu arama penceresinde bekleme süresini de içerir
+        with span("retrieval", queries=len(to_retrieve)):
+            retrieved = await batcher.retrieve_many_tolerant([search_queries[i] for i in to_retrieve])
+        # Araması başarısız olan segmentler (önceki segment bazlı akıştaki gibi) atlanır
+        rag_results = [docs for docs in retrieved if docs is not None]
+        to_retrieve = [i for i, docs in zip(to_retrieve, retrieved) if docs is not None]
+        segment_order = [i for i in segment_order if i in context_by_segment or i in to_retrieve]
+    contexts = await assemble_contexts([search_queries[i] for i in to_retrieve], rag_results) if to_retrieve else []
+    new_contexts = {i: context_record(assembled, batcher.index_version) for i, assembled in zip(to_retrieve, contexts)}
+    await save_checkpoint(checkpoint, "context", {i + 1: c for i, c in new_contexts.items()})
+    context_by_segment.update(new_contexts)
+    saved = [c["tokens_saved"] for c in contexts if c["tokens_saved"] is not None]
+    if saved:
+        log.info(f" -> Adım 2.5: Bağlam derlendi; segment başına ortalama {sum(saved) / len(saved):.0f} token tasarruf.")
+
+    # --- ADIM 3: Her segment için Çapraz Analiz (eşzamanlı) ---
+    async def analyze_segment(i: int) -> Optional[dict]:
+        segment = all_segments[i]
+        async with semaphore:
+            try:
+                assembled = context_by_segment[i]
+                rag_context = assembled["context"]
+
+                log.info(f" -> Adım 3: Segment {i+1} için Çapraz Analiz yapılıyor...")
+                analysis_input = {
+                    "rag_context": rag_context,
+                    "customer_query": segment.customer_query,
+                    "agent_response": segment.agent_response
+                }
+                with span("analysis", segment=i + 1):
+                    analysis_result: AnalysisResult = await chains["analysis"].ainvoke(analysis_input)
+                REGISTRY.inc("compliance_segments_total", outcome="analyzed")
+
+                # Sonucu veritabanına eklenecek formata getir
+                result = analyzed_segment_result(
+                    i, segment, search_queries[i], assembled, analysis_result,
+                    decisions[i]["score"] if decisions is not None else None
+                )
+                await save_checkpoint(checkpoint, "analysis", {i + 1: result})
+                return result
+
+            except Exception as e:
+                log.error(f"Segment {i+1} işlenirken hata (Analiz): {e}")
+                REGISTRY.inc("compliance_segments_total", outcome="analysis_failed")
+                return None
+
+    analyzed = await asyncio.gather(*(analyze_segment(i) for i in segment_order))
+    # Atlanan segmentler de kaydedilir; sonuçlar segment_index'e göre sıralı kalır
+    analysis_results_for_db = sorted(
+        [entry for entry in analyzed if entry is not None] + resumed_results + skipped_results,
+        key=lambda entry: entry["segment_index"]
+    )
 
     log.info(f"Tüm akış tamamlandı. {len(analysis_results_for_db)} adet başarılı analiz sonucu.")
-    return analysis_results_for_db
\ No newline at end of file
+    return analysis_results_for_db
+
+# =================================================================
+# 6. SOĞUK BAŞLANGIÇ (COLD START) ÖLÇÜMÜ
+# =================================================================
+
+# Import süresi ölçülen giriş noktaları
+_ENTRY_POINT_MODULES = ("src.config", "src.setup_db", "src.compliance_chain", "src.main")
+
+def measure_cold_start(modules=_ENTRY_POINT_MODULES) -> dict:
+    """
+    Her modülün import süresini ayrı (soğuk) bir Python sürecinde ölçer,
+    ardından bu süreçte zincirlerin ve retriever'ın yüklenme süresini ekler.
+    """
+    report = {"import_seconds": {}}
+    for module in modules:
+        code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+        completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        if completed.returncode != 0:
+            report["import_seconds"][module] = None
+            log.error(f"'{module}' import edilemedi: {completed.stderr.strip().splitlines()[-1:]}")
+            continue
+        report["import_seconds"][module] = round(float(completed.stdout.strip().splitlines()[-1]), 3)
+    report["warm_up"] = warm_up()
+    return report
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Uyumluluk zincirleri: ısınma ve soğuk başlangıç ölçümü.")
+    parser.add_argument("--cold-start", action="store_true", help="Giriş noktalarının import ve yükleme sürelerini ölç")
+    args = parser.parse_args()
+    if args.cold_start:
+        print(json.dumps(measure_cold_start(), indent=2))
+    else:
+        print(json.dumps(warm_up(), indent=2))
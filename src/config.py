@@ -9,12 +9,88 @@ load_dotenv()
 # LLM AYARLARI (ANALİZ VE ÇIKARIM İÇİN)
 # =================================================================
 # Faz 2'deki analiz için OpenAI'nin güçlü modellerini kullanacağız.
+# Import sırasında kontrol edilmez: anahtar sadece OpenAI istemcisi oluşturulurken
+# gerekir (setup_db, export vb. araçlar ve LLM_PROVIDER="fake" anahtarsız çalışır).
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY ortam değişkeni bulunamadı. .env dosyasını kontrol edin.")
+
+def require_openai_api_key() -> str:
+    """OpenAI anahtarını döndürür; tanımlı değilse hata verir."""
+    if not OPENAI_API_KEY:
+        raise ValueError("OPENAI_API_KEY ortam değişkeni bulunamadı. .env dosyasını kontrol edin.")
+    return OPENAI_API_KEY
 
 LLM_MODEL = "gpt-4-turbo" # Veya "gpt-4o" - Uyumluluk analizi için güçlü bir model şart.
 
+# Bir çağrı içinde aynı anda işlenebilecek maksimum segment sayısı
+# (sorgu zenginleştirme ve analiz LLM istekleri bu sınırla eşzamanlı çalışır).
+SEGMENT_CONCURRENCY = 4
+
+# Pencereli (windowed) segmentasyon: bu uzunluğu (karakter) aşan transkriptler
+# çakışan konuşma sırası pencerelerine bölünüp eşzamanlı segmentlere ayrılır.
+# Daha kısa transkriptler tek seferde (tek istek) segmentlenir.
+SEGMENTATION_WINDOWING_ENABLED = True
+SEGMENTATION_WINDOW_MIN_CHARS = 12000
+SEGMENTATION_WINDOW_CHARS = 6000 # Her pencerenin yaklaşık uzunluğu
+SEGMENTATION_WINDOW_OVERLAP_TURNS = 6 # Komşu pencerelerin paylaştığı konuşma sırası sayısı
+# Çakışma bölgesinde iki segmentin aynı sayılması için gereken benzerlik (0-1)
+SEGMENTATION_DEDUP_SIMILARITY = 0.85
+
+# Yerel ilgililik filtresi (relevance gate): sorgu zenginleştirmeden önce her segment,
+# BDDK index'inden çıkarılan konu merkezlerine (centroid) embedding benzerliği ve
+# bankacılık anahtar kelimeleriyle puanlanır. Eşiğin altındaki segmentler (selamlaşma,
+# kimlik doğrulama vb.) LLM'e gönderilmeden 'atlandı' olarak kaydedilir.
+# Eşik, 'python -m src.relevance_gate --evaluate' ile geçmiş sonuçlar üzerinde ayarlanabilir.
+RELEVANCE_GATE_ENABLED = True
+RELEVANCE_GATE_THRESHOLD = 0.30 # skor = en yakın konu merkezine kosinüs + anahtar kelime bonusu
+RELEVANCE_KEYWORD_BONUS = 0.20 # Eşleşen her anahtar kelime için (en fazla 2)
+RELEVANCE_TOPIC_COUNT = 32 # Index'ten k-means ile çıkarılan konu merkezi sayısı
+RELEVANCE_CENTROIDS_PATH = "db/relevance_centroids.npz"
+
+# Sorgu zenginleştirme için anlamsal önbellek: müşteri sorusunun embedding'ine en yakın
+# kayıt bu benzerliğin (kosinüs) üzerindeyse LLM çağrılmadan onun arama sorgusu kullanılır.
+# Önbellek ilk açılışta geçmiş sonuçlardan ('search_query' kolonu) doldurulur.
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE_PATH = "db/semantic_query_cache.sqlite"
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_AUDIT_SAMPLE_RATE = 0.05 # Denetim tablosuna yazılan karar oranı
+SEMANTIC_CACHE_REFRESH_SECONDS = 60 # Diğer worker'ların eklediği kayıtların okunma aralığı
+
+# "openai": gerçek OpenAI modeli
+# "fake"  : src/fake_llm.py içindeki offline, deterministik sahte model (test/benchmark için)
+LLM_PROVIDER = "openai"
+
+# =================================================================
+# LLM ZAMANLAYICI (RATE LIMIT) AYARLARI
+# =================================================================
+# Tüm zincir çağrıları süreç geneli tek bir zamanlayıcıdan geçer.
+# Değerleri OpenAI hesabınızın limitlerinin biraz altında tutun.
+LLM_REQUESTS_PER_MINUTE = 500
+LLM_TOKENS_PER_MINUTE = 150_000
+LLM_COMPLETION_TOKENS_ESTIMATE = 400 # TPM hesabında cevap için ayrılan tahmini token
+LLM_BURST_SECONDS = 10 # Bir anda harcanabilecek en fazla bütçe (kaç saniyelik)
+
+# Geçici hatalarda (429, 5xx, zaman aşımı) jitter'lı üstel geri çekilme ile tekrar deneme
+LLM_MAX_RETRIES = 5
+LLM_RETRY_BASE_DELAY = 1.0  # saniye
+LLM_RETRY_MAX_DELAY = 60.0  # saniye
+
+# Bekleyen istekler arasında öncelik (küçük değer önce gönderilir).
+# Eşit öncelikte önce gelen istek önce gönderilir.
+LLM_STAGE_PRIORITY = {
+    "segmentation": 0,
+    "query_transform": 1,
+    "analysis": 2,
+}
+
+# =================================================================
+# LLM CEVAP ÖNBELLEĞİ
+# =================================================================
+# Aynı zincir + şablon + model + girdi için daha önce alınmış cevaplar tekrar
+# kullanılır (çökme sonrası yeniden çalıştırma, 'failed' çağrıların tekrar kuyruğa alınması vb.)
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = "db/llm_cache.sqlite"
+LLM_CACHE_MAX_BYTES = 256 * 1024 * 1024 # Aşılırsa en uzun süredir kullanılmayan kayıtlar silinir
+
 # =================================================================
 # LOKAL EMBEDDING AYARLARI (RAG İÇİN)
 # =================================================================
@@ -23,6 +99,25 @@ LLM_MODEL = "gpt-4-turbo" # Veya "gpt-4o" - Uyumluluk analizi için güçlü bir
 EMBEDDING_MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
 EMBEDDING_DEVICE = "cpu" # 'cuda' (GPU) veya 'cpu'
 
+# Embedding önbelleği: (model, normalize metin hash'i) -> vektör.
+# Hem index build hem de sorgu tarafı aynı önbelleği kullanır; tekrar eden metinler
+# için transformer modeli yeniden çalıştırılmaz.
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_PATH = "db/embedding_cache"
+EMBEDDING_CACHE_MAX_BYTES = 512 * 1024 * 1024 # Bu boyut aşılınca en az kullanılan vektörler atılır
+
+# Embedding backend'i:
+# "torch": HuggingFaceEmbeddings (PyTorch, fp32) - varsayılan
+# "onnx" : ONNX'e aktarılmış ve int8 dinamik quantize edilmiş model, ONNX Runtime ile
+#          ('python -m src.onnx_embeddings --export --tune --check' ile hazırlanır)
+# Backend değişirse vektör index'i bir sonraki build'de baştan oluşturulur.
+EMBEDDING_BACKEND = "torch"
+ONNX_MODEL_PATH = "db/onnx_model"
+ONNX_QUANTIZE = True # False -> quantize edilmemiş (fp32) ONNX modeli kullanılır
+# None -> '--tune' ile ölçülüp model klasörüne (tuning.json) kaydedilen değerler
+ONNX_BATCH_SIZE = None
+ONNX_NUM_THREADS = None
+
 # =================================================================
 # DOSYA YOLLARI
 # =================================================================
@@ -30,4 +125,138 @@ EMBEDDING_DEVICE = "cpu" # 'cuda' (GPU) veya 'cpu'
 DOCUMENTS_PATH = "data/bddk_docs"
 
 # Vektör veritabanının diske kaydedileceği yer
-CHROMA_DB_PATH = "db/chroma_db"
\ No newline at end of file
+# (Sürümlü index'ten önceki düzen; henüz sürüm yoksa bu klasör kullanılır.)
+CHROMA_DB_PATH = "db/chroma_db"
+
+# Sürümlü (versioned) index: her build 'db/index/versions/<sürüm>/' altında, çalışan
+# index'e dokunmadan oluşturulur, doğrulanır ve 'CURRENT' işaretçisi atomik olarak
+# değiştirilerek etkinleştirilir. Çalışan worker'lar yeni sürümü çağrılar arasında yükler.
+INDEX_ROOT_PATH = "db/index"
+INDEX_KEEP_VERSIONS = 3 # Etkin sürüm dahil diskte tutulan en fazla sürüm sayısı
+INDEX_RELOAD_CHECK_SECONDS = 10 # Worker'ların CURRENT işaretçisini kontrol etme aralığı
+
+# =================================================================
+# RETRIEVER AYARLARI
+# =================================================================
+# "chroma": ChromaDB istemcisi üzerinden arama (varsayılan)
+# "numpy" : Bellekte (memmap) tutulan normalize embedding matrisi üzerinde
+#           tek matris çarpımı + argpartition ile arama
+RETRIEVER_BACKEND = "chroma"
+RETRIEVER_K = 3 # Her sorgu için döndürülecek mevzuat parçası sayısı
+
+# Toplu (batched) retrieval: eşzamanlı gelen sorgular bu süre kadar beklenip
+# tek embed_documents çağrısı ve tek çoklu-sorgu arama ile işlenir.
+RETRIEVAL_BATCH_WAIT_MS = 20
+RETRIEVAL_MAX_BATCH = 256 # Bu sayıya ulaşınca beklemeden arama yapılır
+
+# Tüm aramalara uygulanan metadata ön filtresi (None: filtre yok). Değerler tek
+# bir değer ya da değer listesi olabilir, örn:
+#   {"chunk_type": "article"} veya {"regulation": ["... YÖNETMELİK", "... TEBLİĞ"]}
+RETRIEVAL_METADATA_FILTER = None
+
+# Bağlam derleme (context assembly): analiz prompt'una giden mevzuat bağlamı,
+# fazladan getirilen adaylar yerel bir cross-encoder ile yeniden sıralanıp aynı
+# sayfadaki çakışan/komşu parçalar birleştirilerek token bütçesine sığdırılır.
+CONTEXT_ASSEMBLY_ENABLED = True
+RAG_CANDIDATE_K = 12 # Yeniden sıralama için sorgu başına getirilen aday parça sayısı
+RAG_CONTEXT_MAX_CHUNKS = 3 # Bağlama girebilecek en fazla (birleştirme öncesi) parça sayısı
+RAG_CONTEXT_TOKEN_BUDGET = 700 # Segment başına mevzuat bağlamı token bütçesi
+# Yerel (CPU) cross-encoder; None ise adaylar retrieval skoruna göre sıralanır
+RERANKER_MODEL_NAME = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+RERANKER_BATCH_SIZE = 32
+
+# NumPy index'inin (embedding matrisi + doküman listesi) kaydedileceği yer
+NUMPY_INDEX_PATH = "db/numpy_index"
+
+# Vektör veritabanı ile birlikte tutulan artımlı (incremental) build manifest'i.
+# Dosya ve chunk içerik hash'lerini saklar; sadece değişen PDF'ler yeniden işlenir.
+VECTOR_STORE_MANIFEST_FILENAME = "manifest.json"
+
+# =================================================================
+# CHUNKING AYARLARI
+# =================================================================
+# Bu değerler değişirse artımlı build tam yeniden oluşturmaya (full rebuild) döner.
+CHUNK_SIZE = 1000      # Her parçanın maksimum boyutu (karakter)
+CHUNK_OVERLAP = 200    # Parçalar arası bağlamı korumak için çakışma payı
+
+# "article": BDDK mevzuatı bölüm/madde sınırlarından (Madde N, Geçici Madde N) bölünür;
+#            her parça mevzuat adı, madde numarası ve yürürlük tarihi metadata'sı taşır.
+#            Madde yapısı bulunamayan dokümanlar için "recursive" kullanılır.
+# "recursive": Yapıdan bağımsız, CHUNK_SIZE karakterlik parçalar (eski davranış)
+CHUNKING_STRATEGY = "article"
+ARTICLE_CHUNK_MAX_CHARS = 2000 # Bu uzunluğu aşan maddeler fıkra sınırlarından bölünür
+
+# =================================================================
+# PARALEL / AKIŞLI (STREAMING) INGESTION AYARLARI
+# =================================================================
+# PDF okuma ve chunking işlemini yapan süreç (process) sayısı. None -> CPU çekirdek sayısı.
+INGEST_WORKERS = None
+# Parse edilmiş chunk'ların embedding aşamasını beklediği sınırlı kuyruk boyutu (chunk adedi).
+# Bellek kullanımı korpus boyutundan bağımsız olarak bu değerle sınırlı kalır.
+INGEST_QUEUE_SIZE = 2048
+# Her embedding + Chroma yazma adımında işlenen sabit chunk sayısı.
+EMBEDDING_BATCH_SIZE = 64
+
+# =================================================================
+# ANALİZ SERVİSİ (RESIDENT SERVICE) AYARLARI
+# =================================================================
+# 'python -m src.service' ile model, retriever ve zincirler bir kez yüklenip
+# run_compliance_analysis HTTP (TCP veya Unix soketi) üzerinden sunulur.
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_SOCKET_PATH = None # Örn: "/tmp/bank_compliance.sock" verilirse TCP yerine Unix soketi dinlenir
+SERVICE_MAX_CONCURRENT_CALLS = 8  # Aynı anda analiz edilen en fazla çağrı
+SERVICE_MAX_QUEUED_CALLS = 64     # Sırada bekleyebilecek en fazla çağrı; aşılırsa 503 döner
+SERVICE_MAX_BATCH_SIZE = 20       # Tek istekte gönderilebilecek en fazla transkript
+SERVICE_MAX_BODY_BYTES = 5 * 1024 * 1024
+
+# =================================================================
+# OFFLINE BENCHMARK AYARLARI
+# =================================================================
+# 'python -m src.benchmark' sonuçlarının (JSON) kaydedildiği klasör.
+# Sürümler arası karşılaştırma için: --compare <önceki sonuç dosyası>
+BENCHMARK_RESULTS_PATH = "benchmarks/results"
+
+# =================================================================
+# İZLEME (TRACING) VE METRİK AYARLARI
+# =================================================================
+# Aşama süreleri, token sayıları ve önbellek isabetleri Prometheus metin formatında
+# bu dosyaya yazılır (node_exporter textfile collector ile toplanabilir). None -> kapalı.
+# Analiz servisi aynı metrikleri 'GET /metrics' adresinden de sunar.
+METRICS_TEXTFILE_PATH = "db/metrics/bank_compliance.prom"
+METRICS_EXPORT_INTERVAL_SECONDS = 15
+# Her çağrının aşama süreleri, token sayıları ve span'leri 'call_metrics' tablosuna da yazılır
+CALL_METRICS_ENABLED = True
+
+# =================================================================
+# ARA SONUÇ KAYDI (CHECKPOINT) AYARLARI
+# =================================================================
+# Worker, her çağrının segmentasyon çıktısını ve segment başına arama sorgusu,
+# derlenmiş bağlam ve analiz sonucunu 'analysis_checkpoints' tablosuna yazar.
+# Çökme veya tekrar kuyruğa alma sonrası çağrı yalnızca eksik adımlarla tamamlanır.
+CHECKPOINTS_ENABLED = True
+
+# =================================================================
+# OFFLINE TOPLU (BATCH) MOD AYARLARI
+# =================================================================
+# 'python -m src.batch_pipeline' (veya 'main.py --batch') bekleyen çağrıların her
+# aşamasındaki LLM isteklerini JSONL dosyalarında toplayıp sağlayıcının Batch API'sine
+# gönderir; aşamalar arasında retrieval yerel olarak toplu çalışır.
+# None -> OpenAI. Offline deneme için 'python -m src.batch_server' adresi verilebilir
+# (örn: "http://127.0.0.1:8766/v1").
+BATCH_API_BASE_URL = None
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_POLL_SECONDS = 60             # Batch durumunun sorgulanma aralığı
+BATCH_MAX_WAIT_SECONDS = 26 * 3600  # Bu süre içinde bitmeyen batch'ler iptal edilip başarısız sayılır
+BATCH_MAX_CALLS = 20000             # Bir toplu çalıştırmada talep edilen en fazla çağrı
+BATCH_MAX_REQUESTS_PER_FILE = 50000 # Sağlayıcı limiti: dosya başına istek sayısı
+BATCH_MAX_FILE_BYTES = 150 * 1024 * 1024 # Sağlayıcı limiti 200 MB; altında kalınır
+BATCH_MAX_ATTEMPTS = 2              # Başarısız istekler yeni bir batch ile bu kadar denenir
+BATCH_LEASE_SECONDS = 3600          # Toplu çalıştırmada çağrı kiralamaları (periyodik yenilenir)
+BATCH_RETRIEVAL_CHUNK_SIZE = 512    # Aşamalar arası yerel adımlarda (ilgililik filtresi, anlamsal önbellek, retrieval) tek seferde işlenen segment sayısı
+BATCH_WRITE_CHUNK_SIZE = 500        # Sonuçları tek commit'te yazılan çağrı sayısı
+BATCH_WORK_PATH = "db/batches"      # İstek/cevap JSONL dosyaları ve çalıştırma durumu
+BATCH_KEEP_FILES = False            # True -> başarılı çalıştırmanın JSONL dosyaları silinmez
+# Yerel sahte Batch API sunucusu (src.batch_server)
+BATCH_SERVER_HOST = "127.0.0.1"
+BATCH_SERVER_PORT = 8766
@@ -0,0 +1,227 @@
+# src/context_assembly.py
+import json
+import logging
+import argparse
+import threading
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+from src.config import (
+    RETRIEVER_K,
+    CHUNK_OVERLAP,
+    EMBEDDING_DEVICE,
+    RAG_CANDIDATE_K,
+    RAG_CONTEXT_MAX_CHUNKS,
+    RAG_CONTEXT_TOKEN_BUDGET,
+    RERANKER_MODEL_NAME,
+    RERANKER_BATCH_SIZE
+)
+from src.metrics import REGISTRY
+from src.llm_scheduler import count_tokens
+
+log = logging.getLogger("context_assembly")
+
+# Analiz prompt'unda parçalar arasına konan ayırıcı (önceki davranışla aynı)
+CONTEXT_SEPARATOR = "\n---\n"
+
+# Bundan kısa ortak metin, iki parçanın ardışık olduğuna yeterli kanıt sayılmaz
+_MIN_OVERLAP_CHARS = 20
+
+# =================================================================
+# 1. YEREL CROSS-ENCODER İLE YENİDEN SIRALAMA
+# =================================================================
+
+class CrossEncoderReranker:
+    """
+    (sorgu, parça) çiftlerini CPU'da çalışan bir cross-encoder ile puanlar.
+    Model ilk puanlamada yüklenir; yüklenemezse hata saklanır ve tekrar denenmez.
+    """
+
+    def __init__(self, model_name: str = RERANKER_MODEL_NAME, batch_size: int = RERANKER_BATCH_SIZE,
+                 device: str = EMBEDDING_DEVICE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.device = device
+        self._model = None
+        self._load_error = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._load_error is not None:
+                raise self._load_error
+            if self._model is None:
+                try:
+                    from sentence_transformers import CrossEncoder
+                    log.info(f"Cross-encoder '{self.model_name}' yükleniyor ({self.device})...")
+                    self._model = CrossEncoder(self.model_name, device=self.device, max_length=512)
+                except Exception as e:
+                    self._load_error = e
+                    raise
+            return self._model
+
+    def score(self, pairs: List[tuple]) -> List[float]:
+        if not pairs:
+            return []
+        model = self.load()
+        scores = model.predict([list(pair) for pair in pairs], batch_size=self.batch_size, show_progress_bar=False)
+        return [float(s) for s in scores]
+
+# =================================================================
+# 2. ÇAKIŞAN PARÇALARI BİRLEŞTİRME
+# =================================================================
+
+def merge_overlapping(first: str, second: str) -> Optional[str]:
+    """
+    İki parça aynı metnin ardışık (chunk_overlap kadar çakışan) parçalarıysa ya da
+    biri diğerini içeriyorsa tek metin döndürür; değilse None.
+    """
+    if second in first:
+        return first
+    if first in second:
+        return second
+    limit = min(len(first), len(second), 2 * CHUNK_OVERLAP)
+    for size in range(limit, _MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return None
+
+def _page_key(doc: Document) -> tuple:
+    metadata = doc.metadata or {}
+    return (metadata.get("source"), metadata.get("page"))
+
+class _Group:
+    """Aynı sayfadan birleştirilmiş parçalar (bağlamda tek blok olarak yer alır)."""
+
+    def __init__(self, doc: Document):
+        self.key = _page_key(doc)
+        self.text = doc.page_content
+        self.tokens = count_tokens(self.text)
+        self.docs = [doc]
+
+    def try_merge(self, doc: Document) -> Optional[str]:
+        if _page_key(doc) != self.key or self.key == (None, None):
+            return None
+        return merge_overlapping(self.text, doc.page_content) or merge_overlapping(doc.page_content, self.text)
+
+# =================================================================
+# 3. TOKEN BÜTÇELİ BAĞLAM DERLEME
+# =================================================================
+
+class ContextAssembler:
+    """
+    Fazladan getirilen aday parçaları yeniden sıralar, en iyi adaydan başlayarak
+    aynı sayfadaki çakışan/komşu parçaları birleştirir ve bağlamı token bütçesine
+    sığdırır. Her segment için önceki davranışa (ilk RETRIEVER_K parçanın olduğu
+    gibi birleştirilmesi) göre tasarruf edilen token sayısını raporlar.
+    """
+
+    def __init__(self, reranker: Optional[CrossEncoderReranker] = None,
+                 token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+                 max_chunks: int = RAG_CONTEXT_MAX_CHUNKS,
+                 baseline_k: int = RETRIEVER_K):
+        self.reranker = reranker
+        self.token_budget = token_budget
+        self.max_chunks = max_chunks
+        self.baseline_k = baseline_k
+
+    def _rerank_scores(self, queries: List[str], docs_lists: List[List[Document]]) -> List[List[float]]:
+        """Tüm segmentlerin adayları tek predict çağrısında puanlanır; model yoksa retrieval skoru kullanılır."""
+        fallback = [[(doc.metadata or {}).get("score") or 0.0 for doc in docs] for docs in docs_lists]
+        if self.reranker is None:
+            return fallback
+        pairs = [(query, doc.page_content) for query, docs in zip(queries, docs_lists) for doc in docs]
+        try:
+            flat = self.reranker.score(pairs)
+        except Exception as e:
+            log.warning(f"Cross-encoder çalıştırılamadı, retrieval skoru kullanılacak: {e}")
+            return fallback
+        scores, offset = [], 0
+        for docs in docs_lists:
+            scores.append(flat[offset:offset + len(docs)])
+            offset += len(docs)
+        return scores
+
+    def assemble(self, docs: List[Document], scores: List[float]) -> dict:
+        """
+        Tek segmentin bağlamını derler. İlk (en iyi) aday bütçeyi aşsa bile alınır;
+        diğerleri ancak bütçeye sığıyorsa (birleştirilenler sadece yeni kısımlarıyla) eklenir.
+        """
+        baseline_context = CONTEXT_SEPARATOR.join(doc.page_content for doc in docs[:self.baseline_k])
+        groups: List[_Group] = []
+        used = 0
+        tokens = 0
+        for score, doc in sorted(zip(scores, docs), key=lambda pair: pair[0], reverse=True):
+            if used >= self.max_chunks:
+                break
+            doc.metadata = {**(doc.metadata or {}), "rerank_score": round(score, 4)}
+            for group in groups:
+                merged = group.try_merge(doc)
+                if merged is None:
+                    continue
+                if merged == group.text:
+                    break # Yeni bilgi yok (tekrar eden parça)
+                merged_tokens = count_tokens(merged)
+                if tokens + merged_tokens - group.tokens <= self.token_budget:
+                    tokens += merged_tokens - group.tokens
+                    group.text, group.tokens = merged, merged_tokens
+                    group.docs.append(doc)
+                    used += 1
+                break
+            else:
+                doc_tokens = count_tokens(doc.page_content)
+                if not groups or tokens + doc_tokens <= self.token_budget:
+                    groups.append(_Group(doc))
+                    tokens += doc_tokens
+                    used += 1
+
+        context = CONTEXT_SEPARATOR.join(group.text for group in groups)
+        context_tokens = count_tokens(context) if context else 0
+        baseline_tokens = count_tokens(baseline_context) if baseline_context else 0
+        return {
+            "context": context,
+            "docs": [doc for group in groups for doc in group.docs],
+            "context_tokens": context_tokens,
+            "baseline_tokens": baseline_tokens,
+            "tokens_saved": baseline_tokens - context_tokens,
+        }
+
+    def assemble_many(self, queries: List[str], docs_lists: List[List[Document]]) -> List[dict]:
+        scores = self._rerank_scores(queries, docs_lists)
+        results = [self.assemble(docs, doc_scores) for docs, doc_scores in zip(docs_lists, scores)]
+        REGISTRY.inc("compliance_context_tokens_total", sum(r["baseline_tokens"] for r in results), kind="baseline")
+        REGISTRY.inc("compliance_context_tokens_total", sum(r["context_tokens"] for r in results), kind="assembled")
+        return results
+
+def create_context_assembler() -> ContextAssembler:
+    reranker = CrossEncoderReranker() if RERANKER_MODEL_NAME else None
+    return ContextAssembler(reranker=reranker)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Bir arama sorgusu için önceki ve derlenmiş RAG bağlamını karşılaştırır.")
+    parser.add_argument("query", help="Zenginleştirilmiş arama sorgusu")
+    parser.add_argument("--candidates", type=int, default=RAG_CANDIDATE_K, help="Getirilecek aday parça sayısı")
+    parser.add_argument("--show-context", action="store_true", help="Derlenmiş bağlam metnini de yazdır")
+    args = parser.parse_args()
+
+    from src.retrieval import search_many
+    from src.compliance_chain import get_retrieval_batcher, get_context_assembler
+
+    candidates = search_many(get_retrieval_batcher().retriever, [args.query], k=args.candidates)[0]
+    assembled = get_context_assembler().assemble_many([args.query], [candidates])[0]
+    report = {
+        "candidates": len(candidates),
+        "chunks_used": len(assembled["docs"]),
+        "baseline_tokens": assembled["baseline_tokens"],
+        "context_tokens": assembled["context_tokens"],
+        "tokens_saved": assembled["tokens_saved"],
+        "chunks": [
+            {k: doc.metadata.get(k) for k in ("source", "page", "score", "rerank_score")}
+            for doc in assembled["docs"]
+        ],
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.show_context:
+        print(assembled["context"])
@@ -0,0 +1,336 @@
+# src/embedding_cache.py
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.config import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_DEVICE,
+    EMBEDDING_BACKEND,
+    ONNX_QUANTIZE,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_BYTES
+)
+
+log = logging.getLogger("embedding_cache")
+
+# Sıkıştırma (eviction) sonrası hedeflenen doluluk oranı: her put'ta tekrar
+# sıkıştırma yapılmaması için limitin biraz altına inilir.
+_EVICTION_TARGET_RATIO = 0.8
+
+def normalize_text(text: str) -> str:
+    """Önbellek anahtarı için metni normalize eder (Unicode NFC + boşluk sadeleştirme)."""
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+# =================================================================
+# 1. DİSK ÜZERİNDEKİ EMBEDDING ÖNBELLEĞİ
+# =================================================================
+
+class EmbeddingCache:
+    """
+    (model adı, normalize metin hash'i) -> float32 vektör önbelleği.
+
+    Vektörler model başına tek bir ham float32 dosyasına eklenir ve
+    numpy.memmap ile okunur; hangi satırın hangi anahtara ait olduğu
+    SQLite index dosyasında tutulur. Dosya boyutu limiti aşınca en az
+    kullanılan kayıtlar atılarak dosya yeni bir 'generation' olarak
+    yeniden yazılır (eski memmap'ler eski dosyayı okumaya devam edebilir).
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = EMBEDDING_CACHE_PATH,
+                 max_bytes: int = EMBEDDING_CACHE_MAX_BYTES):
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._slug = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self._lock = threading.Lock()
+        self._mmap = None
+        self._mmap_key = None
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite"),
+            timeout=30,
+            check_same_thread=False,
+            isolation_level=None # İşlemleri (BEGIN/COMMIT) kendimiz yönetiyoruz
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS models (
+                model TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                generation INTEGER NOT NULL,
+                row_count INTEGER NOT NULL
+            )
+        """)
+
+        self.hits = 0
+        self.misses = 0
+
+    def _data_path(self, generation: int) -> str:
+        return os.path.join(self.cache_dir, f"{self._slug}.{generation}.f32")
+
+    def _model_info(self):
+        return self._conn.execute(
+            "SELECT dim, generation, row_count FROM models WHERE model = ?",
+            (self.model_name,)
+        ).fetchone()
+
+    def _matrix(self, dim: int, generation: int, min_rows: int):
+        """Geçerli generation dosyasının memmap'ini döndürür; gerekirse yeniden açar."""
+        if (self._mmap is None or self._mmap_key != (dim, generation)
+                or self._mmap.shape[0] < min_rows):
+            path = self._data_path(generation)
+            rows = os.path.getsize(path) // (dim * 4)
+            self._mmap = np.memmap(path, dtype=np.float32, mode="r", shape=(rows, dim))
+            self._mmap_key = (dim, generation)
+        return self._mmap
+
+    def _lookup_rows(self, hashes) -> dict:
+        """Verilen hash'lerin veri dosyasındaki satır numaralarını döndürür."""
+        hashes = list(hashes)
+        rows = {}
+        # SQLite parametre limitine takılmamak için parça parça sorgula
+        for start in range(0, len(hashes), 500):
+            part = hashes[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            for h, row in self._conn.execute(
+                f"SELECT text_hash, row FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                (self.model_name, *part)
+            ):
+                rows[h] = row
+        return rows
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Her metin için önbellekteki vektörü (yoksa None) döndürür."""
+        hashes = [text_hash(t) for t in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                info = self._model_info()
+                rows = self._lookup_rows(set(hashes)) if info is not None else {}
+            finally:
+                self._conn.execute("COMMIT")
+
+            if rows:
+                dim, generation, _ = info
+                try:
+                    matrix = self._matrix(dim, generation, max(rows.values()) + 1)
+                    for i, h in enumerate(hashes):
+                        if h in rows:
+                            results[i] = np.array(matrix[rows[h]])
+                except (FileNotFoundError, ValueError) as e:
+                    # Okuma sırasında başka bir süreç sıkıştırma yaptıysa: miss say
+                    log.debug(f"Embedding önbelleği okunamadı: {e}")
+                    results = [None] * len(texts)
+                    rows = {}
+
+                if rows:
+                    now = time.time()
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                        [(now, self.model_name, h) for h in rows]
+                    )
+
+        found = sum(1 for r in results if r is not None)
+        self.hits += found
+        self.misses += len(texts) - found
+        return results
+
+    def put_many(self, texts: List[str], vectors) -> None:
+        """Yeni vektörleri veri dosyasının sonuna ekler ve index'e kaydeder."""
+        if not texts:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        dim = matrix.shape[1]
+
+        # Aynı istek içindeki tekrar eden metinleri bir kez yaz
+        unique = {}
+        for t, vector in zip(texts, matrix):
+            unique.setdefault(text_hash(t), vector)
+
+        with self._lock:
+            # BEGIN IMMEDIATE: dosyaya ekleme süreçler arasında da sıralı yapılır
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                info = self._model_info()
+                if info is None or info[0] != dim:
+                    if info is not None:
+                        log.warning(f"'{self.model_name}' için vektör boyutu değişmiş. Önbellek sıfırlanıyor.")
+                        self._conn.execute("DELETE FROM embeddings WHERE model = ?", (self.model_name,))
+                    generation = (info[1] + 1) if info is not None else 0
+                    row_count = 0
+                    open(self._data_path(generation), "wb").close()
+                else:
+                    _, generation, row_count = info
+
+                existing = self._lookup_rows(unique)
+                new_items = [(h, v) for h, v in unique.items() if h not in existing]
+
+                if new_items:
+                    with open(self._data_path(generation), "r+b") as f:
+                        # Yarıda kalmış bir yazmadan kalan artıkları ez
+                        f.seek(row_count * dim * 4)
+                        f.write(np.stack([v for _, v in new_items]).astype(np.float32).tobytes())
+                        f.truncate()
+                    now = time.time()
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (model, text_hash, row, last_used) VALUES (?, ?, ?, ?)",
+                        [(self.model_name, h, row_count + i, now) for i, (h, _) in enumerate(new_items)]
+                    )
+                    row_count += len(new_items)
+
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO models (model, dim, generation, row_count) VALUES (?, ?, ?, ?)",
+                    (self.model_name, dim, generation, row_count)
+                )
+
+                if row_count * dim * 4 > self.max_bytes:
+                    self._evict(dim, generation)
+
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self, dim: int, generation: int) -> None:
+        """
+        En son kullanılan kayıtları yeni bir generation dosyasına kopyalar,
+        geri kalanları atar. Çağıran, açık bir yazma işlemi içinde olmalıdır.
+        """
+        keep = int(self.max_bytes * _EVICTION_TARGET_RATIO) // (dim * 4)
+        survivors = self._conn.execute(
+            "SELECT text_hash, row FROM embeddings WHERE model = ? ORDER BY last_used DESC LIMIT ?",
+            (self.model_name, keep)
+        ).fetchall()
+
+        old_path = self._data_path(generation)
+        rows = os.path.getsize(old_path) // (dim * 4)
+        old = np.memmap(old_path, dtype=np.float32, mode="r", shape=(rows, dim))
+        new_generation = generation + 1
+        with open(self._data_path(new_generation), "wb") as f:
+            for start in range(0, len(survivors), 4096):
+                part = survivors[start:start + 4096]
+                f.write(np.asarray(old[[row for _, row in part]], dtype=np.float32).tobytes())
+        del old
+
+        self._conn.execute("DELETE FROM embeddings WHERE model = ?", (self.model_name,))
+        now = time.time()
+        self._conn.executemany(
+            "INSERT INTO embeddings (model, text_hash, row, last_used) VALUES (?, ?, ?, ?)",
+            [(self.model_name, h, i, now - i * 1e-6) for i, (h, _) in enumerate(survivors)]
+        )
+        self._conn.execute(
+            "UPDATE models SET generation = ?, row_count = ? WHERE model = ?",
+            (new_generation, len(survivors), self.model_name)
+        )
+        # Eski dosya silinse bile, açık memmap'ler (POSIX) eski içeriği okumaya devam eder.
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+        log.info(f"Embedding önbelleği sıkıştırıldı: {rows} -> {len(survivors)} kayıt.")
+
+# =================================================================
+# 2. LANGCHAIN EMBEDDINGS SARMALAYICISI
+# =================================================================
+
+class CachedEmbeddings(Embeddings):
+    """
+    Herhangi bir LangChain Embeddings nesnesini disk önbelleği ile sarmalar.
+    Önbellekte bulunan metinler için transformer modeli hiç çalıştırılmaz.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        cached = self.cache.get_many(texts)
+        # Aynı batch içinde tekrar eden metinler modelden yalnızca bir kez geçer
+        missing = {}
+        for i, v in enumerate(cached):
+            if v is None:
+                missing.setdefault(text_hash(texts[i]), []).append(i)
+        if missing:
+            to_embed = [texts[positions[0]] for positions in missing.values()]
+            computed = self.embeddings.embed_documents(to_embed)
+            self.cache.put_many(to_embed, computed)
+            for positions, vector in zip(missing.values(), computed):
+                for i in positions:
+                    cached[i] = vector
+        return [list(map(float, v)) for v in cached]
+
+    def embed_query(self, text: str) -> List[float]:
+        cached = self.cache.get_many([text])[0]
+        if cached is not None:
+            return [float(x) for x in cached]
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many([text], [vector])
+        return vector
+
+def embedding_model_id() -> str:
+    """
+    Aktif backend'in ve encode ayarlarının ürettiği vektörleri tanımlayan kimlik.
+    Önbellek anahtarı ve build manifest'i bunu kullanır; ONNX (int8) vektörleri fp32
+    vektörlerle, normalize vektörler de eski (normalize edilmemiş) kayıtlarla karışmaz.
+    """
+    model_id = EMBEDDING_MODEL_NAME
+    if EMBEDDING_BACKEND == "onnx":
+        model_id = f"{model_id}@onnx-{'int8' if ONNX_QUANTIZE else 'fp32'}"
+    return f"{model_id}@norm"
+
+def create_torch_embeddings() -> Embeddings:
+    """PyTorch (fp32) HuggingFaceEmbeddings modelini önbelleksiz oluşturur."""
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs={'device': EMBEDDING_DEVICE},
+        # Normalize vektörler: Chroma'nın L2 sıralaması ile kosinüs (NumPy) sıralaması örtüşür
+        encode_kwargs={'normalize_embeddings': True}
+    )
+
+def create_embedding_model() -> Embeddings:
+    """
+    Proje genelinde kullanılan lokal embedding modelini (EMBEDDING_BACKEND'e göre
+    PyTorch ya da ONNX Runtime) oluşturur.
+    Önbellek açıksa hem index build hem de sorgu tarafı aynı disk önbelleğini kullanır.
+    """
+    if EMBEDDING_BACKEND == "onnx":
+        from src.onnx_embeddings import OnnxEmbeddings
+        embeddings = OnnxEmbeddings()
+    elif EMBEDDING_BACKEND == "torch":
+        embeddings = create_torch_embeddings()
+    else:
+        raise ValueError(f"Bilinmeyen embedding backend'i: '{EMBEDDING_BACKEND}'. 'torch' veya 'onnx' olmalı.")
+    if not EMBEDDING_CACHE_ENABLED:
+        return embeddings
+
+    log.info(f"Embedding önbelleği kullanılıyor: '{EMBEDDING_CACHE_PATH}'")
+    return CachedEmbeddings(embeddings, EmbeddingCache(embedding_model_id()))
@@ -0,0 +1,202 @@
+# src/fake_llm.py
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import argparse
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+log = logging.getLogger("fake_llm")
+
+# =================================================================
+# 1. SAHTE (OFFLINE) HATA TİPLERİ
+# =================================================================
+# OpenAI istemcisinin hataları gibi 'status_code' taşırlar; böylece
+# zamanlayıcının (llm_scheduler) tekrar deneme mantığı aynı şekilde çalışır.
+
+class FakeLLMError(Exception):
+    status_code = 500
+
+class FakeRateLimitError(FakeLLMError):
+    status_code = 429
+
+# =================================================================
+# 2. ŞEMAYA UYGUN SAHTE CEVAP ÜRETİMİ
+# =================================================================
+
+_SPEAKER_PATTERN = re.compile(r"^\s*(Müşteri|MÜŞTERİ|Temsilci|TEMSİLCİ)\s*:\s*(.*)$")
+
+def _stable_int(text: str) -> int:
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+
+def _between_markers(prompt: str) -> str:
+    """Prompt'taki ilk '---' blokları arasındaki metni (transkript/diyalog) döndürür."""
+    parts = prompt.split("---")
+    return parts[1] if len(parts) > 2 else prompt
+
+def _fake_segments(prompt: str) -> dict:
+    segments = []
+    query = None
+    for line in _between_markers(prompt).splitlines():
+        match = _SPEAKER_PATTERN.match(line)
+        if not match:
+            continue
+        speaker, text = match.group(1).lower(), match.group(2).strip()
+        if speaker.startswith("m"):
+            query = text
+        elif query is not None:
+            segments.append({"customer_query": query, "agent_response": text})
+            query = None
+    return {"segments": segments}
+
+def _fake_search_query(prompt: str) -> dict:
+    match = re.search(r"Müşteri:\s*(.*)", prompt)
+    customer_query = match.group(1).strip() if match else ""
+    return {"search_query": f"Bankacılık mevzuatı: {customer_query[:120]}"}
+
+def _fake_analysis(prompt: str) -> dict:
+    h = _stable_int(prompt)
+    violation = h % 7 == 0
+    omission = h % 5 == 0
+    if violation or omission:
+        return {
+            "violation_detected": violation,
+            "omission_detected": omission,
+            "analysis": "Temsilci mevzuattaki sınırları müşteriye eksik aktarmıştır.",
+            "suggestion": "Yasal sınırlar müşteriye açıkça belirtilmelidir."
+        }
+    return {
+        "violation_detected": False,
+        "omission_detected": False,
+        "analysis": "Mevzuata uygundur",
+        "suggestion": None
+    }
+
+def build_fake_response(prompt: str) -> str:
+    """Prompt'taki format talimatlarına bakarak ilgili Pydantic şemasına uygun JSON üretir."""
+    if "violation_detected" in prompt:
+        payload = _fake_analysis(prompt)
+    elif "search_query" in prompt:
+        payload = _fake_search_query(prompt)
+    elif "segments" in prompt:
+        payload = _fake_segments(prompt)
+    else:
+        payload = {}
+    return json.dumps(payload, ensure_ascii=False)
+
+# =================================================================
+# 3. SAHTE SOHBET MODELİ
+# =================================================================
+
+class FakeChatModel(BaseChatModel):
+    """
+    OpenAI'a gitmeden, ayarlanabilir gecikme, hata oranı ve sunucu tarafı
+    RPM limiti ile cevap veren deterministik sohbet modeli. Pipeline'ın
+    verim (throughput) davranışını offline test etmek için kullanılır.
+    """
+    latency_ms: float = 800.0
+    latency_jitter_ms: float = 200.0
+    failure_rate: float = 0.0
+    server_rpm: Optional[int] = None # Aşılırsa FakeRateLimitError (429) fırlatılır
+    seed: int = 0
+
+    _rng: Any = PrivateAttr(default=None)
+    _bucket: Any = PrivateAttr(default=None)
+
+    def model_post_init(self, __context):
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _check_and_build(self, messages: List[BaseMessage]) -> ChatResult:
+        if self.server_rpm is not None:
+            # Sağlayıcılar gibi sürekli dolan (1 dakikalık kapasiteli) bütçe
+            now = time.monotonic()
+            if self._bucket is None:
+                self._bucket = [float(self.server_rpm), now]
+            tokens, updated = self._bucket
+            tokens = min(float(self.server_rpm), tokens + (now - updated) * self.server_rpm / 60.0)
+            if tokens < 1:
+                self._bucket = [tokens, now]
+                raise FakeRateLimitError("Rate limit reached (fake server)")
+            self._bucket = [tokens - 1, now]
+
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise FakeLLMError("Internal server error (fake server)")
+
+        prompt = "\n".join(str(m.content) for m in messages)
+        content = build_fake_response(prompt)
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(content) // 4)
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _delay(self) -> float:
+        jitter = self._rng.uniform(-self.latency_jitter_ms, self.latency_jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self._delay())
+        return self._check_and_build(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        return self._check_and_build(messages)
+
+# =================================================================
+# 4. OFFLINE VERİM (THROUGHPUT) TESTİ
+# =================================================================
+
+async def _throughput_demo(requests: int, server_rpm: int, rpm: int, latency_ms: float):
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+    from src.llm_scheduler import LLMScheduler, ScheduledChain
+
+    llm = FakeChatModel(latency_ms=latency_ms, latency_jitter_ms=latency_ms / 4, server_rpm=server_rpm)
+    chain = ChatPromptTemplate.from_template("Müşteri: {q}\nsearch_query") | llm | StrOutputParser()
+    scheduler = LLMScheduler(requests_per_minute=rpm, base_delay=0.5, max_delay=5.0)
+    scheduled = ScheduledChain(chain, "query_transform", scheduler=scheduler)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(scheduled.ainvoke({"q": f"soru {i}"}) for i in range(requests)),
+        return_exceptions=True
+    )
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for r in results if isinstance(r, Exception))
+    return {
+        "requests": requests,
+        "failed": failed,
+        "seconds": round(elapsed, 2),
+        "requests_per_second": round((requests - failed) / elapsed, 2),
+        "scheduler": scheduler.stats,
+    }
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Sahte LLM ile zamanlayıcı verim testi.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--server-rpm", type=int, default=120, help="Sahte sunucunun 429 döndürdüğü limit")
+    parser.add_argument("--rpm", type=int, default=110, help="Zamanlayıcının uyguladığı RPM bütçesi")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    args = parser.parse_args()
+
+    report = asyncio.run(_throughput_demo(args.requests, args.server_rpm, args.rpm, args.latency_ms))
+    print(json.dumps(report, indent=2))
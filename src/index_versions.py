@@ -0,0 +1,190 @@
+# src/index_versions.py
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import argparse
+from typing import List, Optional
+
+from src.config import (
+    INDEX_ROOT_PATH,
+    INDEX_KEEP_VERSIONS,
+    CHROMA_DB_PATH,
+    NUMPY_INDEX_PATH,
+    RELEVANCE_CENTROIDS_PATH
+)
+
+log = logging.getLogger("index_versions")
+
+_POINTER_FILENAME = "CURRENT"
+_BUILDING_FILENAME = "BUILDING"
+_VERSIONS_DIRNAME = "versions"
+# Sürüm işaretçisi olmayan (eski düzendeki) index'in sürüm adı
+LEGACY_VERSION = "legacy"
+
+# =================================================================
+# 1. SÜRÜM KLASÖRLERİ VE ETKİN SÜRÜM İŞARETÇİSİ
+# =================================================================
+
+def version_paths(version: str, root: str = INDEX_ROOT_PATH) -> dict:
+    """Bir sürümün Chroma, NumPy index'i ve ilgililik merkezleri yolları."""
+    if version == LEGACY_VERSION:
+        return {
+            "version": version,
+            "chroma_path": CHROMA_DB_PATH,
+            "numpy_path": NUMPY_INDEX_PATH,
+            "centroids_path": RELEVANCE_CENTROIDS_PATH,
+        }
+    directory = os.path.join(root, _VERSIONS_DIRNAME, version)
+    return {
+        "version": version,
+        "chroma_path": os.path.join(directory, "chroma_db"),
+        "numpy_path": os.path.join(directory, "numpy_index"),
+        "centroids_path": os.path.join(directory, "relevance_centroids.npz"),
+    }
+
+def _read_json(path: str) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_json_atomic(path: str, data: dict):
+    """Geçici dosyaya yazıp os.replace ile değiştirir; okuyan süreç yarım dosya görmez."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def current_version(root: str = INDEX_ROOT_PATH) -> Optional[str]:
+    pointer = _read_json(os.path.join(root, _POINTER_FILENAME))
+    return pointer.get("version") if pointer else None
+
+def active_index(root: str = INDEX_ROOT_PATH) -> dict:
+    """
+    Etkin sürümün yollarını döndürür. Henüz sürümlü build yapılmadıysa
+    eski düzendeki CHROMA_DB_PATH / NUMPY_INDEX_PATH ('legacy') kullanılır.
+    """
+    return version_paths(current_version(root) or LEGACY_VERSION, root)
+
+def list_versions(root: str = INDEX_ROOT_PATH) -> List[str]:
+    directory = os.path.join(root, _VERSIONS_DIRNAME)
+    if not os.path.isdir(directory):
+        return []
+    # Sürüm adları zaman damgasıyla başladığı için alfabetik sıra = oluşturulma sırası
+    return sorted(name for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name)))
+
+# =================================================================
+# 2. YAN TARAFTA BUILD, DOĞRULAMA VE ATOMİK ETKİNLEŞTİRME
+# =================================================================
+
+def start_version(base: Optional[dict], root: str = INDEX_ROOT_PATH) -> dict:
+    """
+    Yeni bir sürüm klasörü hazırlar. base verilirse (artımlı build) onun Chroma
+    klasörü kopyalanır; etkin sürüm hiçbir zaman yerinde değiştirilmez.
+    Aynı base üzerinde yarıda kalmış bir build varsa o klasörle devam edilir.
+    """
+    base_version = base["version"] if base else None
+    building_path = os.path.join(root, _BUILDING_FILENAME)
+    building = _read_json(building_path)
+    if building and building.get("base") == base_version:
+        paths = version_paths(building["version"], root)
+        if os.path.isdir(paths["chroma_path"]):
+            log.info(f"Yarıda kalan '{paths['version']}' index sürümü build'ine devam ediliyor.")
+            return paths
+
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    paths = version_paths(version, root)
+    os.makedirs(os.path.dirname(paths["chroma_path"]), exist_ok=True)
+    if base and os.path.isdir(base["chroma_path"]):
+        log.info(f"'{base_version}' sürümü yeni '{version}' sürümüne kopyalanıyor...")
+        shutil.copytree(base["chroma_path"], paths["chroma_path"])
+    _write_json_atomic(building_path, {"version": version, "base": base_version, "started_at": time.time()})
+    return paths
+
+def validate_version(paths: dict, embeddings=None) -> dict:
+    """
+    Etkinleştirmeden önce sürümü kontrol eder: koleksiyon boş olmamalı, NumPy
+    index'i (varsa) Chroma ile aynı sayıda vektör içermeli ve (embedding modeli
+    verildiyse) örnek bir sorgu sonuç döndürmeli. Sorun varsa ValueError fırlatır.
+    """
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=paths["chroma_path"]).get_collection("langchain")
+    count = collection.count()
+    if count == 0:
+        raise ValueError(f"'{paths['version']}' sürümünün koleksiyonu boş.")
+    report = {"version": paths["version"], "vectors": count}
+
+    if os.path.isdir(paths["numpy_path"]):
+        from src.numpy_index import NumpyVectorIndex
+        numpy_count = len(NumpyVectorIndex(paths["numpy_path"]))
+        if numpy_count != count:
+            raise ValueError(f"NumPy index'i {numpy_count} vektör içeriyor, Chroma {count}.")
+        report["numpy_vectors"] = numpy_count
+
+    if embeddings is not None:
+        result = collection.query(query_embeddings=[embeddings.embed_query("kredi kartı taksit")], n_results=1)
+        if not result["ids"] or not result["ids"][0]:
+            raise ValueError("Örnek sorgu sonuç döndürmedi.")
+    return report
+
+def activate_version(version: str, root: str = INDEX_ROOT_PATH):
+    """CURRENT işaretçisini atomik olarak yeni sürüme çevirir."""
+    if not os.path.isdir(os.path.join(root, _VERSIONS_DIRNAME, version)):
+        raise ValueError(f"'{version}' index sürümü bulunamadı.")
+    previous = current_version(root)
+    _write_json_atomic(os.path.join(root, _POINTER_FILENAME), {
+        "version": version,
+        "previous": previous,
+        "activated_at": time.time(),
+    })
+    building_path = os.path.join(root, _BUILDING_FILENAME)
+    building = _read_json(building_path)
+    if building and building.get("version") == version:
+        os.remove(building_path)
+    log.info(f"Index sürümü '{previous or LEGACY_VERSION}' -> '{version}' olarak etkinleştirildi.")
+
+def prune_versions(keep: int = INDEX_KEEP_VERSIONS, root: str = INDEX_ROOT_PATH) -> List[str]:
+    """
+    En yeni 'keep' sürümü (etkin sürüm her zaman) tutar, eskileri siler.
+    Eski sürümü hâlâ okuyan worker'lar bir sonraki kontrolde yeni sürüme geçer.
+    """
+    active = current_version(root)
+    building = (_read_json(os.path.join(root, _BUILDING_FILENAME)) or {}).get("version")
+    versions = list_versions(root)
+    kept = set(versions[-keep:]) | {active, building}
+    removed = [v for v in versions if v not in kept]
+    for version in removed:
+        shutil.rmtree(os.path.join(root, _VERSIONS_DIRNAME, version), ignore_errors=True)
+        log.info(f"Eski index sürümü '{version}' silindi.")
+    return removed
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Sürümlü vektör index'i yönetimi.")
+    parser.add_argument("--list", action="store_true", help="Sürümleri ve etkin sürümü listeler.")
+    parser.add_argument("--activate", metavar="SÜRÜM", help="Verilen sürümü etkinleştirir (geri alma).")
+    parser.add_argument("--validate", metavar="SÜRÜM", help="Verilen sürümü doğrular.")
+    parser.add_argument("--prune", action="store_true", help=f"En yeni {INDEX_KEEP_VERSIONS} sürüm dışındakileri siler.")
+    args = parser.parse_args()
+
+    if args.validate:
+        print(json.dumps(validate_version(version_paths(args.validate)), indent=2))
+    if args.activate:
+        validate_version(version_paths(args.activate))
+        activate_version(args.activate)
+    if args.prune:
+        prune_versions()
+    if args.list or not (args.activate or args.validate or args.prune):
+        active = current_version()
+        for name in list_versions():
+            print(f"{'*' if name == active else ' '} {name}")
+        if active is None:
+            print(f"* {LEGACY_VERSION} ({CHROMA_DB_PATH})")
@@ -0,0 +1,219 @@
+# src/legal_chunking.py
+import os
+import re
+import json
+import logging
+import argparse
+from typing import List, Optional
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src.config import ARTICLE_CHUNK_MAX_CHARS
+
+log = logging.getLogger("legal_chunking")
+
+# "MADDE 12 –", "Madde 4-", "GEÇİCİ MADDE 1 –", "EK MADDE 3 –"
+_ARTICLE_LINE = re.compile(
+    r"^\s*(?:(GEÇİCİ|Geçici|EK|Ek)\s+)?(?:MADDE|Madde)\s+(\d+(?:/[A-Za-z])?)\s*[-–—]\s*"
+)
+# "BİRİNCİ BÖLÜM", "ÜÇÜNCÜ KISIM" gibi yapı başlıkları
+_SECTION_LINE = re.compile(r"^\s*[A-ZÇĞİÖŞÜ]+\s+(?:BÖLÜM|KISIM)\s*$")
+# Sayfa numarası satırları ("3", "- 3 -")
+_PAGE_NUMBER_LINE = re.compile(r"^\s*-?\s*\d{1,4}\s*-?\s*$")
+_DATE = re.compile(r"\b(\d{1,2})[./](\d{1,2})[./](\d{4})\b")
+_GAZETTE_DATE = re.compile(r"Resm[iî]\s+Gazete[^\n]{0,40}?(\d{1,2}[./]\d{1,2}[./]\d{4})", re.IGNORECASE)
+# Madde türü etiketleri (str.capitalize() Türkçe 'İ' harfini bozduğu için sabit)
+_ARTICLE_KINDS = {"GEÇİCİ": "Geçici", "Geçici": "Geçici", "EK": "Ek", "Ek": "Ek"}
+_REGULATION_KEYWORDS = ("YÖNETMELİK", "TEBLİĞ", "KANUN", "GENELGE", "KARAR", "REHBER", "YÖNERGE", "İLKE")
+
+# Madde başlığı sayılabilecek en uzun satır ("Amaç ve kapsam", "Kredi kartı limitleri")
+_MAX_TITLE_CHARS = 80
+# Bundan kısa giriş (madde öncesi) metinleri ayrı parça olarak saklanmaz
+_MIN_PREAMBLE_CHARS = 200
+
+# =================================================================
+# 1. DOKÜMAN BİLGİLERİ (MEVZUAT ADI, YÜRÜRLÜK TARİHİ)
+# =================================================================
+
+def _iso_date(text: str) -> Optional[str]:
+    match = _DATE.search(text or "")
+    if not match:
+        return None
+    day, month, year = (int(part) for part in match.groups())
+    if not (1 <= day <= 31 and 1 <= month <= 12):
+        return None
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+def _is_upper(line: str) -> bool:
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 3 and all(c.isupper() for c in letters)
+
+def detect_regulation_name(preamble: List[str], fallback: str) -> str:
+    """
+    Giriş satırlarındaki büyük harfli başlık bloğundan mevzuat adını çıkarır
+    (örn: 'BANKA KARTLARI VE KREDİ KARTLARI HAKKINDA YÖNETMELİK'). Başlık iki
+    satıra bölünmüş olabilir; bulunamazsa fallback döner.
+    """
+    block = []
+    for line in preamble[:20]:
+        if _is_upper(line) and not _SECTION_LINE.match(line):
+            block.append(line.strip())
+            if any(keyword in line for keyword in _REGULATION_KEYWORDS):
+                return " ".join(block)
+        else:
+            block = []
+    return fallback
+
+def detect_effective_date(articles: List[dict], preamble: List[str]) -> Optional[str]:
+    """
+    Yürürlük maddesinde açık bir tarih varsa onu, yoksa ('yayımı tarihinde
+    yürürlüğe girer') Resmî Gazete tarihini ISO formatında döndürür.
+    """
+    for article in articles:
+        body = " ".join(article["lines"])
+        is_enforcement = (article["title"] or "").startswith("Yürürlük") or "yürürlüğe girer" in body
+        if is_enforcement and "yayımı tarihinde" not in body:
+            date = _iso_date(body)
+            if date:
+                return date
+    match = _GAZETTE_DATE.search("\n".join(preamble))
+    return _iso_date(match.group(1)) if match else None
+
+# =================================================================
+# 2. BÖLÜM / MADDE SINIRLARINA GÖRE AYIRMA
+# =================================================================
+
+def _is_title_line(line: str) -> bool:
+    stripped = line.strip()
+    return (0 < len(stripped) <= _MAX_TITLE_CHARS
+            and stripped[0].isupper()
+            and not stripped.endswith((".", ",", ";", ":"))
+            and not stripped.startswith("(")
+            and not _is_upper(stripped))
+
+def split_structure(pages: List[Document]) -> tuple:
+    """
+    Sayfaları satırlara açıp bölüm ve madde sınırlarını bulur.
+    (giriş satırları, maddeler) döner; her madde {'article', 'heading', 'title',
+    'section', 'page', 'lines'} sözlüğüdür. Madde satırından hemen önceki kısa satır
+    madde başlığı olarak maddeye taşınır.
+    """
+    preamble = []
+    articles = []
+    section = None
+    pending_section = None
+    for page_index, doc in enumerate(pages):
+        page = (doc.metadata or {}).get("page", page_index)
+        for line in doc.page_content.splitlines():
+            if not line.strip() or _PAGE_NUMBER_LINE.match(line):
+                continue
+            if _SECTION_LINE.match(line):
+                pending_section = section = line.strip()
+                continue
+            if pending_section is not None and _is_title_line(line) and not _ARTICLE_LINE.match(line):
+                # Bölüm başlığının altındaki ad satırı ('Amaç, Kapsam ve Tanımlar')
+                section = f"{pending_section} - {line.strip()}"
+                pending_section = None
+                continue
+            pending_section = None
+
+            match = _ARTICLE_LINE.match(line)
+            if match:
+                kind, number = match.groups()
+                label = f"{_ARTICLE_KINDS[kind]} {number}" if kind else number
+                current = articles[-1]["lines"] if articles else preamble
+                title = current.pop() if current and _is_title_line(current[-1]) else None
+                articles.append({
+                    "article": label,
+                    "heading": f"{_ARTICLE_KINDS[kind]} Madde {number}" if kind else f"Madde {number}",
+                    "title": title.strip() if title else None,
+                    "section": section,
+                    "page": page,
+                    "lines": [line.strip()],
+                })
+            elif articles:
+                articles[-1]["lines"].append(line.strip())
+            else:
+                preamble.append(line.strip())
+    return preamble, articles
+
+# =================================================================
+# 3. MADDE BAZLI PARÇALAMA
+# =================================================================
+
+def _article_splitter() -> RecursiveCharacterTextSplitter:
+    # Uzun maddeler önce fıkra ('(2) ...') sınırlarından bölünür
+    return RecursiveCharacterTextSplitter(
+        chunk_size=ARTICLE_CHUNK_MAX_CHARS,
+        chunk_overlap=0,
+        separators=["\n(", "\n", " ", ""]
+    )
+
+def chunk_by_article(pages: List[Document]) -> List[Document]:
+    """
+    Bir mevzuat PDF'inin sayfalarını madde başına bir parça olacak şekilde böler.
+    ARTICLE_CHUNK_MAX_CHARS'ı aşan maddeler fıkra sınırlarından bölünür. Her parça
+    '<mevzuat> - [Geçici ]Madde <n> (<başlık>)' satırıyla başlar ve metadata'sında mevzuat adı,
+    bölüm, madde numarası ve yürürlük tarihi bulunur. Madde bulunamazsa boş liste döner.
+    """
+    if not pages:
+        return []
+    preamble, articles = split_structure(pages)
+    if not articles:
+        return []
+
+    base = dict(pages[0].metadata or {})
+    fallback = base.get("title") or os.path.splitext(os.path.basename(base.get("source", "")))[0]
+    regulation = detect_regulation_name(preamble, fallback)
+    effective_date = detect_effective_date(articles, preamble)
+    splitter = _article_splitter()
+
+    chunks = []
+    preamble_text = "\n".join(preamble)
+    if len(preamble_text) >= _MIN_PREAMBLE_CHARS:
+        for part in splitter.split_text(preamble_text):
+            metadata = {**base, "regulation": regulation, "effective_date": effective_date, "chunk_type": "preamble"}
+            chunks.append(Document(page_content=part, metadata={k: v for k, v in metadata.items() if v is not None}))
+
+    for article in articles:
+        header = f"{regulation} - {article['heading']}"
+        if article["title"]:
+            header += f" ({article['title']})"
+        parts = splitter.split_text("\n".join(article["lines"]))
+        for number, part in enumerate(parts, start=1):
+            metadata = {
+                **base,
+                "page": article["page"],
+                "regulation": regulation,
+                "section": article["section"],
+                "article": article["article"],
+                "article_title": article["title"],
+                "effective_date": effective_date,
+                "chunk_type": "article",
+                "part": number if len(parts) > 1 else None,
+            }
+            # Chroma metadata'sında None değer saklanamaz
+            chunks.append(Document(
+                page_content=f"{header}\n{part.strip()}",
+                metadata={k: v for k, v in metadata.items() if v is not None}
+            ))
+    return chunks
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Bir mevzuat PDF'inin madde bazlı parçalarını gösterir.")
+    parser.add_argument("pdf", help="PDF dosyası")
+    parser.add_argument("--text", action="store_true", help="Parça metinlerini de yazdır")
+    args = parser.parse_args()
+
+    from langchain_community.document_loaders import PyMuPDFLoader
+    pdf_chunks = chunk_by_article(PyMuPDFLoader(args.pdf).load())
+    keys = ("regulation", "effective_date", "section", "article", "article_title", "page", "part", "chunk_type")
+    for chunk in pdf_chunks:
+        summary = {k: chunk.metadata.get(k) for k in keys if k in chunk.metadata}
+        summary["chars"] = len(chunk.page_content)
+        print(json.dumps(summary, ensure_ascii=False))
+        if args.text:
+            print(chunk.page_content + "\n")
+    print(f"{len(pdf_chunks)} parça")
@@ -0,0 +1,208 @@
+# src/llm_cache.py
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from src.config import LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES
+from src.metrics import record_cache_result
+
+log = logging.getLogger("llm_cache")
+
+# Boyut limiti aşıldığında önbellek bu orana kadar küçültülür
+_EVICTION_TARGET_RATIO = 0.8
+# Boyut kontrolü her put'ta değil, bu kadar yazmada bir yapılır
+_SIZE_CHECK_INTERVAL = 100
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def prompt_template_hash(chain) -> str:
+    """
+    Zincirin prompt şablonunu (format talimatları dahil) yer tutucularla
+    render edip hash'ler. Şablon değişirse hash de değişir.
+    """
+    prompt = getattr(chain, "first", None)
+    try:
+        placeholders = {name: "{" + name + "}" for name in prompt.input_variables}
+        rendered = prompt.format(**placeholders)
+    except Exception:
+        rendered = repr(prompt)
+    return _sha256(rendered)
+
+def llm_identity(chain):
+    """Zincirdeki modelin (model adı, sıcaklık) bilgisini döndürür."""
+    for step in getattr(chain, "steps", []):
+        model = getattr(step, "model_name", None) or getattr(step, "_llm_type", None)
+        if model is not None:
+            return str(model), float(getattr(step, "temperature", 0) or 0)
+    return "unknown", 0.0
+
+def input_hash(inputs: dict) -> str:
+    return _sha256(json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str))
+
+# =================================================================
+# 1. SQLITE TABANLI CEVAP ÖNBELLEĞİ
+# =================================================================
+
+class LLMResponseCache:
+    """
+    (zincir adı, prompt şablon hash'i, model, sıcaklık, girdi hash'i) -> JSON cevap.
+    Boyut limiti aşılınca en uzun süredir kullanılmayan kayıtlar silinir.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._puts_since_check = 0
+        self.hits = {}
+        self.misses = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                chain_name TEXT NOT NULL,
+                template_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                temperature REAL NOT NULL,
+                input_hash TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (chain_name, template_hash, model, temperature, input_hash)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_used ON llm_cache (last_used)")
+        self._conn.commit()
+
+    def get(self, key: tuple):
+        chain_name = key[0]
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM llm_cache WHERE chain_name = ? AND template_hash = ? "
+                "AND model = ? AND temperature = ? AND input_hash = ?",
+                key
+            ).fetchone()
+            if row is None:
+                self.misses[chain_name] = self.misses.get(chain_name, 0) + 1
+                return None
+            self._conn.execute(
+                "UPDATE llm_cache SET last_used = ? WHERE chain_name = ? AND template_hash = ? "
+                "AND model = ? AND temperature = ? AND input_hash = ?",
+                (time.time(), *key)
+            )
+            self._conn.commit()
+            self.hits[chain_name] = self.hits.get(chain_name, 0) + 1
+            return row[0]
+
+    def put(self, key: tuple, response: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache "
+                "(chain_name, template_hash, model, temperature, input_hash, response, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, response, len(response.encode("utf-8")), now, now)
+            )
+            self._conn.commit()
+            self._puts_since_check += 1
+            if self._puts_since_check >= _SIZE_CHECK_INTERVAL:
+                self._puts_since_check = 0
+                self._evict_if_needed()
+
+    def _evict_if_needed(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * _EVICTION_TARGET_RATIO)
+        removed = 0
+        cursor = self._conn.execute("SELECT rowid, size FROM llm_cache ORDER BY last_used ASC")
+        to_delete = []
+        for rowid, size in cursor:
+            if total <= target:
+                break
+            to_delete.append((rowid,))
+            total -= size
+            removed += 1
+        self._conn.executemany("DELETE FROM llm_cache WHERE rowid = ?", to_delete)
+        self._conn.commit()
+        log.info(f"LLM önbelleği boyut limitini aştı: {removed} eski kayıt silindi.")
+
+    def invalidate_stale_templates(self, chain_name: str, template_hash: str) -> int:
+        """Zincirin şablonu değiştiyse eski şablona ait tüm kayıtları siler."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM llm_cache WHERE chain_name = ? AND template_hash != ?",
+                (chain_name, template_hash)
+            )
+            self._conn.commit()
+            if cursor.rowcount:
+                log.info(f"'{chain_name}' prompt şablonu değişmiş: {cursor.rowcount} önbellek kaydı geçersiz kılındı.")
+            return cursor.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+            ).fetchone()
+        return {"hits": dict(self.hits), "misses": dict(self.misses), "entries": entries, "bytes": size}
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def get_llm_cache() -> LLMResponseCache:
+    """Süreç geneli tek önbellek nesnesini döndürür (ilk kullanımda açılır)."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = LLMResponseCache()
+        return _CACHE
+
+# =================================================================
+# 2. ZİNCİR SARMALAYICISI
+# =================================================================
+
+class CachedChain:
+    """
+    Zincirin önüne konan kalıcı önbellek. Aynı girdiyle daha önce üretilmiş
+    cevap varsa API'ye (ve zamanlayıcıya) hiç gitmeden döndürülür.
+    Zincir çıktısı Pydantic modeli olduğundan JSON olarak saklanıp geri yüklenir.
+    """
+
+    def __init__(self, inner, chain, chain_name: str, output_model, cache: LLMResponseCache = None):
+        self.inner = inner          # Çağrılacak zincir (örn: ScheduledChain)
+        self.chain = chain          # Anahtar üretimi için ham LCEL zinciri
+        self.chain_name = chain_name
+        self.output_model = output_model
+        self.cache = cache or get_llm_cache()
+        self.template_hash = prompt_template_hash(chain)
+        self.model, self.temperature = llm_identity(chain)
+        self.cache.invalidate_stale_templates(chain_name, self.template_hash)
+
+    def _key(self, inputs: dict) -> tuple:
+        return (self.chain_name, self.template_hash, self.model, self.temperature, input_hash(inputs))
+
+    async def ainvoke(self, inputs: dict, config=None):
+        key = self._key(inputs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            try:
+                result = self.output_model.model_validate_json(cached)
+                record_cache_result(self.chain_name, hit=True)
+                return result
+            except Exception as e:
+                log.warning(f"'{self.chain_name}' önbellek kaydı okunamadı, yeniden hesaplanacak: {e}")
+
+        record_cache_result(self.chain_name, hit=False)
+        result = await self.inner.ainvoke(inputs, config=config)
+        self.cache.put(key, result.model_dump_json())
+        return result
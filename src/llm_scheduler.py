@@ -0,0 +1,231 @@
+# src/llm_scheduler.py
+import json
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+import threading
+from functools import lru_cache
+
+from src.config import (
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_BURST_SECONDS,
+    LLM_COMPLETION_TOKENS_ESTIMATE,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
+    LLM_STAGE_PRIORITY
+)
+from src.metrics import REGISTRY, with_token_usage
+
+log = logging.getLogger("llm_scheduler")
+
+# Sırası gelmeyen isteklerin durumu yeniden kontrol etme aralığı (saniye)
+_POLL_INTERVAL = 0.05
+
+# Tekrar denenebilir (geçici) HTTP durum kodları
+_RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# =================================================================
+# 1. TOKEN TAHMİNİ
+# =================================================================
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+def count_tokens(text: str) -> int:
+    """tiktoken varsa gerçek token sayısını, yoksa kaba bir tahmini (~4 karakter/token) döndürür."""
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+def estimate_prompt_tokens(chain, inputs: dict) -> int:
+    """Zincirin prompt şablonunu girdilerle doldurup gönderilecek token sayısını tahmin eder."""
+    prompt = getattr(chain, "first", None)
+    try:
+        text = prompt.format(**inputs)
+    except Exception:
+        text = json.dumps(inputs, ensure_ascii=False, default=str)
+    return count_tokens(text)
+
+# =================================================================
+# 2. TOKEN BUCKET
+# =================================================================
+
+class TokenBucket:
+    """
+    Dakika başına bütçe ile sürekli dolan token bucket.
+    Kapasite 'burst_seconds' saniyelik bütçe kadardır; böylece kısa sürede
+    birikmiş bütçenin tamamı bir anda harcanıp sağlayıcı limiti aşılmaz.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = LLM_BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """'amount' kadar harcama yapabilmek için beklenmesi gereken süre."""
+        self._refill(now)
+        amount = min(amount, self.capacity) # Tek başına kapasiteyi aşan istek kilitlenmesin
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self):
+        """Sağlayıcı 429 döndürdüğünde: herkes yeniden dolmayı beklesin."""
+        self.tokens = min(self.tokens, 0.0)
+
+# =================================================================
+# 3. SÜREÇ GENELİ ZAMANLAYICI
+# =================================================================
+
+def is_retryable_error(error: Exception) -> bool:
+    status_code = getattr(error, "status_code", None)
+    if status_code in _RETRYABLE_STATUS_CODES:
+        return True
+    # Bağlantı / zaman aşımı hataları (openai.APIConnectionError, APITimeoutError vb.)
+    name = type(error).__name__
+    return name in ("APIConnectionError", "APITimeoutError", "TimeoutError")
+
+class LLMScheduler:
+    """
+    Tüm zincir çağrılarının geçtiği süreç geneli zamanlayıcı.
+    - RPM ve TPM bütçelerini iki ayrı token bucket ile uygular.
+    - Bekleyen istekleri aşama önceliğine (LLM_STAGE_PRIORITY), eşitlikte
+      geliş sırasına göre sıralar.
+    - Geçici hatalarda (429, 5xx, zaman aşımı) jitter'lı üstel geri çekilme
+      ile tekrar dener; tekrar denenen istek sıradaki yerini korur.
+    Event loop'a bağlı asyncio nesneleri tutmaz; farklı asyncio.run
+    çağrıları ve thread'ler arasında güvenle paylaşılabilir.
+    """
+
+    def __init__(self, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+                 max_retries: int = LLM_MAX_RETRIES,
+                 base_delay: float = LLM_RETRY_BASE_DELAY,
+                 max_delay: float = LLM_RETRY_MAX_DELAY,
+                 stage_priority: dict = None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stage_priority = stage_priority or LLM_STAGE_PRIORITY
+        self._lock = threading.Lock()
+        self._waiting = [] # (öncelik, sıra no) heap'i
+        self._sequence = itertools.count()
+        self.stats = {"dispatched": 0, "succeeded": 0, "retried": 0, "rate_limited": 0, "failed": 0}
+
+    async def _acquire(self, ticket, tokens: int):
+        with self._lock:
+            heapq.heappush(self._waiting, ticket)
+        try:
+            while True:
+                with self._lock:
+                    if self._waiting[0] == ticket:
+                        now = time.monotonic()
+                        wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                        if wait <= 0:
+                            self.requests.consume(1)
+                            self.tokens.consume(tokens)
+                            heapq.heappop(self._waiting)
+                            self.stats["dispatched"] += 1
+                            return
+                    else:
+                        wait = _POLL_INTERVAL
+                await asyncio.sleep(min(wait, _POLL_INTERVAL * 10))
+        except BaseException:
+            # İptal edilen (cancel) istek kuyruğu tıkamasın
+            with self._lock:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+            raise
+
+    async def run(self, stage: str, call, prompt_tokens: int = 0):
+        """
+        'call' (argümansız, coroutine döndüren fonksiyon) bütçe uygun olduğunda çalıştırılır.
+        Geçici hatalarda tekrar denenir; kalıcı hatalar çağırana iletilir.
+        """
+        priority = self.stage_priority.get(stage, max(self.stage_priority.values(), default=0) + 1)
+        ticket = (priority, next(self._sequence))
+        tokens = prompt_tokens + LLM_COMPLETION_TOKENS_ESTIMATE
+
+        for attempt in range(self.max_retries + 1):
+            wait_started = time.perf_counter()
+            await self._acquire(ticket, tokens)
+            REGISTRY.observe("compliance_llm_queue_wait_seconds", time.perf_counter() - wait_started, stage=stage)
+            try:
+                result = await call()
+                self.stats["succeeded"] += 1
+                return result
+            except Exception as e:
+                if not is_retryable_error(e) or attempt == self.max_retries:
+                    self.stats["failed"] += 1
+                    raise
+                if getattr(e, "status_code", None) == 429:
+                    self.stats["rate_limited"] += 1
+                    with self._lock:
+                        self.requests.drain()
+                        self.tokens.drain()
+                self.stats["retried"] += 1
+                # "Equal jitter": gecikmenin yarısı sabit, yarısı rastgele
+                delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+                delay = delay / 2 + random.uniform(0, delay / 2)
+                log.warning(f"'{stage}' isteği başarısız ({e}). {delay:.1f} sn sonra tekrar denenecek ({attempt + 1}/{self.max_retries}).")
+                await asyncio.sleep(delay)
+
+_SCHEDULER = None
+_SCHEDULER_LOCK = threading.Lock()
+
+def get_scheduler() -> LLMScheduler:
+    """Süreç geneli tek zamanlayıcıyı döndürür (ilk kullanımda oluşturulur)."""
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = LLMScheduler()
+        return _SCHEDULER
+
+# =================================================================
+# 4. ZİNCİR SARMALAYICISI
+# =================================================================
+
+class ScheduledChain:
+    """
+    Bir LCEL zincirini sarmalar: her ainvoke çağrısı prompt token tahmini ile
+    birlikte süreç geneli zamanlayıcıdan geçer. Gerçekleşen token kullanımı
+    metriklere (src.metrics) yazılır.
+    """
+
+    def __init__(self, chain, stage: str, scheduler: LLMScheduler = None):
+        self.chain = chain
+        self.stage = stage
+        self.scheduler = scheduler
+
+    async def ainvoke(self, inputs: dict, config=None):
+        scheduler = self.scheduler or get_scheduler()
+        prompt_tokens = estimate_prompt_tokens(self.chain, inputs)
+        config = with_token_usage(config, self.stage)
+        return await scheduler.run(
+            self.stage,
+            lambda: self.chain.ainvoke(inputs, config=config),
+            prompt_tokens
+        )
@@ -1,105 +1,288 @@
 # src/main.py
+import time
 import asyncio
 import logging
-from sqlalchemy.orm import sessionmaker
-from src.models import SessionLocal, CallInput, CallComplianceAnalysis
-from src.compliance_chain import run_compliance_analysis # Ana RAG akışımız
+import argparse
+from src.models import SessionLocal, create_db_and_tables
+from src.result_store import save_analysis_results, save_call_metrics
+from src.compliance_chain import run_compliance_analysis, warm_up # Ana RAG akışımız
+from src.config import (
+    LLM_CACHE_ENABLED,
+    CALL_METRICS_ENABLED,
+    CHECKPOINTS_ENABLED,
+    METRICS_TEXTFILE_PATH,
+    METRICS_EXPORT_INTERVAL_SECONDS
+)
+from src.metrics import REGISTRY, trace_call, span, write_textfile
+from src.llm_cache import get_llm_cache
+from src.checkpoints import CallCheckpointer, delete_checkpoints
+from src.call_queue import (
+    LEASE_SECONDS,
+    new_worker_id,
+    claim_calls,
+    renew_leases,
+    complete_call
+)
 
 # Loglama ayarları
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 log = logging.getLogger(__name__)
 
-# Her döngüde kaç çağrı işlenecek
-BATCH_SIZE = 5 
+# Aynı anda işlemde tutulacak maksimum çağrı sayısı (in-flight penceresi)
+MAX_IN_FLIGHT_CALLS = 5
 
-async def process_batch(db_session, call_batch):
+# Kuyruk boşken veya tüm slotlar doluyken yeni çağrılar için tekrar bakma aralığı (saniye)
+POLL_INTERVAL_SECONDS = 5
+
+# İşlenen çağrıların kiralamalarının yenilenme aralığı (saniye)
+LEASE_RENEW_INTERVAL_SECONDS = LEASE_SECONDS // 3
+
+def result_status(result_or_exception) -> str:
+    """Analiz sonucuna (veya hatasına) göre çağrının son durumunu belirler."""
+    if isinstance(result_or_exception, Exception):
+        return "failed"
+    if not result_or_exception:
+        return "processed_no_segment"
+    return "processed"
+
+def write_call_results(db_session, worker_id, items):
     """
-    Bir grup çağrıyı asenkron olarak işler ve sonuçları veritabanına yazar.
+    Biten çağrıların durumlarını günceller ve başarılı çağrıların segment
+    sonuçlarını tek seferde toplu (bulk) olarak yazar; tümü tek commit'tir.
+    Çağrının kiralaması bu worker'da değilse (süresi dolup başka bir worker
+    almışsa) sonucu yazılmaz. Sonucu yazılan çağrıların ara kayıtları aynı
+    commit'te silinir; başarısız çağrılarınki tekrar deneme için kalır.
+    items: [(call_pk, call_id, sonuç veya hata, çağrı izi)]
     """
-    
-    tasks = []
-    for call in call_batch:
-        # Her çağrı için run_compliance_analysis fonksiyonunu bir görev (task) olarak ekle
-        tasks.append(run_compliance_analysis(call.transcript))
-
-    log.info(f"{len(call_batch)} adet çağrı için analiz görevleri başlatılıyor...")
-    
-    # Tüm analiz görevlerini paralel olarak çalıştır
-    # results_list, her bir çağrı için bir 'analiz sonucu listesi' dönecek
-    # Yani -> [ [segment_result_1, segment_result_2], [segment_result_1], ... ]
-    try:
-        results_list = await asyncio.gather(*tasks, return_exceptions=True)
-    except Exception as e:
-        log.error(f"Asyncio.gather hatası (kritik): {e}")
-        return
-
-    log.info("Tüm analiz görevleri tamamlandı. Sonuçlar veritabanına yazılıyor...")
-    
-    # Sonuçları işle ve veritabanına yaz
-    for i, result_or_exception in enumerate(results_list):
-        call = call_batch[i]
-        
-        if isinstance(result_or_exception, Exception):
+    to_save = []
+    finished = []
+    metrics_rows = []
+    for call_pk, call_id, result, trace in items:
+        status = result_status(result)
+        if status == "failed":
             # Eğer analiz sırasında bir hata oluştuysa (örn: LLM hatası)
-            log.error(f"Çağrı ID {call.call_id} işlenirken hata oluştu: {result_or_exception}")
-            call.status = "failed"
-        
-        elif not result_or_exception:
+            log.error(f"Çağrı ID {call_id} işlenirken hata oluştu: {result}")
+        elif status == "processed_no_segment":
             # Analiz başarılı oldu ama hiç segment bulunamadı
-            log.warning(f"Çağrı ID {call.call_id} için analiz edilecek segment bulunamadı.")
-            call.status = "processed_no_segment"
-            
-        else:
-            # Analiz başarılı ve segmentler bulundu
-            try:
-                # result_or_exception = [segment_1_dict, segment_2_dict, ...]
-                for segment_data in result_or_exception:
-                    new_analysis_output = CallComplianceAnalysis(
-                        input_call_id=call.id,
-                        **segment_data # Sözlükteki tüm verileri modele eşle
-                    )
-                    db_session.add(new_analysis_output)
-                
-                call.status = "processed"
-                log.info(f"Çağrı ID {call.call_id} için {len(result_or_exception)} segment DB'ye eklendi.")
-                
-            except Exception as e:
-                log.error(f"Çağrı ID {call.call_id} sonuçları DB'ye yazılırken hata: {e}")
-                call.status = "failed_writing_db"
+            log.warning(f"Çağrı ID {call_id} için analiz edilecek segment bulunamadı.")
+
+        if not complete_call(db_session, call_pk, worker_id, status):
+            log.warning(f"Çağrı ID {call_id} kiralaması başka bir worker'a geçmiş. Sonuç yazılmadı.")
+            continue
+        REGISTRY.inc("compliance_calls_total", status=status)
+        metrics_rows.append((call_pk, status, trace))
+        if status != "failed":
+            finished.append(call_pk)
+        if status == "processed":
+            to_save.append((call_pk, call_id, result))
 
     try:
-        db_session.commit()
+        with span("db_write"):
+            write_start = time.perf_counter()
+            save_analysis_results(db_session, [(call_pk, result) for call_pk, _, result in to_save])
+            if CALL_METRICS_ENABLED:
+                # Toplu yazımın süresi, izler kaydedilmeden önce yazılan her çağrının izine eklenir
+                write_seconds = time.perf_counter() - write_start
+                for _, _, trace in metrics_rows:
+                    if trace is not None:
+                        trace.add_span("db_write", write_seconds, calls=len(metrics_rows))
+                save_call_metrics(db_session, metrics_rows)
+            if CHECKPOINTS_ENABLED:
+                delete_checkpoints(db_session, finished)
+            db_session.commit()
+        for _, call_id, result in to_save:
+            log.info(f"Çağrı ID {call_id} için {len(result)} segment DB'ye eklendi.")
+        return
     except Exception as e:
-        log.error(f"Batch commit sırasında DB hatası: {e}")
+        log.error(f"Sonuçlar DB'ye yazılırken hata: {e}")
         db_session.rollback()
 
-def run_pipeline():
-    """Ana BDDK Uyumluluk Pipeline'ı."""
-    log.info("BDDK Uyumluluk Analiz Pipeline'ı Başlatılıyor...")
-    
-    db_session = SessionLocal()
+    # Toplu yazım geri alındı: durumları yeniden işle, sonuçları yazılamayanları işaretle
+    saved_pks = {call_pk for call_pk, _, _ in to_save}
     try:
+        for call_pk, call_id, result, _ in items:
+            status = "failed_writing_db" if call_pk in saved_pks else result_status(result)
+            complete_call(db_session, call_pk, worker_id, status)
+        db_session.commit()
+    except Exception as e:
+        log.error(f"Çağrı durumları commit edilirken DB hatası: {e}")
+        db_session.rollback()
+
+# Worker'ın DB işlemleri event loop'u bloklamasın diye thread'lerde, her biri kendi
+# oturumuyla çalışır: büyük bir toplu yazım ya da SQLite kilit beklemesi sürerken
+# LLM çağrıları, retrieval batcher'ı ve kiralama yenileme devam eder.
+
+def _claim(worker_id: str, limit: int) -> list:
+    with SessionLocal() as db_session:
+        return claim_calls(db_session, worker_id, limit)
+
+def _renew(worker_id: str, call_pks: list) -> int:
+    with SessionLocal() as db_session:
+        return renew_leases(db_session, worker_id, call_pks)
+
+def _write(worker_id: str, items: list):
+    with SessionLocal() as db_session:
+        write_call_results(db_session, worker_id, items)
+
+# =================================================================
+# SÜREKLİ ÇALIŞAN (STREAMING) WORKER
+# =================================================================
+
+async def run_worker(max_in_flight: int = MAX_IN_FLIGHT_CALLS, follow: bool = False):
+    """
+    Uzun ömürlü asenkron worker:
+    - Üretici (producer), 'pending' çağrıları kiralama (lease) ile atomik olarak
+      talep edip in-flight penceresini sürekli dolu tutar. Aynı kuyruğu birden fazla
+      süreç/makine güvenle paylaşabilir.
+    - Tüketiciler (consumer), bir slot boşalır boşalmaz yeni çağrıya başlar;
+      en yavaş çağrıyı bekleyen bir batch bariyeri yoktur.
+    - Yazıcı (writer), biten çağrıların sonuçlarını tek bir görevde DB'ye işler.
+    - Kiralama yenileyici (heartbeat), işlenen çağrıların kiralamasını uzatır.
+    follow=False ise kuyruk boşaldığında ve tüm işler bittiğinde durur.
+    """
+    worker_id = new_worker_id()
+    log.info(f"Worker kimliği: {worker_id}")
+    # Mevcut veritabanına sonradan eklenen tablo ve kolonlar uygulanır
+    await asyncio.to_thread(create_db_and_tables)
+    # Model, retriever ve zincirler çağrı talep edilmeden önce yüklenir;
+    # böylece kiralama süresi yükleme sırasında işlemez.
+    await asyncio.to_thread(warm_up)
+    call_queue = asyncio.Queue(maxsize=max_in_flight)
+    result_queue = asyncio.Queue()
+    in_flight = set() # Kuyrukta, işlemde veya yazılmayı bekleyen çağrıların id'leri
+    slot_freed = asyncio.Event()
+
+    async def wait_for_slot():
+        try:
+            await asyncio.wait_for(slot_freed.wait(), timeout=POLL_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        slot_freed.clear()
+
+    async def producer():
         while True:
-            log.info(f"'pending' statüsündeki {BATCH_SIZE} adet çağrı aranıyor...")
-            
-            call_batch = db_session.query(CallInput).filter(
-                CallInput.status == "pending"
-            ).limit(BATCH_SIZE).all()
+            free_slots = max_in_flight - len(in_flight)
+            if free_slots <= 0:
+                await wait_for_slot()
+                continue
+
+            new_calls = await asyncio.to_thread(_claim, worker_id, free_slots)
 
-            if not call_batch:
+            for call_pk, call_id, transcript in new_calls:
+                in_flight.add(call_pk)
+                await call_queue.put((call_pk, call_id, transcript))
+
+            if new_calls:
+                continue
+            if not in_flight and not follow:
                 log.info("İşlenecek yeni çağrı bulunamadı. Pipeline tamamlandı.")
-                break
-            
-            log.info(f"{len(call_batch)} adet çağrı bulundu ve işleme alınıyor.")
-            # Asenkron batch işleme fonksiyonunu çalıştır
-            asyncio.run(process_batch(db_session, call_batch))
+                return
+            # Kuyruk boş: bir slot boşalınca veya periyodik olarak tekrar bak
+            await wait_for_slot()
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(LEASE_RENEW_INTERVAL_SECONDS)
+            try:
+                await asyncio.to_thread(_renew, worker_id, list(in_flight))
+            except Exception as e:
+                log.error(f"Kiralama yenilenirken DB hatası: {e}")
+
+    async def consumer():
+        while True:
+            item = await call_queue.get()
+            if item is None:
+                return
+            call_pk, call_id, transcript = item
+            log.info(f"Çağrı ID {call_id} işleme alındı.")
+            # Tamamlanan adımlar çağrı bazında kaydedilir; çağrı daha önce yarıda
+            # kaldıysa (çökme, süresi dolan kiralama, tekrar kuyruğa alma) kaldığı yerden devam eder
+            checkpoint = CallCheckpointer(call_pk, transcript) if CHECKPOINTS_ENABLED else None
+            # Çağrının tüm aşama span'leri, token ve önbellek sayıları bu ize yazılır
+            with trace_call() as trace:
+                try:
+                    result = await run_compliance_analysis(transcript, checkpoint=checkpoint)
+                except Exception as e:
+                    result = e
+            await result_queue.put((call_pk, call_id, result, trace))
+
+    async def writer():
+        while True:
+            item = await result_queue.get()
+            if item is None:
+                return
+            # O an hazır olan tüm sonuçları toplu INSERT'ler ve tek commit ile yaz
+            items = [item]
+            while not result_queue.empty():
+                next_item = result_queue.get_nowait()
+                if next_item is None:
+                    result_queue.put_nowait(None)
+                    break
+                items.append(next_item)
+
+            await asyncio.to_thread(_write, worker_id, items)
+
+            for call_pk, *_ in items:
+                in_flight.discard(call_pk)
+            slot_freed.set()
 
+    async def metrics_exporter():
+        # Prometheus textfile collector için metrikleri periyodik olarak dosyaya yaz
+        while True:
+            await asyncio.sleep(METRICS_EXPORT_INTERVAL_SECONDS)
+            try:
+                write_textfile(METRICS_TEXTFILE_PATH)
+            except OSError as e:
+                log.error(f"Metrik dosyası yazılamadı: {e}")
+
+    consumers = [asyncio.create_task(consumer()) for _ in range(max_in_flight)]
+    writer_task = asyncio.create_task(writer())
+    heartbeat_task = asyncio.create_task(heartbeat())
+    background = [heartbeat_task]
+    if METRICS_TEXTFILE_PATH:
+        background.append(asyncio.create_task(metrics_exporter()))
+    try:
+        await producer()
+        for _ in consumers:
+            await call_queue.put(None)
+        await asyncio.gather(*consumers)
+        await result_queue.put(None)
+        await writer_task
+    finally:
+        for task in consumers + [writer_task] + background:
+            task.cancel()
+        if METRICS_TEXTFILE_PATH:
+            try:
+                write_textfile(METRICS_TEXTFILE_PATH)
+            except OSError as e:
+                log.error(f"Metrik dosyası yazılamadı: {e}")
+
+def run_pipeline(follow: bool = False):
+    """Ana BDDK Uyumluluk Pipeline'ı."""
+    log.info("BDDK Uyumluluk Analiz Pipeline'ı Başlatılıyor...")
+    log.info(f"Worker modu: en fazla {MAX_IN_FLIGHT_CALLS} çağrı eşzamanlı işlenecek.")
+
+    try:
+        asyncio.run(run_worker(follow=follow))
     except Exception as e:
         log.error(f"Pipeline'da kritik hata: {e}")
-        db_session.rollback()
     finally:
-        db_session.close()
-        log.info("Veritabanı bağlantısı kapatıldı.")
+        if LLM_CACHE_ENABLED:
+            log.info(f"LLM önbellek istatistikleri: {get_llm_cache().stats()}")
 
 if __name__ == "__main__":
-    run_pipeline()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="BDDK Uyumluluk Analiz Pipeline'ı")
+    parser.add_argument(
+        "--follow", action="store_true",
+        help="Kuyruk boşalınca durmaz; yeni 'pending' çağrıları beklemeye devam eder."
+    )
+    parser.add_argument(
+        "--batch", action="store_true",
+        help="Bekleyen çağrıları canlı istekler yerine offline toplu (Batch API) modda işler (bkz: src.batch_pipeline)."
+    )
+    args = parser.parse_args()
+    if args.batch:
+        from src.batch_pipeline import run_batch_mode
+        log.info(f"Toplu çalıştırma özeti: {run_batch_mode()}")
+    else:
+        run_pipeline(follow=args.follow)
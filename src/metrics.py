@@ -0,0 +1,277 @@
+# src/metrics.py
+import os
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import defaultdict
+from typing import Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.config import METRICS_TEXTFILE_PATH
+
+log = logging.getLogger("metrics")
+
+# Süre histogramlarının kova (bucket) sınırları (saniye)
+_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_METRIC_HELP = {
+    "compliance_stage_duration_seconds": ("histogram", "Pipeline aşamalarının süresi (saniye)."),
+    "compliance_llm_queue_wait_seconds": ("histogram", "LLM isteklerinin zamanlayıcıda bekleme süresi (saniye)."),
+    "compliance_llm_tokens_total": ("counter", "LLM'e gönderilen (prompt) ve alınan (completion) token sayısı."),
+    "compliance_llm_cache_requests_total": ("counter", "LLM cevap önbelleği isabet (hit) / ıskalama (miss) sayısı."),
+    "compliance_segments_total": ("counter", "İşlenen segment sayısı (sonuca göre)."),
+    "compliance_segmentation_windows_total": ("counter", "Uzun transkriptlerde segmentlenen pencere sayısı (sonuca göre)."),
+    "compliance_semantic_cache_requests_total": ("counter", "Sorgu zenginleştirme anlamsal önbelleği isabet / ıskalama sayısı."),
+    "compliance_context_tokens_total": ("counter", "Analiz prompt'una giden mevzuat bağlamı token sayısı (baseline: ilk k parça, assembled: derlenmiş)."),
+    "compliance_index_reloads_total": ("counter", "Çalışırken yüklenen yeni vektör index sürümü sayısı."),
+    "compliance_llm_calls_avoided_total": ("counter", "Yerel filtrelerle gönderilmesine gerek kalmayan LLM çağrısı sayısı."),
+    "compliance_checkpoint_steps_total": ("counter", "Ara kayda yazılan (saved) ve yarıda kalan çağrılarda tekrar kullanılan (reused) analiz adımı sayısı."),
+    "compliance_batch_jobs_total": ("counter", "Offline toplu modda sağlayıcıya gönderilen batch sayısı."),
+    "compliance_batch_requests_total": ("counter", "Offline toplu moddaki LLM istekleri (önbellekten, başarılı, başarısız)."),
+    "compliance_calls_total": ("counter", "Worker'ın tamamladığı çağrı sayısı (duruma göre)."),
+}
+
+# =================================================================
+# 1. SÜREÇ GENELİ METRİK KAYDI (COUNTER + HISTOGRAM)
+# =================================================================
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+class MetricsRegistry:
+    """Etiketli sayaçlar ve sabit kovalı histogramlar; Prometheus metin formatında dışa aktarılır."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)     # (ad, etiketler) -> değer
+        self._histograms = {}                   # (ad, etiketler) -> [kova sayıları, toplam, adet]
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        with self._lock:
+            self._counters[(name, _label_key(labels))] += value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(_DURATION_BUCKETS), 0.0, 0]
+            index = bisect.bisect_left(_DURATION_BUCKETS, seconds)
+            if index < len(_DURATION_BUCKETS):
+                histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def snapshot(self) -> dict:
+        """Okunabilir özet: sayaçlar ve histogramların adet/ortalama değerleri."""
+        with self._lock:
+            counters = {f"{name}{dict(labels)}": value for (name, labels), value in self._counters.items()}
+            histograms = {
+                f"{name}{dict(labels)}": {"count": count, "mean_seconds": round(total / count, 4) if count else 0.0}
+                for (name, labels), (_, total, count) in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def render_prometheus(self) -> str:
+        def fmt_labels(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._histograms.items())
+
+        lines = []
+        described = set()
+        def describe(name):
+            if name in described:
+                return
+            described.add(name)
+            metric_type, help_text = _METRIC_HELP.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{name}{fmt_labels(labels)} {value:g}")
+        for (name, labels), (buckets, total, count) in histograms:
+            describe(name)
+            cumulative = 0
+            for bound, bucket_count in zip(_DURATION_BUCKETS, buckets):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{fmt_labels(labels, [('le', f'{bound:g}')])} {cumulative}")
+            lines.append(f"{name}_bucket{fmt_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{fmt_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{fmt_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+def write_textfile(path: str = METRICS_TEXTFILE_PATH):
+    """Metrikleri Prometheus textfile formatında atomik olarak (tmp + rename) yazar."""
+    if not path:
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render_prometheus())
+    os.replace(tmp_path, path)
+
+# =================================================================
+# 2. ÇAĞRI BAŞINA İZ (TRACE) VE SPAN'LER
+# =================================================================
+
+class CallTrace:
+    """
+    Tek bir çağrının span'leri (aşama, segment, süre), aşama başına token
+    sayıları ve önbellek isabetleri. Aynı çağrının eşzamanlı segment
+    görevleri ve thread'ler tarafından güvenle doldurulabilir.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total_seconds = None
+        self.segments = 0
+        self.segments_skipped = 0
+        self.spans = []
+        self.tokens = defaultdict(lambda: {"prompt": 0, "completion": 0})
+        self.cache = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, seconds: float, segment: Optional[int] = None, **attributes):
+        span = {
+            "name": name,
+            "start_ms": round((time.perf_counter() - seconds - self.started) * 1000, 1),
+            "duration_ms": round(seconds * 1000, 1),
+        }
+        if segment is not None:
+            span["segment"] = segment
+        span.update(attributes)
+        with self._lock:
+            self.spans.append(span)
+
+    def add_tokens(self, stage: str, prompt: int, completion: int):
+        with self._lock:
+            self.tokens[stage]["prompt"] += prompt
+            self.tokens[stage]["completion"] += completion
+
+    def add_cache_result(self, hit: bool):
+        with self._lock:
+            self.cache["hits" if hit else "misses"] += 1
+
+    def stage_seconds(self) -> dict:
+        """Aşama başına span sürelerinin toplamı (eşzamanlı segmentlerde duvar saatinden büyük olabilir)."""
+        totals = defaultdict(float)
+        with self._lock:
+            for span in self.spans:
+                totals[span["name"]] += span["duration_ms"] / 1000
+        return {name: round(seconds, 3) for name, seconds in totals.items()}
+
+    def summary(self) -> dict:
+        with self._lock:
+            tokens = {stage: dict(counts) for stage, counts in self.tokens.items()}
+        return {
+            "total_seconds": round(self.total_seconds if self.total_seconds is not None else time.perf_counter() - self.started, 3),
+            "segments": self.segments,
+            "segments_skipped": self.segments_skipped,
+            "stage_seconds": self.stage_seconds(),
+            "prompt_tokens": sum(t["prompt"] for t in tokens.values()),
+            "completion_tokens": sum(t["completion"] for t in tokens.values()),
+            "tokens_by_stage": tokens,
+            "llm_cache_hits": self.cache["hits"],
+            "llm_cache_misses": self.cache["misses"],
+        }
+
+_CURRENT_TRACE = contextvars.ContextVar("compliance_call_trace", default=None)
+
+def current_trace() -> Optional[CallTrace]:
+    return _CURRENT_TRACE.get()
+
+@contextmanager
+def trace_call():
+    """
+    Çağrı için bir iz başlatır; içeride başlatılan görevler (asyncio.gather,
+    to_thread) izi contextvars üzerinden devralır. Zaten aktif bir iz varsa
+    (örn: worker başlattıysa) o iz kullanılır ve toplam süre dışarıda ölçülür.
+    """
+    existing = _CURRENT_TRACE.get()
+    if existing is not None:
+        yield existing
+        return
+    trace = CallTrace()
+    token = _CURRENT_TRACE.set(trace)
+    try:
+        yield trace
+    finally:
+        _CURRENT_TRACE.reset(token)
+        trace.total_seconds = time.perf_counter() - trace.started
+        REGISTRY.observe("compliance_stage_duration_seconds", trace.total_seconds, stage="call_total")
+
+@contextmanager
+def span(name: str, segment: Optional[int] = None, **attributes):
+    """Bir aşamanın süresini hem aktif çağrı izine hem de süreç geneli histograma yazar."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        REGISTRY.observe("compliance_stage_duration_seconds", seconds, stage=name)
+        trace = _CURRENT_TRACE.get()
+        if trace is not None:
+            trace.add_span(name, seconds, segment, **attributes)
+
+def record_cache_result(stage: str, hit: bool):
+    REGISTRY.inc("compliance_llm_cache_requests_total", stage=stage, result="hit" if hit else "miss")
+    trace = _CURRENT_TRACE.get()
+    if trace is not None:
+        trace.add_cache_result(hit)
+
+# =================================================================
+# 3. TOKEN SAYIMI (LANGCHAIN CALLBACK)
+# =================================================================
+
+def _usage_from_result(response) -> tuple:
+    """LLMResult'tan (prompt, completion) token sayılarını çıkarır."""
+    prompt = completion = 0
+    found = False
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt += usage.get("input_tokens", 0)
+                completion += usage.get("output_tokens", 0)
+                found = True
+    if not found:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt = usage.get("prompt_tokens", 0)
+        completion = usage.get("completion_tokens", 0)
+    return prompt, completion
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Her LLM cevabındaki token kullanımını aşama etiketiyle metriklere ve çağrı izine yazar."""
+
+    def __init__(self, stage: str, trace: Optional[CallTrace]):
+        self.stage = stage
+        self.trace = trace # Callback başka bir thread'de çalışabilir; iz oluşturulurken yakalanır
+
+    def on_llm_end(self, response, **kwargs):
+        prompt, completion = _usage_from_result(response)
+        REGISTRY.inc("compliance_llm_tokens_total", prompt, stage=self.stage, kind="prompt")
+        REGISTRY.inc("compliance_llm_tokens_total", completion, stage=self.stage, kind="completion")
+        if self.trace is not None:
+            self.trace.add_tokens(self.stage, prompt, completion)
+
+def with_token_usage(config: Optional[dict], stage: str) -> dict:
+    """Zincir çağrısının config'ine token sayan callback'i ekler."""
+    config = dict(config or {})
+    config["callbacks"] = list(config.get("callbacks") or []) + [TokenUsageCallback(stage, current_trace())]
+    return config
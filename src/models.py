@@ -1,21 +1,43 @@
 # src/models.py
+import os
+import logging
 import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Text, Boolean, DateTime, ForeignKey
+import hashlib
+from sqlalchemy import create_engine, event, inspect, text, insert, select, update, Column, Integer, String, Text, Boolean, Float, DateTime, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql import func
 from pydantic import BaseModel, Field
 from typing import List, Optional
 
+log = logging.getLogger("models")
+
 # =================================================================
 # VERİTABANI (SQLALCHEMY) AYARLARI
 # =================================================================
 
-# Analiz edilecek çağrıların ve sonuçların tutulacağı lokal veritabanı
-DATABASE_URL = "sqlite:///./bank_compliance.db"
+# Analiz edilecek çağrıların ve sonuçların tutulacağı veritabanı.
+# Varsayılan lokal SQLite; birden fazla makinede worker çalıştırmak için
+# DATABASE_URL ortam değişkeni ile bir sunucu veritabanı (örn: PostgreSQL) verilebilir.
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./bank_compliance.db")
 
 Base = declarative_base()
-engine = create_engine(DATABASE_URL)
+
+if DATABASE_URL.startswith("sqlite"):
+    # Aynı dosyayı kullanan birden fazla worker süreci için: kilit beklerken hemen hata verme
+    engine = create_engine(DATABASE_URL, connect_args={"timeout": 30})
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL modu: okuyucular yazıcıyı, yazıcı okuyucuları bloklamaz
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=30000")
+        cursor.close()
+else:
+    engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 class CallInput(Base):
@@ -24,9 +46,18 @@ class CallInput(Base):
     id = Column(Integer, primary_key=True, index=True)
     call_id = Column(String, unique=True, index=True) # Çağrıya ait benzersiz ID
     transcript = Column(Text, nullable=False)
-    status = Column(String, default="pending") # (pending, processed, failed)
+    status = Column(String, default="pending") # (pending, in_progress, processed, failed)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Kuyruk talep (claim) bilgileri: çağrıyı işleyen worker ve kiralama (lease) bitiş zamanı.
+    # Süresi dolan 'in_progress' çağrılar başka bir worker tarafından otomatik geri alınır.
+    worker_id = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True) # UTC
+
+    __table_args__ = (
+        Index("ix_calls_input_status_lease", "status", "lease_expires_at"),
+    )
+
 class CallComplianceAnalysis(Base):
     """LLM tarafından yapılan BDDK uyumluluk analizinin sonuçları."""
     __tablename__ = "compliance_analysis_output"
@@ -42,20 +73,190 @@ class CallComplianceAnalysis(Base):
     customer_query = Column(Text, nullable=False)
     agent_response = Column(Text, nullable=False)
     
+    # Sorgu zenginleştirme çıktısı (anlamsal önbellek bu kayıtlardan doldurulur)
+    search_query = Column(Text, nullable=True)
+
     # RAG Sonucu
-    rag_context = Column(Text, nullable=True) # RAG'dan gelen en alakalı mevzuat metni
+    # Eski kayıtlar: mevzuat metninin tamamı. Yeni kayıtlarda boş kalır; kullanılan
+    # parçalar 'analysis_chunks' üzerinden 'regulation_chunks' tablosuna bağlanır.
+    rag_context = Column(Text, nullable=True)
+    # Derlenmiş bağlamın token sayısı ve önceki davranışa (ilk k parça) göre tasarruf
+    context_tokens = Column(Integer, nullable=True)
+    context_tokens_saved = Column(Integer, nullable=True)
+    # Analizde kullanılan vektör index sürümü (index_versions; eski düzen: 'legacy')
+    index_version = Column(String, nullable=True)
     
     # LLM 2 (Analiz) Çıktıları
     violation_detected = Column(Boolean, nullable=True) # İhlal var mı?
     omission_detected = Column(Boolean, nullable=True)  # Eksik bilgi var mı?
     analysis = Column(Text, nullable=True)              # Denetçi analizi
     suggestion = Column(Text, nullable=True)            # Temsilci için öneri
+
+    # Yerel ilgililik filtresi (relevance gate) skoru ve LLM'e gönderilmediyse nedeni
+    relevance_score = Column(Float, nullable=True)
+    skipped_reason = Column(String, nullable=True)      # örn: 'relevance_gate'
     
     processed_at = Column(DateTime(timezone=True), server_default=func.now())
 
+class RegulationChunk(Base):
+    """
+    RAG'da kullanılan mevzuat parçaları. Her parça bir kez saklanır; aynı parçayı
+    kullanan tüm analiz satırları ona chunk id ile referans verir.
+    """
+    __tablename__ = "regulation_chunks"
+    id = Column(String, primary_key=True) # Vektör deposundaki kararlı chunk id'si (içerik hash'i)
+    content = Column(Text, nullable=False)
+    source = Column(String, nullable=True) # Kaynak PDF
+    page = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class AnalysisChunk(Base):
+    """Bir analiz satırında kullanılan mevzuat parçaları, sıraları ve retrieval skorları."""
+    __tablename__ = "analysis_chunks"
+    analysis_id = Column(Integer, ForeignKey("compliance_analysis_output.id"), primary_key=True)
+    chunk_id = Column(String, ForeignKey("regulation_chunks.id"), primary_key=True)
+    rank = Column(Integer, nullable=False) # 0 = en alakalı
+    score = Column(Float, nullable=True)   # Kosinüs benzerliği (eski kayıtlarda boş)
+
+    __table_args__ = (
+        Index("ix_analysis_chunks_chunk_id", "chunk_id"),
+    )
+
+class CallMetrics(Base):
+    """Bir çağrının işlenmesine ait aşama süreleri, token kullanımı ve span'ler."""
+    __tablename__ = "call_metrics"
+    id = Column(Integer, primary_key=True, index=True)
+    input_call_id = Column(Integer, ForeignKey("calls_input.id"), index=True)
+    status = Column(String, nullable=True)
+    total_seconds = Column(Float, nullable=True)
+    segments = Column(Integer, nullable=True)
+    segments_skipped = Column(Integer, nullable=True) # İlgililik filtresiyle LLM'e gönderilmeyenler
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    llm_cache_hits = Column(Integer, nullable=True)
+    llm_cache_misses = Column(Integer, nullable=True)
+    stage_seconds = Column(Text, nullable=True) # JSON: aşama -> toplam süre
+    spans = Column(Text, nullable=True)         # JSON: [{name, segment, start_ms, duration_ms, ...}]
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class CallCheckpoint(Base):
+    """
+    Yarıda kalan çağrıların ara sonuçları (segmentasyon, segment başına arama sorgusu,
+    derlenmiş bağlam ve analiz). Çağrı tekrar işlendiğinde yalnızca eksik adımlar
+    yapılır; çağrının sonuçları yazılınca kayıtları silinir.
+    """
+    __tablename__ = "analysis_checkpoints"
+    id = Column(Integer, primary_key=True, index=True)
+    input_call_id = Column(Integer, ForeignKey("calls_input.id"), nullable=False)
+    transcript_hash = Column(String, nullable=False) # Transkript değişirse eski kayıtlar kullanılmaz
+    stage = Column(String, nullable=False)           # segmentation, search_query, context, analysis
+    segment_index = Column(Integer, nullable=False)  # 0 = çağrı geneli (segmentasyon)
+    payload = Column(Text, nullable=False)           # JSON
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("input_call_id", "transcript_hash", "stage", "segment_index",
+                         name="uq_analysis_checkpoints_step"),
+    )
+
+def chunk_hash(content: str) -> str:
+    """Kimliği bilinmeyen parçalar için içerikten türetilen kararlı chunk id."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def insert_ignore(model):
+    """
+    Birincil/benzersiz anahtarı zaten var olan satırları sessizce atlayan
+    toplu INSERT ifadesi (INSERT ... ON CONFLICT DO NOTHING).
+    """
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(model).on_conflict_do_nothing()
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+        return postgresql_insert(model).on_conflict_do_nothing()
+    if dialect in ("mysql", "mariadb"):
+        return insert(model).prefix_with("IGNORE")
+    raise ValueError(f"'{dialect}' için INSERT ... ON CONFLICT DO NOTHING desteklenmiyor.")
+
 def create_db_and_tables():
-    """Veritabanı ve tabloları oluşturur."""
+    """Veritabanı ve tabloları oluşturur. Mevcut veritabanlarını günceller."""
     Base.metadata.create_all(bind=engine)
+    migrate_db()
+    migrate_rag_context_to_chunks()
+
+def migrate_db():
+    """
+    Mevcut tablolara sonradan eklenen kolonları (ALTER TABLE ... ADD COLUMN)
+    ve bu kolonlara ait index'leri ekler. Var olan veriye dokunmaz.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            added = []
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                added.append(column.name)
+            if added:
+                for index in table.indexes:
+                    if any(c.name in added for c in index.columns):
+                        index.create(bind=connection, checkfirst=True)
+
+# Veri taşıma işleminde tek transaction'da işlenen analiz satırı sayısı
+_MIGRATION_BATCH_SIZE = 1000
+
+def migrate_rag_context_to_chunks(batch_size: int = _MIGRATION_BATCH_SIZE) -> int:
+    """
+    Eski analiz satırlarındaki tam 'rag_context' metnini parçalarına ayırıp
+    'regulation_chunks' tablosuna taşır, satırları 'analysis_chunks' ile bağlar ve
+    'rag_context' kolonunu boşaltır. Taşınacak satır yoksa hiçbir şey yapmaz.
+    (Eski kayıtların orijinal chunk id'si bilinmediğinden id içerikten türetilir.)
+    """
+    migrated = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(CallComplianceAnalysis.id, CallComplianceAnalysis.rag_context)
+                .where(CallComplianceAnalysis.rag_context.is_not(None))
+                .order_by(CallComplianceAnalysis.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            chunks, links = {}, []
+            for analysis_id, rag_context in rows:
+                seen = set()
+                for rank, content in enumerate(p for p in rag_context.split("\n---\n") if p.strip()):
+                    chunk_id = chunk_hash(content)
+                    if chunk_id in seen:
+                        continue
+                    seen.add(chunk_id)
+                    chunks.setdefault(chunk_id, {"id": chunk_id, "content": content})
+                    links.append({"analysis_id": analysis_id, "chunk_id": chunk_id, "rank": rank, "score": None})
+
+            if chunks:
+                connection.execute(insert_ignore(RegulationChunk), list(chunks.values()))
+            if links:
+                connection.execute(insert_ignore(AnalysisChunk), links)
+            connection.execute(
+                update(CallComplianceAnalysis)
+                .where(CallComplianceAnalysis.id.in_([r[0] for r in rows]))
+                .values(rag_context=None)
+            )
+            migrated += len(rows)
+        log.info(f"rag_context taşıma: {migrated} analiz satırı parçalara bağlandı.")
+
+    if migrated and engine.dialect.name == "sqlite":
+        log.info("Boşalan alanı geri kazanmak için veritabanında 'VACUUM' çalıştırabilirsiniz.")
+    return migrated
 
 # =================================================================
 # LLM ÇIKTI (PYDANTIC) MODELLERİ
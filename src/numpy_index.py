@@ -0,0 +1,271 @@
+# src/numpy_index.py
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+from typing import List
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import (
+    CallbackManagerForRetrieverRun,
+    AsyncCallbackManagerForRetrieverRun
+)
+
+from src.config import CHROMA_DB_PATH, NUMPY_INDEX_PATH, RETRIEVER_K
+from src.metrics import REGISTRY
+from src.retrieval import filter_key, matches_filter
+
+log = logging.getLogger("numpy_index")
+
+_MATRIX_FILENAME = "embeddings.npy"
+_DOCUMENTS_FILENAME = "documents.jsonl"
+
+# Chroma'dan dışa aktarım yapılırken tek seferde okunan kayıt sayısı
+_EXPORT_PAGE_SIZE = 5000
+
+# Bellekte tutulan filtreli alt matris sayısı (en eski atılır)
+_FILTER_CACHE_SIZE = 8
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+# =================================================================
+# 1. BELLEK İÇİ (MEMMAP) VEKTÖR INDEX'İ
+# =================================================================
+
+class NumpyVectorIndex:
+    """
+    Normalize edilmiş embedding'leri (N x d, float32) memmap'li bir .npy
+    dosyasında tutar. Kosinüs benzerliği, tek bir matris çarpımı ve
+    argpartition ile hesaplanır; toplu (batched) sorguları da destekler.
+    """
+
+    def __init__(self, index_path: str = NUMPY_INDEX_PATH):
+        self.index_path = index_path
+        self.matrix = np.load(os.path.join(index_path, _MATRIX_FILENAME), mmap_mode="r")
+        self.ids = []
+        self.documents = []
+        with open(os.path.join(index_path, _DOCUMENTS_FILENAME), "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self.ids.append(record["id"])
+                self.documents.append(record)
+        self._filtered = {} # filtre anahtarı -> (satır indeksleri, alt matris)
+        log.info(f"NumPy index '{index_path}' yüklendi ({self.matrix.shape[0]} vektör).")
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def _filtered_matrix(self, where: dict):
+        """Metadata filtresine uyan satırları ve bunların alt matrisini döndürür (önbellekli)."""
+        key = filter_key(where)
+        if key not in self._filtered:
+            rows = np.array(
+                [row for row, record in enumerate(self.documents) if matches_filter(record.get("metadata"), where)],
+                dtype=np.int64
+            )
+            if len(self._filtered) >= _FILTER_CACHE_SIZE:
+                self._filtered.pop(next(iter(self._filtered)))
+            self._filtered[key] = (rows, np.ascontiguousarray(self.matrix[rows]))
+        return self._filtered[key]
+
+    def search(self, query_vectors, k: int = RETRIEVER_K, where: dict = None):
+        """
+        Her sorgu vektörü için en benzer k kaydın (satır indeksleri, skorlar)
+        listesini döndürür. Tüm sorgular tek matris çarpımıyla değerlendirilir.
+        where verilirse yalnızca filtreye uyan kayıtlar aranır.
+        """
+        queries = _normalize_rows(np.atleast_2d(np.asarray(query_vectors, dtype=np.float32)))
+        rows, matrix = self._filtered_matrix(where) if where else (None, self.matrix)
+        k = min(k, matrix.shape[0])
+        if k == 0:
+            return [([], []) for _ in range(queries.shape[0])]
+
+        scores = queries @ matrix.T # (sorgu sayısı x N)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in enumerate(top):
+            order = candidates[np.argsort(-scores[row, candidates])]
+            index_rows = rows[order] if rows is not None else order
+            results.append((index_rows.tolist(), scores[row, order].tolist()))
+        return results
+
+    def to_document(self, row: int, score: float = None) -> Document:
+        record = self.documents[row]
+        metadata = dict(record.get("metadata") or {})
+        if score is not None:
+            metadata["score"] = float(score)
+        return Document(page_content=record["text"], metadata=metadata, id=record["id"])
+
+def build_numpy_index(chroma_path: str = CHROMA_DB_PATH, index_path: str = NUMPY_INDEX_PATH):
+    """
+    Chroma'daki mevcut embedding'leri (yeniden vektörize etmeden) sayfa sayfa
+    okuyup normalize eder ve NumPy index'i olarak diske yazar.
+    Yeni index geçici bir klasörde oluşturulup yerine taşınır.
+    """
+    import chromadb
+
+    client = chromadb.PersistentClient(path=chroma_path)
+    collection = client.get_collection("langchain")
+    total = collection.count()
+    if total == 0:
+        log.warning("Chroma koleksiyonu boş. NumPy index'i oluşturulmadı.")
+        return
+
+    tmp_path = index_path.rstrip("/\\") + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    matrix = None
+    row = 0
+    with open(os.path.join(tmp_path, _DOCUMENTS_FILENAME), "w", encoding="utf-8") as f:
+        for offset in range(0, total, _EXPORT_PAGE_SIZE):
+            page = collection.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=_EXPORT_PAGE_SIZE,
+                offset=offset
+            )
+            vectors = _normalize_rows(np.asarray(page["embeddings"], dtype=np.float32))
+            if matrix is None:
+                matrix = np.lib.format.open_memmap(
+                    os.path.join(tmp_path, _MATRIX_FILENAME),
+                    mode="w+", dtype=np.float32, shape=(total, vectors.shape[1])
+                )
+            matrix[row:row + len(vectors)] = vectors
+            row += len(vectors)
+            for cid, text, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                f.write(json.dumps({"id": cid, "text": text, "metadata": metadata}, ensure_ascii=False) + "\n")
+
+    matrix.flush()
+    del matrix
+
+    if os.path.exists(index_path):
+        shutil.rmtree(index_path)
+    os.replace(tmp_path, index_path)
+    log.info(f"NumPy index '{index_path}' adresine kaydedildi ({row} vektör).")
+
+# =================================================================
+# 2. LANGCHAIN RETRIEVER ARAYÜZÜ
+# =================================================================
+
+class NumpyRetriever(BaseRetriever):
+    """
+    NumpyVectorIndex için LangChain retriever'ı. Chroma retriever'ı ile aynı
+    arayüzü (invoke / ainvoke) sunar; ek olarak toplu arama yapılabilir.
+    """
+    index: NumpyVectorIndex
+    embeddings: Embeddings
+    k: int = RETRIEVER_K
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def search_by_vectors(self, query_vectors, k: int = None, where: dict = None) -> List[List[Document]]:
+        results = self.index.search(query_vectors, k or self.k, where=where)
+        return [
+            [self.index.to_document(row, score) for row, score in zip(rows, scores)]
+            for rows, scores in results
+        ]
+
+    def batch_search(self, queries: List[str], k: int = None, where: dict = None) -> List[List[Document]]:
+        """Birden fazla sorguyu tek embedding çağrısı ve tek matris çarpımı ile arar."""
+        if not queries:
+            return []
+        start = time.perf_counter()
+        vectors = self.embeddings.embed_documents(queries)
+        REGISTRY.observe("compliance_stage_duration_seconds", time.perf_counter() - start, stage="embedding")
+        start = time.perf_counter()
+        results = self.search_by_vectors(vectors, k, where=where)
+        REGISTRY.observe("compliance_stage_duration_seconds", time.perf_counter() - start, stage="vector_search")
+        return results
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.search_by_vectors([self.embeddings.embed_query(query)])[0]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector = await self.embeddings.aembed_query(query)
+        return self.search_by_vectors([vector])[0]
+
+# =================================================================
+# 3. CHROMA'YA KARŞI RECALL KONTROLÜ
+# =================================================================
+
+def evaluate_recall(queries: List[str] = None, k: int = RETRIEVER_K, sample_size: int = 200):
+    """
+    Aynı sorgular için NumPy backend'inin ilk k sonucunu Chroma ile karşılaştırır.
+    Sorgu verilmezse index'teki chunk'lardan örneklenen metinler kullanılır.
+    recall@k ve ortalama sorgu sürelerini döndürür.
+    """
+    import chromadb
+    from src.embedding_cache import create_embedding_model
+    from src.index_versions import active_index
+
+    active = active_index()
+    embeddings = create_embedding_model()
+    index = NumpyVectorIndex(active["numpy_path"])
+    collection = chromadb.PersistentClient(path=active["chroma_path"]).get_collection("langchain")
+
+    if not queries:
+        rng = np.random.default_rng(0)
+        rows = rng.choice(len(index), size=min(sample_size, len(index)), replace=False)
+        queries = [index.documents[int(r)]["text"][:300] for r in rows]
+
+    query_vectors = embeddings.embed_documents(queries)
+
+    start = time.perf_counter()
+    chroma_ids = [
+        collection.query(query_embeddings=[vector], n_results=k)["ids"][0]
+        for vector in query_vectors
+    ]
+    chroma_time = (time.perf_counter() - start) / len(queries)
+
+    start = time.perf_counter()
+    numpy_results = index.search(query_vectors, k)
+    numpy_time = (time.perf_counter() - start) / len(queries)
+
+    hits = 0
+    for expected, (rows, _) in zip(chroma_ids, numpy_results):
+        got = {index.ids[r] for r in rows}
+        hits += len(got.intersection(expected))
+    recall = hits / max(1, sum(len(ids) for ids in chroma_ids))
+
+    report = {
+        "queries": len(queries),
+        "k": k,
+        "recall_at_k": recall,
+        "chroma_ms_per_query": chroma_time * 1000,
+        "numpy_ms_per_query": numpy_time * 1000,
+    }
+    log.info(
+        f"Recall@{k} (NumPy vs Chroma): {recall:.3f} | "
+        f"Chroma: {report['chroma_ms_per_query']:.2f} ms/sorgu, "
+        f"NumPy: {report['numpy_ms_per_query']:.2f} ms/sorgu ({len(queries)} sorgu)"
+    )
+    return report
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="NumPy vektör index'i araçları.")
+    parser.add_argument("--build", action="store_true", help="Chroma'dan NumPy index'ini yeniden oluşturur.")
+    parser.add_argument("--recall", action="store_true", help="NumPy sonuçlarını Chroma ile karşılaştırır.")
+    parser.add_argument("--k", type=int, default=RETRIEVER_K)
+    args = parser.parse_args()
+
+    if args.build:
+        # Etkin index sürümünün Chroma verisinden, aynı sürüm klasörüne
+        from src.index_versions import active_index
+        active = active_index()
+        build_numpy_index(active["chroma_path"], active["numpy_path"])
+    if args.recall:
+        print(json.dumps(evaluate_recall(k=args.k), indent=2))
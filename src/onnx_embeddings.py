@@ -0,0 +1,390 @@
+# src/onnx_embeddings.py
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.config import (
+    EMBEDDING_MODEL_NAME,
+    ONNX_MODEL_PATH,
+    ONNX_QUANTIZE,
+    ONNX_BATCH_SIZE,
+    ONNX_NUM_THREADS,
+    RETRIEVER_K
+)
+
+log = logging.getLogger("onnx_embeddings")
+
+_FP32_FILENAME = "model.onnx"
+_INT8_FILENAME = "model.int8.onnx"
+_TOKENIZER_FILENAME = "tokenizer.json"
+_META_FILENAME = "meta.json"
+_TUNING_FILENAME = "tuning.json"
+
+# Otomatik ayar (tuning) sırasında denenen batch boyutları
+_TUNING_BATCH_SIZES = (8, 16, 32, 64, 128)
+# Tuning dosyası yoksa ve config'de değer verilmemişse kullanılan batch boyutu
+_DEFAULT_BATCH_SIZE = 32
+
+def _variant(quantized: bool) -> str:
+    return "int8" if quantized else "fp32"
+
+def _model_file(model_dir: str, quantized: bool) -> str:
+    return os.path.join(model_dir, _INT8_FILENAME if quantized else _FP32_FILENAME)
+
+def _read_json(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _thread_candidates() -> List[int]:
+    cpus = os.cpu_count() or 1
+    return sorted({1, 2, 4, max(1, cpus // 2), cpus} & set(range(1, cpus + 1)))
+
+# =================================================================
+# 1. ONNX'E AKTARMA VE INT8 QUANTIZATION
+# =================================================================
+
+def export_onnx_model(model_name: str = EMBEDDING_MODEL_NAME, model_dir: str = ONNX_MODEL_PATH):
+    """
+    Sentence-Transformers modelinin transformer gövdesini ONNX'e aktarır ve
+    int8 dinamik quantize edilmiş kopyasını üretir. Pooling (mean/CLS) ve
+    normalizasyon ONNX Runtime tarafında NumPy ile yapılır.
+    Dosyalar geçici bir klasörde oluşturulup yerine taşınır.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    log.info(f"'{model_name}' modeli ONNX'e aktarılıyor...")
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    if not getattr(tokenizer, "is_fast", False):
+        raise ValueError(f"'{model_name}' için hızlı (tokenizers tabanlı) tokenizer bulunamadı.")
+    pooling = "cls" if getattr(model[1], "pooling_mode_cls_token", False) else "mean"
+
+    class _Encoder(torch.nn.Module):
+        """Sadece last_hidden_state döndüren ince sarmalayıcı."""
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, input_ids, attention_mask):
+            return self.inner(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    tmp_dir = model_dir.rstrip("/\\") + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    tokenizer.save_pretrained(tmp_dir) # tokenizer.json çalışma zamanında 'tokenizers' ile okunur
+    sample = tokenizer(["Kredi kartı aidatı iadesi", "Müşteri şikayeti"], return_tensors="pt", padding=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(transformer),
+            (sample["input_ids"], sample["attention_mask"]),
+            os.path.join(tmp_dir, _FP32_FILENAME),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=17,
+            dynamo=False
+        )
+
+    quantize_dynamic(
+        os.path.join(tmp_dir, _FP32_FILENAME),
+        os.path.join(tmp_dir, _INT8_FILENAME),
+        weight_type=QuantType.QInt8
+    )
+
+    meta = {
+        "model_name": model_name,
+        "max_seq_length": int(model.max_seq_length),
+        "pad_token_id": int(tokenizer.pad_token_id),
+        "pooling": pooling,
+        "dimension": int(transformer.config.hidden_size),
+    }
+    with open(os.path.join(tmp_dir, _META_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    if os.path.exists(model_dir):
+        shutil.rmtree(model_dir)
+    os.replace(tmp_dir, model_dir)
+
+    sizes = {name: os.path.getsize(os.path.join(model_dir, name)) / 1024 ** 2 for name in (_FP32_FILENAME, _INT8_FILENAME)}
+    log.info(
+        f"ONNX modeli '{model_dir}' adresine kaydedildi "
+        f"(fp32: {sizes[_FP32_FILENAME]:.1f} MB, int8: {sizes[_INT8_FILENAME]:.1f} MB)."
+    )
+    return meta
+
+# =================================================================
+# 2. ONNX RUNTIME EMBEDDINGS
+# =================================================================
+
+def _create_session(model_path: str, num_threads: Optional[int]):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+    return ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+class OnnxEmbeddings(Embeddings):
+    """
+    ONNX Runtime ile çalışan, HuggingFaceEmbeddings ile aynı (normalize)
+    vektörleri üreten embedding modeli. Metinler token uzunluğuna göre
+    sıralanıp batch'lenir; böylece padding ve gereksiz hesaplama azalır.
+    Batch boyutu ve thread sayısı verilmezse tuning.json'dan okunur.
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_PATH, quantized: bool = ONNX_QUANTIZE,
+                 batch_size: Optional[int] = None, num_threads: Optional[int] = None):
+        from tokenizers import Tokenizer
+
+        meta = _read_json(os.path.join(model_dir, _META_FILENAME))
+        if not meta:
+            raise FileNotFoundError(
+                f"'{model_dir}' altında ONNX modeli bulunamadı. "
+                "Önce 'python -m src.onnx_embeddings --export' çalıştırın."
+            )
+        tuning = _read_json(os.path.join(model_dir, _TUNING_FILENAME)).get(_variant(quantized), {})
+
+        self.model_dir = model_dir
+        self.quantized = quantized
+        self.pooling = meta["pooling"]
+        self.pad_token_id = meta["pad_token_id"]
+        self.batch_size = batch_size or ONNX_BATCH_SIZE or tuning.get("batch_size") or _DEFAULT_BATCH_SIZE
+        self.num_threads = num_threads or ONNX_NUM_THREADS or tuning.get("num_threads")
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, _TOKENIZER_FILENAME))
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(max_length=meta["max_seq_length"])
+        self.session = _create_session(_model_file(model_dir, quantized), self.num_threads)
+        log.info(
+            f"ONNX embedding modeli yüklendi ({_variant(quantized)}, batch: {self.batch_size}, "
+            f"thread: {self.num_threads or 'varsayılan'})."
+        )
+
+    def _encode_batch(self, encodings) -> np.ndarray:
+        length = max(len(e.ids) for e in encodings)
+        input_ids = np.full((len(encodings), length), self.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(encodings), length), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, :len(encoding.ids)] = encoding.ids
+            attention_mask[row, :len(encoding.ids)] = 1
+
+        hidden = self.session.run(None, {"input_ids": input_ids, "attention_mask": attention_mask})[0]
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        else:
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (pooled / norms).astype(np.float32)
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """Metinlerin normalize embedding matrisini (girdi sırasıyla) döndürür."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        encodings = self.tokenizer.encode_batch(list(texts))
+        order = np.argsort([len(e.ids) for e in encodings], kind="stable")
+        result = None
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            vectors = self._encode_batch([encodings[i] for i in rows])
+            if result is None:
+                result = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            result[rows] = vectors
+        return result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+# =================================================================
+# 3. OTOMATİK AYAR (BATCH BOYUTU + THREAD SAYISI)
+# =================================================================
+
+def _corpus_texts(sample_size: int, seed: int = 0) -> List[str]:
+    """Ölçümler için mevzuat korpusundan (NumPy index'i ya da Chroma) örnek chunk metinleri."""
+    from src.index_versions import active_index
+
+    active = active_index()
+    documents_path = os.path.join(active["numpy_path"], "documents.jsonl")
+    if os.path.exists(documents_path):
+        with open(documents_path, "r", encoding="utf-8") as f:
+            texts = [json.loads(line)["text"] for line in f]
+    else:
+        import chromadb
+        collection = chromadb.PersistentClient(path=active["chroma_path"]).get_collection("langchain")
+        texts = collection.get(include=["documents"], limit=max(sample_size * 4, 1000))["documents"]
+    if not texts:
+        raise ValueError("Ölçüm için korpus bulunamadı. Önce vektör veritabanını oluşturun.")
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(texts), size=min(sample_size, len(texts)), replace=False)
+    return [texts[int(r)] for r in rows]
+
+def _throughput(embeddings, texts: List[str], rounds: int = 2) -> float:
+    """Saniyede embedding'i çıkarılan metin sayısı (rounds içindeki en iyi ölçüm)."""
+    embeddings.embed_array(texts[:embeddings.batch_size]) # ısınma
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        embeddings.embed_array(texts)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(texts) / best
+
+def tune(model_dir: str = ONNX_MODEL_PATH, quantized: bool = ONNX_QUANTIZE,
+         texts: List[str] = None, sample_size: int = 256) -> dict:
+    """
+    Thread sayısı ve batch boyutu kombinasyonlarını korpus örneği üzerinde
+    dener; en yüksek throughput'u veren ayarı tuning.json'a yazar.
+    """
+    texts = texts or _corpus_texts(sample_size)
+    grid = []
+    for num_threads in _thread_candidates():
+        embeddings = OnnxEmbeddings(model_dir, quantized, batch_size=_TUNING_BATCH_SIZES[0], num_threads=num_threads)
+        for batch_size in _TUNING_BATCH_SIZES:
+            embeddings.batch_size = batch_size
+            rate = _throughput(embeddings, texts)
+            grid.append({"num_threads": num_threads, "batch_size": batch_size, "texts_per_second": round(rate, 1)})
+            log.info(f"Tuning ({_variant(quantized)}): {num_threads} thread, batch {batch_size} -> {rate:.1f} metin/sn")
+
+    best = max(grid, key=lambda g: g["texts_per_second"])
+    tuning_path = os.path.join(model_dir, _TUNING_FILENAME)
+    tuning = _read_json(tuning_path)
+    tuning[_variant(quantized)] = {**best, "sample_size": len(texts), "grid": grid}
+    with open(tuning_path, "w", encoding="utf-8") as f:
+        json.dump(tuning, f, indent=2)
+    log.info(
+        f"En iyi ayar ({_variant(quantized)}): {best['num_threads']} thread, batch {best['batch_size']} "
+        f"({best['texts_per_second']} metin/sn). '{tuning_path}' dosyasına kaydedildi."
+    )
+    return tuning[_variant(quantized)]
+
+# =================================================================
+# 4. FP32 MODELE KARŞI HIZ VE RETRIEVAL ÖRTÜŞMESİ KONTROLÜ
+# =================================================================
+
+def _sample_queries(texts: List[str], count: int, seed: int = 1, words: int = 30) -> List[str]:
+    """Chunk'ların rastgele bir bölümünden kısmi eşleşen (tam kopya olmayan) sorgular üretir."""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for row in rng.choice(len(texts), size=min(count, len(texts)), replace=False):
+        tokens = texts[int(row)].split()
+        start = int(rng.integers(0, max(1, len(tokens) - words)))
+        queries.append(" ".join(tokens[start:start + words]))
+    return queries
+
+def _top_k(query_matrix: np.ndarray, corpus_matrix: np.ndarray, k: int) -> List[set]:
+    scores = query_matrix @ corpus_matrix.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+def _overlap(expected: List[set], got: List[set], k: int) -> float:
+    return float(np.mean([len(e & g) / k for e, g in zip(expected, got)]))
+
+def compare_with_fp32(model_dir: str = ONNX_MODEL_PATH, quantized: bool = ONNX_QUANTIZE,
+                      sample_size: int = 1000, query_count: int = 200, k: int = RETRIEVER_K) -> dict:
+    """
+    Korpus örneği üzerinde PyTorch fp32 modeli ile ONNX modelini karşılaştırır:
+    - embedding hızı (metin/sn) ve hızlanma oranı,
+    - aynı metinler için vektörler arası ortalama kosinüs benzerliği,
+    - overlap@k: her iki modelin (sorgu + korpus) ilk k sonuçlarının kesişimi,
+    - mixed overlap@k: fp32 ile oluşturulmuş index'e ONNX sorgularıyla arama.
+    """
+    from src.embedding_cache import create_torch_embeddings
+
+    texts = _corpus_texts(sample_size)
+    queries = _sample_queries(texts, query_count)
+    k = min(k, len(texts))
+
+    reference = create_torch_embeddings()
+    candidate = OnnxEmbeddings(model_dir, quantized)
+
+    reference.embed_documents(texts[:8]) # ısınma
+    start = time.perf_counter()
+    reference_corpus = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    reference_seconds = time.perf_counter() - start
+    reference_queries = np.asarray(reference.embed_documents(queries), dtype=np.float32)
+
+    candidate.embed_array(texts[:8])
+    start = time.perf_counter()
+    candidate_corpus = candidate.embed_array(texts)
+    candidate_seconds = time.perf_counter() - start
+    candidate_queries = candidate.embed_array(queries)
+
+    start = time.perf_counter()
+    for query in queries:
+        reference.embed_query(query)
+    reference_query_ms = (time.perf_counter() - start) / len(queries) * 1000
+    start = time.perf_counter()
+    for query in queries:
+        candidate.embed_query(query)
+    candidate_query_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+    expected = _top_k(reference_queries, reference_corpus, k)
+    report = {
+        "variant": _variant(quantized),
+        "corpus_sample": len(texts),
+        "queries": len(queries),
+        "k": k,
+        "fp32_texts_per_second": round(len(texts) / reference_seconds, 1),
+        "onnx_texts_per_second": round(len(texts) / candidate_seconds, 1),
+        "speedup": round(reference_seconds / candidate_seconds, 2),
+        "fp32_ms_per_query": round(reference_query_ms, 2),
+        "onnx_ms_per_query": round(candidate_query_ms, 2),
+        "mean_cosine": round(float(np.mean(np.sum(reference_corpus * candidate_corpus, axis=1))), 4),
+        "overlap_at_k": round(_overlap(expected, _top_k(candidate_queries, candidate_corpus, k), k), 4),
+        "mixed_overlap_at_k": round(_overlap(expected, _top_k(candidate_queries, reference_corpus, k), k), 4),
+    }
+    log.info(
+        f"ONNX {report['variant']} vs PyTorch fp32: {report['speedup']}x hızlanma "
+        f"({report['onnx_texts_per_second']} / {report['fp32_texts_per_second']} metin/sn), "
+        f"overlap@{k}: {report['overlap_at_k']:.3f}, karışık overlap@{k}: {report['mixed_overlap_at_k']:.3f}, "
+        f"ortalama kosinüs: {report['mean_cosine']:.4f}"
+    )
+    return report
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="ONNX (int8) embedding backend araçları.")
+    parser.add_argument("--export", action="store_true", help="Modeli ONNX'e aktarır ve int8 quantize eder.")
+    parser.add_argument("--tune", action="store_true", help="Batch boyutu ve thread sayısını ölçüp kaydeder.")
+    parser.add_argument("--check", action="store_true", help="Hız ve retrieval örtüşmesini fp32 modelle karşılaştırır.")
+    parser.add_argument("--fp32", action="store_true", help="Quantize edilmemiş ONNX modelini kullan.")
+    parser.add_argument("--model-dir", default=ONNX_MODEL_PATH)
+    parser.add_argument("--sample-size", type=int, default=1000, help="Kontrolde kullanılan korpus örneği")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=RETRIEVER_K)
+    args = parser.parse_args()
+
+    quantized = ONNX_QUANTIZE and not args.fp32
+    if args.export:
+        export_onnx_model(model_dir=args.model_dir)
+    if args.tune:
+        tune(args.model_dir, quantized)
+    if args.check:
+        print(json.dumps(
+            compare_with_fp32(args.model_dir, quantized, args.sample_size, args.queries, args.k),
+            indent=2
+        ))
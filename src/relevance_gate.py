@@ -0,0 +1,260 @@
+# src/relevance_gate.py
+import os
+import re
+import json
+import logging
+import argparse
+from typing import List, Optional
+
+import numpy as np
+
+from src.config import (
+    RELEVANCE_GATE_THRESHOLD,
+    RELEVANCE_KEYWORD_BONUS,
+    RELEVANCE_TOPIC_COUNT,
+    RELEVANCE_CENTROIDS_PATH
+)
+from src.numpy_index import _normalize_rows
+from src.retrieval import retriever_embeddings
+
+log = logging.getLogger("relevance_gate")
+
+# Konu merkezleri (centroid) hesaplanırken index'ten örneklenen en fazla vektör sayısı
+_CENTROID_SAMPLE_SIZE = 20000
+_CHROMA_PAGE_SIZE = 1000
+_KMEANS_ITERATIONS = 25
+# Skora katkı veren en fazla anahtar kelime eşleşmesi
+_MAX_KEYWORD_HITS = 2
+
+# Bankacılık / BDDK mevzuatıyla ilgili Türkçe kelime kökleri. Ekler (kredisi, faizi,
+# kartımın...) için kelime başından önek olarak eşleşir. Kimlik doğrulama ifadeleri
+# (doğum tarihi, TC kimlik no) bilerek listede yoktur.
+BANKING_LEXICON = (
+    "kredi", "faiz", "kart", "aidat", "taksit", "vade", "borç", "borc", "yapılandır",
+    "mevduat", "havale", "eft", "swift", "komisyon", "ücret", "masraf", "sigorta",
+    "ipotek", "konut", "taşıt", "temerrüt", "gecikme", "limit", "nakit avans", "ekstre",
+    "asgari", "iade", "itiraz", "şikayet", "kkdf", "bsmv", "sözleşme", "cayma",
+    "erken kapa", "erken öde", "ara öde", "kefil", "teminat", "haciz", "icra",
+    "yasal takip", "bddk", "tüketici", "döviz", "repo", "yatırım", "vadeli", "vadesiz",
+    "bloke", "blokaj", "kesinti", "hesap işletim", "kredi notu", "findeks", "kvkk",
+    "kişisel veri", "dolandırıcılık", "izinsiz işlem", "chargeback",
+)
+
+def normalize_turkish(text: str) -> str:
+    """Türkçe büyük/küçük harf dönüşümü ('İ' -> 'i', 'I' -> 'ı') ve boşluk sadeleştirme."""
+    text = (text or "").replace("İ", "i").replace("I", "ı").lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+_LEXICON_PATTERN = re.compile(
+    r"(?<!\w)(" + "|".join(re.escape(word) for word in sorted(BANKING_LEXICON, key=len, reverse=True)) + r")"
+)
+
+def find_keywords(text: str) -> List[str]:
+    """Metinde geçen (tekrarsız) bankacılık anahtar kelimelerini döndürür."""
+    return sorted(set(_LEXICON_PATTERN.findall(normalize_turkish(text))))
+
+# =================================================================
+# 1. BDDK INDEX'İNDEN KONU MERKEZLERİ (CENTROID)
+# =================================================================
+
+def index_vectors(retriever, sample_size: int = _CENTROID_SAMPLE_SIZE, seed: int = 0) -> np.ndarray:
+    """Retriever'ın vektör index'inden (NumPy memmap ya da Chroma) örnek vektörler okur."""
+    index = getattr(retriever, "index", None)
+    if index is not None:
+        total = len(index)
+        rows = np.arange(total)
+        if total > sample_size:
+            rows = np.sort(np.random.default_rng(seed).choice(total, size=sample_size, replace=False))
+        return np.asarray(index.matrix[rows], dtype=np.float32)
+
+    collection = retriever.vectorstore._collection
+    total = collection.count()
+    pages = max(1, min(-(-sample_size // _CHROMA_PAGE_SIZE), -(-total // _CHROMA_PAGE_SIZE)))
+    # Sayfalar index'e eşit aralıklarla yayılır
+    offsets = np.unique(np.linspace(0, max(0, total - _CHROMA_PAGE_SIZE), pages).astype(int))
+    vectors = []
+    for offset in offsets:
+        page = collection.get(include=["embeddings"], limit=_CHROMA_PAGE_SIZE, offset=int(offset))
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+    return np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+def index_size(retriever) -> int:
+    index = getattr(retriever, "index", None)
+    return len(index) if index is not None else retriever.vectorstore._collection.count()
+
+def build_topic_centroids(vectors: np.ndarray, topics: int = RELEVANCE_TOPIC_COUNT,
+                          iterations: int = _KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Kosinüs (küresel) k-means ile normalize konu merkezleri hesaplar (k-means++ başlangıcı)."""
+    vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+    if len(vectors) == 0:
+        raise ValueError("Konu merkezleri için index'te vektör bulunamadı.")
+    topics = min(topics, len(vectors))
+    rng = np.random.default_rng(seed)
+
+    chosen = [int(rng.integers(len(vectors)))]
+    distance = 1.0 - vectors @ vectors[chosen[0]]
+    for _ in range(1, topics):
+        weights = np.clip(distance, 0, None)
+        total = weights.sum()
+        row = int(rng.choice(len(vectors), p=weights / total)) if total > 0 else int(rng.integers(len(vectors)))
+        chosen.append(row)
+        distance = np.minimum(distance, 1.0 - vectors @ vectors[row])
+    centroids = vectors[chosen]
+
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        updated = np.zeros_like(centroids)
+        np.add.at(updated, assignment, vectors)
+        empty = ~updated.any(axis=1)
+        updated[empty] = centroids[empty]
+        updated = _normalize_rows(updated)
+        converged = np.allclose(updated, centroids, atol=1e-5)
+        centroids = updated
+        if converged:
+            break
+    return centroids
+
+def load_or_build_centroids(retriever, model_id: str, path: Optional[str] = RELEVANCE_CENTROIDS_PATH,
+                            rebuild: bool = False) -> np.ndarray:
+    """
+    Kayıtlı konu merkezlerini yükler. Dosya yoksa ya da embedding modeli veya
+    index boyutu değişmişse index'ten yeniden hesaplayıp kaydeder (path=None: kaydetmez).
+    """
+    fingerprint = f"{model_id}|{index_size(retriever)}|{RELEVANCE_TOPIC_COUNT}"
+    if path and not rebuild and os.path.exists(path):
+        with np.load(path) as data:
+            if str(data["fingerprint"]) == fingerprint:
+                return data["centroids"]
+        log.info("Index veya embedding modeli değişmiş; konu merkezleri yeniden hesaplanıyor.")
+
+    centroids = build_topic_centroids(index_vectors(retriever))
+    if path:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, centroids=centroids, fingerprint=np.array(fingerprint))
+        os.replace(tmp_path, path)
+    log.info(f"{len(centroids)} konu merkezi hesaplandı{f' ve {path} dosyasına kaydedildi' if path else ''}.")
+    return centroids
+
+# =================================================================
+# 2. SEGMENT İLGİLİLİK FİLTRESİ
+# =================================================================
+
+class RelevanceGate:
+    """
+    Segmentleri LLM'e gitmeden önce yerel olarak puanlar:
+    skor = en yakın konu merkezine kosinüs benzerliği
+           + keyword_bonus * min(eşleşen anahtar kelime, 2).
+    Skoru eşiğin altında kalan segmentler ilgisiz sayılır.
+    """
+
+    def __init__(self, embeddings, centroids: np.ndarray,
+                 threshold: float = RELEVANCE_GATE_THRESHOLD,
+                 keyword_bonus: float = RELEVANCE_KEYWORD_BONUS):
+        self.embeddings = embeddings
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.threshold = threshold
+        self.keyword_bonus = keyword_bonus
+
+    def score_texts(self, texts: List[str]) -> List[dict]:
+        if not texts:
+            return []
+        vectors = _normalize_rows(np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32))
+        similarities = (vectors @ self.centroids.T).max(axis=1)
+        scored = []
+        for text, similarity in zip(texts, similarities):
+            keywords = find_keywords(text)
+            score = float(similarity) + self.keyword_bonus * min(len(keywords), _MAX_KEYWORD_HITS)
+            scored.append({
+                "score": round(score, 4),
+                "similarity": round(float(similarity), 4),
+                "keywords": keywords,
+                "relevant": score >= self.threshold,
+            })
+        return scored
+
+    def evaluate(self, segments) -> List[dict]:
+        """Segment (customer_query, agent_response) listesini tek embedding çağrısıyla puanlar."""
+        return self.score_texts([f"{s.customer_query}\n{s.agent_response}" for s in segments])
+
+def create_relevance_gate(retriever, centroids_path: Optional[str] = RELEVANCE_CENTROIDS_PATH,
+                          model_id: Optional[str] = None) -> RelevanceGate:
+    """Retriever'ın (zaten yüklü) embedding modeli ve index'i ile filtreyi oluşturur."""
+    from src.embedding_cache import embedding_model_id
+
+    embeddings = retriever_embeddings(retriever)
+    if embeddings is None:
+        raise ValueError("Retriever'dan embedding modeli alınamadı.")
+    centroids = load_or_build_centroids(retriever, model_id or embedding_model_id(), centroids_path)
+    return RelevanceGate(embeddings, centroids)
+
+# =================================================================
+# 3. EŞİK AYARI (GEÇMİŞ SONUÇLAR ÜZERİNDE)
+# =================================================================
+
+def evaluate_thresholds(thresholds: List[float] = None, limit: int = 5000) -> dict:
+    """
+    Daha önce LLM ile analiz edilmiş segmentleri puanlar ve her eşik için:
+    atlanacak segment oranını, kaçınılacak LLM çağrısı sayısını ve ihlal/eksiklik
+    bulunmuş olduğu halde atlanacak (kaçırılacak) segment sayısını raporlar.
+    """
+    from sqlalchemy import select
+    from src.models import SessionLocal, CallComplianceAnalysis
+    from src.compliance_chain import get_relevance_gate
+
+    thresholds = thresholds or [round(t, 2) for t in np.arange(0.1, 0.65, 0.05)]
+    with SessionLocal() as db_session:
+        rows = db_session.execute(
+            select(
+                CallComplianceAnalysis.customer_query,
+                CallComplianceAnalysis.agent_response,
+                CallComplianceAnalysis.violation_detected,
+                CallComplianceAnalysis.omission_detected
+            )
+            .where(CallComplianceAnalysis.skipped_reason.is_(None))
+            .order_by(CallComplianceAnalysis.id.desc())
+            .limit(limit)
+        ).all()
+    if not rows:
+        raise ValueError("Eşik ayarı için analiz edilmiş segment bulunamadı.")
+
+    gate = get_relevance_gate()
+    scores = np.array([s["score"] for s in gate.score_texts([f"{q}\n{a}" for q, a, _, _ in rows])])
+    flagged = np.array([bool(v) or bool(o) for _, _, v, o in rows])
+
+    report = {"segments": len(rows), "flagged_segments": int(flagged.sum()), "thresholds": []}
+    for threshold in thresholds:
+        skipped = scores < threshold
+        entry = {
+            "threshold": threshold,
+            "skipped_ratio": round(float(skipped.mean()), 4),
+            "llm_calls_avoided": int(skipped.sum()) * 2,
+            "flagged_segments_skipped": int((skipped & flagged).sum()),
+        }
+        report["thresholds"].append(entry)
+        log.info(
+            f"Eşik {threshold:.2f}: %{entry['skipped_ratio'] * 100:.1f} segment atlanır, "
+            f"{entry['llm_calls_avoided']} LLM çağrısı önlenir, "
+            f"{entry['flagged_segments_skipped']} bulgulu segment kaçırılır."
+        )
+    return report
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Yerel ilgililik filtresi araçları.")
+    parser.add_argument("--build", action="store_true", help="Konu merkezlerini index'ten yeniden hesaplar.")
+    parser.add_argument("--evaluate", action="store_true", help="Eşikleri geçmiş analiz sonuçları üzerinde değerlendirir.")
+    parser.add_argument("--score", help="Verilen metnin ilgililik skorunu yazdırır.")
+    args = parser.parse_args()
+
+    if args.build:
+        from src.compliance_chain import get_retrieval_batcher
+        from src.embedding_cache import embedding_model_id
+        load_or_build_centroids(get_retrieval_batcher().retriever, embedding_model_id(), rebuild=True)
+    if args.score:
+        from src.compliance_chain import get_relevance_gate
+        print(json.dumps(get_relevance_gate().score_texts([args.score])[0], ensure_ascii=False, indent=2))
+    if args.evaluate:
+        print(json.dumps(evaluate_thresholds(), indent=2))
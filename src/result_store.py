@@ -0,0 +1,129 @@
+# src/result_store.py
+import json
+import logging
+from typing import List, Tuple
+
+from sqlalchemy import insert, select
+
+from src.models import CallComplianceAnalysis, RegulationChunk, AnalysisChunk, CallMetrics, insert_ignore
+
+log = logging.getLogger("result_store")
+
+# 'compliance_analysis_output' tablosuna doğrudan yazılan segment alanları
+_ANALYSIS_FIELDS = (
+    "segment_index",
+    "customer_query",
+    "agent_response",
+    "search_query",
+    "context_tokens",
+    "context_tokens_saved",
+    "index_version",
+    "violation_detected",
+    "omission_detected",
+    "analysis",
+    "suggestion",
+    "relevance_score",
+    "skipped_reason"
+)
+
+# =================================================================
+# 1. TOPLU (BULK) SONUÇ YAZIMI
+# =================================================================
+
+def save_analysis_results(db_session, results_by_call: List[Tuple[int, List[dict]]]) -> int:
+    """
+    Birden fazla çağrının segment sonuçlarını üç toplu INSERT ile yazar:
+    - Kullanılan mevzuat parçaları 'regulation_chunks' tablosuna (var olanlar atlanır),
+    - Analiz satırları 'compliance_analysis_output' tablosuna,
+    - Satır -> parça bağlantıları (sıra ve skor ile) 'analysis_chunks' tablosuna.
+    Mevzuat metni artık her satırda tekrar saklanmaz. Commit işlemi çağırana aittir.
+    Yazılan analiz satırı sayısını döndürür.
+    """
+    chunk_rows = {}
+    analysis_rows = []
+    chunk_refs = []
+    for call_pk, segments in results_by_call:
+        for segment_data in segments:
+            analysis_rows.append({"input_call_id": call_pk, **{f: segment_data.get(f) for f in _ANALYSIS_FIELDS}})
+            refs = []
+            for rank, chunk in enumerate(segment_data.get("rag_chunks") or []):
+                chunk_rows.setdefault(chunk["chunk_id"], {
+                    "id": chunk["chunk_id"],
+                    "content": chunk["content"],
+                    "source": chunk.get("source"),
+                    "page": chunk.get("page")
+                })
+                refs.append((chunk["chunk_id"], rank, chunk.get("score")))
+            chunk_refs.append(refs)
+
+    if not analysis_rows:
+        return 0
+
+    if chunk_rows:
+        db_session.execute(insert_ignore(RegulationChunk), list(chunk_rows.values()))
+
+    # RETURNING ile üretilen id'ler girdi sırasıyla döner (sort_by_parameter_order)
+    analysis_ids = db_session.scalars(
+        insert(CallComplianceAnalysis).returning(CallComplianceAnalysis.id, sort_by_parameter_order=True),
+        analysis_rows
+    ).all()
+
+    links = [
+        {"analysis_id": analysis_id, "chunk_id": chunk_id, "rank": rank, "score": score}
+        for analysis_id, refs in zip(analysis_ids, chunk_refs)
+        for chunk_id, rank, score in refs
+    ]
+    if links:
+        # Aynı segmentte aynı parça iki kez dönmüşse ilk (en yüksek sıralı) kayıt kalır
+        db_session.execute(insert_ignore(AnalysisChunk), links)
+
+    return len(analysis_rows)
+
+def save_call_metrics(db_session, metrics_by_call: List[Tuple[int, str, object]]) -> int:
+    """
+    Çağrı izlerini (src.metrics.CallTrace) 'call_metrics' tablosuna tek toplu
+    INSERT ile yazar. metrics_by_call: [(call_pk, durum, iz)]. Commit çağırana aittir.
+    """
+    rows = []
+    for call_pk, status, trace in metrics_by_call:
+        if trace is None:
+            continue
+        summary = trace.summary()
+        rows.append({
+            "input_call_id": call_pk,
+            "status": status,
+            "total_seconds": summary["total_seconds"],
+            "segments": summary["segments"],
+            "segments_skipped": summary["segments_skipped"],
+            "prompt_tokens": summary["prompt_tokens"],
+            "completion_tokens": summary["completion_tokens"],
+            "llm_cache_hits": summary["llm_cache_hits"],
+            "llm_cache_misses": summary["llm_cache_misses"],
+            "stage_seconds": json.dumps(summary["stage_seconds"]),
+            "spans": json.dumps(trace.spans, ensure_ascii=False),
+        })
+    if rows:
+        db_session.execute(insert(CallMetrics), rows)
+    return len(rows)
+
+# =================================================================
+# 2. OKUMA YARDIMCISI
+# =================================================================
+
+def load_rag_context(db_session, analysis_id: int) -> str:
+    """
+    Bir analiz satırında kullanılan mevzuat metnini, parçaları sıralarına göre
+    birleştirerek (eski 'rag_context' formatında) geri oluşturur.
+    """
+    contents = db_session.scalars(
+        select(RegulationChunk.content)
+        .join(AnalysisChunk, AnalysisChunk.chunk_id == RegulationChunk.id)
+        .where(AnalysisChunk.analysis_id == analysis_id)
+        .order_by(AnalysisChunk.rank)
+    ).all()
+    if contents:
+        return "\n---\n".join(contents)
+    legacy = db_session.scalar(
+        select(CallComplianceAnalysis.rag_context).where(CallComplianceAnalysis.id == analysis_id)
+    )
+    return legacy or ""
@@ -0,0 +1,215 @@
+# src/retrieval.py
+import json
+import time
+import asyncio
+import logging
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+from src.models import chunk_hash
+from src.metrics import REGISTRY
+from src.config import RETRIEVER_K, RETRIEVAL_BATCH_WAIT_MS, RETRIEVAL_MAX_BATCH, RETRIEVAL_METADATA_FILTER
+
+log = logging.getLogger("retrieval")
+
+# =================================================================
+# 1. METADATA ÖN FİLTRESİ
+# =================================================================
+# Filtre formatı: {"alan": değer} veya {"alan": [değer1, değer2]}; birden fazla
+# alan verilirse hepsi sağlanmalıdır. Örn: {"regulation": "...", "article": "12"}
+
+def filter_key(where: Optional[dict]) -> str:
+    """Aynı filtreli sorguları gruplamak / önbelleklemek için kararlı anahtar."""
+    return json.dumps(where, sort_keys=True, ensure_ascii=False) if where else ""
+
+def matches_filter(metadata: dict, where: Optional[dict]) -> bool:
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, value in where.items():
+        allowed = value if isinstance(value, (list, tuple, set)) else [value]
+        if metadata.get(key) not in allowed:
+            return False
+    return True
+
+def to_chroma_where(where: Optional[dict]) -> Optional[dict]:
+    """Filtreyi Chroma'nın 'where' sözdizimine çevirir ($in, $and)."""
+    if not where:
+        return None
+    clauses = [
+        {key: {"$in": list(value)} if isinstance(value, (list, tuple, set)) else value}
+        for key, value in where.items()
+    ]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+# =================================================================
+# 2. ÇOKLU SORGU (BATCHED) ARAMA
+# =================================================================
+
+def search_many(retriever, queries: List[str], k: int = None, where: dict = None) -> List[List[Document]]:
+    """
+    Tüm sorguları tek bir embed_documents çağrısı ile vektörize eder ve
+    tek bir çoklu-sorgu top-k araması yapar. Her sorgu için Document listesi döner.
+    Dokümanların metadata'sına kosinüs benzerlik skoru ('score') eklenir.
+    where verilirse yalnızca metadata'sı filtreye uyan parçalar arasında aranır.
+    """
+    if not queries:
+        return []
+
+    # NumPy backend'i: tek matris çarpımı
+    if hasattr(retriever, "batch_search"):
+        return retriever.batch_search(queries, k, where=where)
+
+    # Chroma backend'i: tek collection.query çağrısı
+    vector_store = retriever.vectorstore
+    k = k or retriever.search_kwargs.get("k", RETRIEVER_K)
+    start = time.perf_counter()
+    vectors = vector_store.embeddings.embed_documents(queries)
+    REGISTRY.observe("compliance_stage_duration_seconds", time.perf_counter() - start, stage="embedding")
+    start = time.perf_counter()
+    query_kwargs = {"where": to_chroma_where(where)} if where else {}
+    result = vector_store._collection.query(
+        query_embeddings=vectors,
+        n_results=k,
+        include=["documents", "metadatas", "distances"],
+        **query_kwargs
+    )
+    REGISTRY.observe("compliance_stage_duration_seconds", time.perf_counter() - start, stage="vector_search")
+
+    all_docs = []
+    for ids, texts, metadatas, distances in zip(
+        result["ids"], result["documents"], result["metadatas"], result["distances"]
+    ):
+        docs = []
+        for cid, text, metadata, distance in zip(ids, texts, metadatas, distances):
+            metadata = dict(metadata or {})
+            # Normalize vektörlerde kare L2 mesafesi -> kosinüs benzerliği
+            metadata["score"] = 1.0 - float(distance) / 2.0
+            docs.append(Document(page_content=text, metadata=metadata, id=cid))
+        all_docs.append(docs)
+    return all_docs
+
+def retriever_embeddings(retriever):
+    """Retriever'ın kullandığı embedding modelini döndürür (NumPy: .embeddings, Chroma: vectorstore.embeddings)."""
+    embeddings = getattr(retriever, "embeddings", None)
+    if embeddings is None:
+        embeddings = getattr(getattr(retriever, "vectorstore", None), "embeddings", None)
+    return embeddings
+
+def chunk_reference(doc: Document) -> dict:
+    """
+    Bir retrieval sonucunu veritabanına yazılacak parça referansına çevirir.
+    Vektör deposunun kararlı chunk id'si yoksa id içerikten türetilir.
+    """
+    metadata = doc.metadata or {}
+    return {
+        "chunk_id": doc.id or chunk_hash(doc.page_content),
+        "content": doc.page_content,
+        "score": metadata.get("score"),
+        "source": metadata.get("source"),
+        "page": metadata.get("page")
+    }
+
+# =================================================================
+# 3. EŞZAMANLI İSTEKLERİ BİRLEŞTİREN RETRIEVAL BATCHER
+# =================================================================
+
+class RetrievalBatcher:
+    """
+    Aynı anda çalışan çağrılardan (örn: process_batch içindeki asyncio.gather)
+    gelen retrieval isteklerini kısa bir bekleme penceresinde toplayıp tek bir
+    search_many çağrısı ile çalıştırır. Böylece bir batch'teki tüm transkriptlerin
+    sorguları tek encode + tek vektör araması maliyetine iner.
+    k verilmezse retriever'ın kendi k değeri kullanılır. Farklı metadata filtreli
+    istekler aynı pencerede toplanır, filtre başına tek aramayla çalıştırılır.
+    index_version, retriever'ın okuduğu index sürümüdür (sonuçlara yazılır).
+    """
+
+    def __init__(self, retriever, max_wait_ms: int = RETRIEVAL_BATCH_WAIT_MS,
+                 max_batch: int = RETRIEVAL_MAX_BATCH, k: int = None,
+                 where: dict = RETRIEVAL_METADATA_FILTER, index_version: str = None):
+        self.retriever = retriever
+        self.k = k
+        self.where = where
+        self.index_version = index_version
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max_batch
+        self._pending = []
+        self._pending_count = 0
+        self._timer = None
+        self._tasks = set() # Çalışan arama görevlerinin çöp toplayıcıya gitmemesi için
+
+    async def retrieve_many(self, queries: List[str], where: dict = None) -> List[List[Document]]:
+        """where verilmezse batcher'ın varsayılan filtresi (RETRIEVAL_METADATA_FILTER) kullanılır."""
+        if not queries:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((queries, where if where is not None else self.where, future))
+        self._pending_count += len(queries)
+
+        if self._pending_count >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    async def retrieve_many_tolerant(self, queries: List[str], where: dict = None) -> List[Optional[List[Document]]]:
+        """
+        retrieve_many gibidir; ancak toplu arama başarısız olursa sorgular batcher'ı
+        atlayarak tek tek tekrar aranır. Yine başarısız olan sorgu için None döner:
+        çağıran yalnızca o segmenti atlar, çağrının geri kalanı işlenmeye devam eder.
+        """
+        try:
+            return await self.retrieve_many(queries, where)
+        except Exception as e:
+            log.error(f"Toplu RAG araması başarısız, sorgular tek tek deneniyor: {e}")
+
+        where = where if where is not None else self.where
+        results = []
+        for n, query in enumerate(queries):
+            try:
+                docs = await asyncio.to_thread(search_many, self.retriever, [query], self.k, where)
+                results.append(docs[0])
+            except Exception as e:
+                log.error(f"Sorgu {n+1}/{len(queries)} için RAG hatası, segment atlanıyor: {e}")
+                REGISTRY.inc("compliance_segments_total", outcome="retrieval_failed")
+                results.append(None)
+        return results
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_count = self._pending, [], 0
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        groups = {}
+        for entry in batch:
+            groups.setdefault(filter_key(entry[1]), []).append(entry)
+        for group in groups.values():
+            await self._run_group(group)
+
+    async def _run_group(self, batch):
+        """Aynı filtreli isteklerin tüm sorgularını tek aramada çalıştırır."""
+        queries = [q for qs, _, _ in batch for q in qs]
+        where = batch[0][1]
+        try:
+            results = await asyncio.to_thread(search_many, self.retriever, queries, self.k, where)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        log.info(f"Toplu retrieval: {len(batch)} istek, {len(queries)} sorgu tek aramada işlendi.")
+        offset = 0
+        for qs, _, future in batch:
+            if not future.done():
+                future.set_result(results[offset:offset + len(qs)])
+            offset += len(qs)
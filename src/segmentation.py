@@ -0,0 +1,127 @@
+# src/segmentation.py
+import re
+import logging
+from difflib import SequenceMatcher
+from typing import List
+
+from src.config import (
+    SEGMENTATION_WINDOW_CHARS,
+    SEGMENTATION_WINDOW_OVERLAP_TURNS,
+    SEGMENTATION_DEDUP_SIMILARITY
+)
+
+log = logging.getLogger("segmentation")
+
+# "Müşteri: ...", "Temsilci: ...", "MT: ..." gibi konuşmacı etiketiyle başlayan satırlar
+_SPEAKER_LINE = re.compile(r"^\s*[^\W\d_][\w .-]{0,29}\s*:\s*\S")
+
+# İçerme (kesilmiş blok) kontrolü için kısa metinler ('Evet.' gibi) yeterli kanıt sayılmaz
+_MIN_CONTAINMENT_CHARS = 20
+
+# =================================================================
+# 1. KONUŞMA SIRALARINA (SPEAKER TURN) GÖRE PENCERELEME
+# =================================================================
+
+def split_turns(transcript: str) -> List[str]:
+    """
+    Transkripti konuşma sıralarına ayırır. Konuşmacı etiketi olmayan satırlar
+    bir önceki sıraya eklenir; hiç etiket yoksa her boş olmayan satır bir sıradır.
+    """
+    lines = [line for line in transcript.splitlines() if line.strip()]
+    if not any(_SPEAKER_LINE.match(line) for line in lines):
+        return lines
+    turns = []
+    for line in lines:
+        if _SPEAKER_LINE.match(line) or not turns:
+            turns.append(line)
+        else:
+            turns[-1] += "\n" + line
+    return turns
+
+def build_windows(turns: List[str], window_chars: int = SEGMENTATION_WINDOW_CHARS,
+                  overlap_turns: int = SEGMENTATION_WINDOW_OVERLAP_TURNS) -> List[str]:
+    """
+    Sıraları yaklaşık window_chars uzunluğunda pencerelere toplar. Her pencere
+    bir öncekinin son overlap_turns sırasıyla başlar; böylece pencere sınırına
+    denk gelen Soru-Cevap blokları en az bir pencerede bütün olarak görünür.
+    Bir sıra asla bölünmez.
+    """
+    windows = []
+    start = 0
+    while start < len(turns):
+        end = start
+        size = 0
+        while end < len(turns) and (end == start or size + len(turns[end]) <= window_chars):
+            size += len(turns[end]) + 1
+            end += 1
+        windows.append("\n".join(turns[start:end]))
+        if end >= len(turns):
+            break
+        # Çakışma payı pencerenin kendisinden büyükse bile en az bir sıra ilerlenir
+        start = max(start + 1, end - overlap_turns)
+    return windows
+
+# =================================================================
+# 2. ÇAKIŞMA BÖLGELERİNDEKİ TEKRAR EDEN SEGMENTLERİ BİRLEŞTİRME
+# =================================================================
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip().casefold()
+
+def _similarity(a: str, b: str) -> float:
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+    # Pencere sınırında kesilmiş bir blok, tam halinin içinde geçer
+    if min(len(a), len(b)) >= _MIN_CONTAINMENT_CHARS and (a in b or b in a):
+        return 1.0
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    return matcher.ratio() if matcher.quick_ratio() > 0 else 0.0
+
+def _segment_similarity(key: tuple, other: tuple, threshold: float) -> float:
+    """Soru ve cevap benzerliklerinin küçüğü; biri eşiğin altındaysa 0."""
+    query = _similarity(key[0], other[0])
+    if query < threshold:
+        return 0.0
+    response = _similarity(key[1], other[1])
+    return min(query, response) if response >= threshold else 0.0
+
+def merge_window_segments(window_segments: List[list],
+                          threshold: float = SEGMENTATION_DEDUP_SIMILARITY) -> list:
+    """
+    Pencere sırasıyla gelen segment listelerini tek listede birleştirir.
+    Tekrarlar yalnızca komşu pencerelerin çakışma bölgesinde oluşabileceği için
+    her segment bir önceki pencerenin segmentleriyle karşılaştırılır. Eşleştirme
+    bire birdir ve sırayı korur (bir önceki eşleşmeden sonraki segmentler aday
+    olur); adaylardan en benzeri seçilir. Eşleşen iki segmentten daha uzun
+    (daha eksiksiz) olanı ilk görüldüğü sırada tutulur.
+    """
+    merged = []
+    keys = []     # merged ile paralel: normalize (soru, cevap) çiftleri
+    previous = [] # Bir önceki pencerenin segmentlerinin 'merged' içindeki konumları
+    duplicates = 0
+    for segments in window_segments:
+        current = []
+        next_candidate = 0 # previous içinde aranabilecek ilk indeks
+        for segment in segments:
+            key = (_normalize(segment.customer_query), _normalize(segment.agent_response))
+            best, best_score = None, 0.0
+            for candidate in range(next_candidate, len(previous)):
+                score = _segment_similarity(key, keys[previous[candidate]], threshold)
+                if score > best_score:
+                    best, best_score = candidate, score
+            if best is None:
+                merged.append(segment)
+                keys.append(key)
+                current.append(len(merged) - 1)
+                continue
+            duplicates += 1
+            next_candidate = best + 1
+            position = previous[best]
+            if sum(map(len, key)) > sum(map(len, keys[position])):
+                merged[position] = segment
+                keys[position] = key
+            current.append(position)
+        previous = current
+    if duplicates:
+        log.info(f"Pencere çakışmalarından {duplicates} tekrar eden segment birleştirildi.")
+    return merged
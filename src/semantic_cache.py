@@ -0,0 +1,298 @@
+# src/semantic_cache.py
+import os
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import logging
+import argparse
+import threading
+from typing import List
+
+import numpy as np
+
+from src.config import (
+    SEMANTIC_CACHE_PATH,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_AUDIT_SAMPLE_RATE,
+    SEMANTIC_CACHE_REFRESH_SECONDS
+)
+from src.metrics import REGISTRY
+from src.numpy_index import _normalize_rows
+from src.embedding_cache import normalize_text
+
+log = logging.getLogger("semantic_cache")
+
+# Geçmiş sonuçlardan önbellek doldurulurken tek seferde vektörize edilen sorgu sayısı
+_SEED_BATCH_SIZE = 256
+
+# Önbellek metninin biçimi; değişirse eski biçimde saklanan kayıtlar kullanılmaz
+CACHE_TEXT_FORMAT = "dialog-v2"
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).casefold().encode("utf-8")).hexdigest()
+
+def dialog_text(customer_query: str, agent_response: str) -> str:
+    """
+    Önbellek anahtarı olan metin: sorgu zenginleştirme zinciri arama sorgusunu
+    müşteri sorusu ve temsilci cevabından birlikte ürettiği için ikisi de kullanılır.
+    Böylece "Peki ücreti ne kadar?" gibi kısa sorular başka bir konuşmanın sorgusunu almaz.
+    """
+    return f"{customer_query}\n{agent_response or ''}"
+
+# =================================================================
+# 1. EN YAKIN KOMŞU (SEGMENT EMBEDDING -> ARAMA SORGUSU) ÖNBELLEĞİ
+# =================================================================
+
+class SemanticQueryCache:
+    """
+    Müşteri sorusu + temsilci cevabının (dialog_text) embedding'i -> zenginleştirilmiş
+    arama sorgusu (search_query).
+    Kayıtlar SQLite'ta saklanır, aramalar bellekteki normalize vektör matrisi
+    üzerinde tek matris çarpımıyla yapılır. Kayıtlar embedding modeli ve sorgu
+    zenginleştirme prompt şablonu ile anahtarlanır; biri değişirse eski kayıtlar
+    kullanılmaz. Diğer süreçlerin eklediği kayıtlar periyodik olarak okunur.
+    """
+
+    def __init__(self, embeddings, model_id: str, template_hash: str,
+                 path: str = SEMANTIC_CACHE_PATH,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 audit_sample_rate: float = SEMANTIC_CACHE_AUDIT_SAMPLE_RATE):
+        self.embeddings = embeddings
+        self.model_id = model_id
+        # Metin biçimi de anahtara katılır; yalnızca müşteri sorusuyla saklanmış eski kayıtlar okunmaz
+        self.template_hash = f"{template_hash}:{CACHE_TEXT_FORMAT}"
+        self.threshold = threshold
+        self.audit_sample_rate = audit_sample_rate
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+        self._vectors = None # (kapasite x d) normalize vektörler; ilk _size satırı dolu
+        self._size = 0
+        self._queries = []   # search_query listesi (vektör satırlarıyla paralel)
+        self._texts = []     # Kaydın kaynağı olan konuşma metni (denetim için)
+        self._last_id = 0
+        self._last_refresh = 0.0
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                model TEXT NOT NULL,
+                template_hash TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                text TEXT NOT NULL,
+                search_query TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                source TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                UNIQUE (model, template_hash, text_hash)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS audit (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                decision TEXT NOT NULL,
+                similarity REAL,
+                text TEXT NOT NULL,
+                matched_text TEXT,
+                search_query TEXT
+            )
+        """)
+        self._conn.commit()
+        self.refresh(force=True)
+
+    def __len__(self):
+        return self._size
+
+    def _append(self, vectors: np.ndarray, queries: List[str], texts: List[str]):
+        """Bellekteki matrise satır ekler (kapasite gerektiğinde ikiye katlanır)."""
+        needed = self._size + len(vectors)
+        if self._vectors is None or needed > self._vectors.shape[0]:
+            capacity = max(needed, 2 * (self._vectors.shape[0] if self._vectors is not None else 512))
+            grown = np.zeros((capacity, vectors.shape[1]), dtype=np.float32)
+            if self._vectors is not None:
+                grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+        self._vectors[self._size:needed] = vectors
+        self._size = needed
+        self._queries.extend(queries)
+        self._texts.extend(texts)
+
+    def refresh(self, force: bool = False):
+        """Son okumadan sonra (bu veya başka bir süreçte) eklenen kayıtları belleğe alır."""
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_refresh < SEMANTIC_CACHE_REFRESH_SECONDS:
+                return
+            self._last_refresh = now
+            rows = self._conn.execute(
+                "SELECT id, text, search_query, vector FROM entries "
+                "WHERE model = ? AND template_hash = ? AND id > ? ORDER BY id",
+                (self.model_id, self.template_hash, self._last_id)
+            ).fetchall()
+            if not rows:
+                return
+            vectors = np.stack([np.frombuffer(row[3], dtype=np.float32) for row in rows])
+            self._append(vectors, [row[2] for row in rows], [row[1] for row in rows])
+            self._last_id = rows[-1][0]
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        return _normalize_rows(np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32))
+
+    def lookup_many(self, texts: List[str]) -> List[dict]:
+        """
+        Her metin için en yakın kaydı arar. Benzerlik eşiğin üzerindeyse
+        {'search_query', 'similarity', 'matched_text'}, değilse search_query=None döner.
+        """
+        if not texts:
+            return []
+        self.refresh()
+        vectors = self._embed(texts)
+        with self._lock:
+            if self._size:
+                scores = vectors @ self._vectors[:self._size].T
+                best = np.argmax(scores, axis=1)
+                similarities = scores[np.arange(len(texts)), best]
+            else:
+                best = similarities = None
+
+            decisions = []
+            for i, text in enumerate(texts):
+                similarity = float(similarities[i]) if similarities is not None else None
+                hit = similarity is not None and similarity >= self.threshold
+                decisions.append({
+                    "text": text,
+                    "search_query": self._queries[best[i]] if hit else None,
+                    "similarity": round(similarity, 4) if similarity is not None else None,
+                    "matched_text": self._texts[best[i]] if similarity is not None else None,
+                })
+
+        hits = sum(1 for d in decisions if d["search_query"] is not None)
+        self.hits += hits
+        self.misses += len(decisions) - hits
+        REGISTRY.inc("compliance_semantic_cache_requests_total", hits, result="hit")
+        REGISTRY.inc("compliance_semantic_cache_requests_total", len(decisions) - hits, result="miss")
+        if hits:
+            REGISTRY.inc("compliance_llm_calls_avoided_total", hits, reason="semantic_cache")
+        self._audit([d for d in decisions if self._random.random() < self.audit_sample_rate])
+        return decisions
+
+    def add_many(self, texts: List[str], search_queries: List[str], source: str = "llm") -> int:
+        """Yeni (konuşma metni -> arama sorgusu) kayıtlarını ekler; var olan metinler atlanır."""
+        pairs = [(t, q) for t, q in zip(texts, search_queries) if t and q]
+        if not pairs:
+            return 0
+        vectors = self._embed([t for t, _ in pairs])
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO entries "
+                "(model, template_hash, text_hash, text, search_query, vector, source, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (self.model_id, self.template_hash, _text_hash(t), t, q, vector.astype(np.float32).tobytes(), source, now)
+                    for (t, q), vector in zip(pairs, vectors)
+                ]
+            )
+            self._conn.commit()
+            added = cursor.rowcount
+        # Yeni kayıtlar (ve başka süreçlerin eklediği kayıtlar) id sırasıyla belleğe alınır
+        self.refresh(force=True)
+        return added
+
+    def _audit(self, decisions: List[dict]):
+        if not decisions:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO audit (created_at, decision, similarity, text, matched_text, search_query) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (now, "hit" if d["search_query"] is not None else "miss", d["similarity"],
+                     d["text"], d["matched_text"], d["search_query"])
+                    for d in decisions
+                ]
+            )
+            self._conn.commit()
+
+    def recent_audit(self, limit: int = 20) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT created_at, decision, similarity, text, matched_text, search_query "
+                "FROM audit ORDER BY id DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        keys = ("created_at", "decision", "similarity", "text", "matched_text", "search_query")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "threshold": self.threshold,
+        }
+
+# =================================================================
+# 2. GEÇMİŞ SONUÇLARDAN DOLDURMA (SEED)
+# =================================================================
+
+def seed_from_results(cache: SemanticQueryCache, limit: int = 50000) -> int:
+    """
+    Daha önce LLM ile zenginleştirilmiş sorguları ('compliance_analysis_output.search_query')
+    önbelleğe ekler. Aynı soru-cevap çifti için en son üretilen sorgu kullanılır.
+    """
+    from sqlalchemy import select
+    from src.models import SessionLocal, CallComplianceAnalysis
+
+    with SessionLocal() as db_session:
+        rows = db_session.execute(
+            select(
+                CallComplianceAnalysis.customer_query,
+                CallComplianceAnalysis.agent_response,
+                CallComplianceAnalysis.search_query
+            )
+            .where(CallComplianceAnalysis.search_query.is_not(None))
+            .order_by(CallComplianceAnalysis.id.desc())
+            .limit(limit)
+        ).all()
+
+    latest = {}
+    for customer_query, agent_response, search_query in rows:
+        text = dialog_text(customer_query, agent_response)
+        latest.setdefault(_text_hash(text), (text, search_query))
+    pairs = list(latest.values())
+
+    added = 0
+    for start in range(0, len(pairs), _SEED_BATCH_SIZE):
+        batch = pairs[start:start + _SEED_BATCH_SIZE]
+        added += cache.add_many([t for t, _ in batch], [q for _, q in batch], source="seed")
+    log.info(f"Anlamsal sorgu önbelleği geçmiş sonuçlardan dolduruldu: {added} yeni kayıt ({len(pairs)} tekil soru-cevap).")
+    return added
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Sorgu zenginleştirme için anlamsal önbellek araçları.")
+    parser.add_argument("--seed", action="store_true", help="Önbelleği geçmiş analiz sonuçlarından doldurur.")
+    parser.add_argument("--audit", type=int, metavar="N", help="Son N denetim kaydını yazdırır.")
+    args = parser.parse_args()
+
+    from src.compliance_chain import get_semantic_cache
+    semantic_cache = get_semantic_cache()
+    if args.seed:
+        seed_from_results(semantic_cache)
+    if args.audit:
+        print(json.dumps(semantic_cache.recent_audit(args.audit), ensure_ascii=False, indent=2))
+    print(json.dumps(semantic_cache.stats(), indent=2))
@@ -0,0 +1,313 @@
+# src/service.py
+import os
+import json
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import http.client
+
+from src.config import (
+    SERVICE_HOST,
+    SERVICE_PORT,
+    SERVICE_SOCKET_PATH,
+    SERVICE_MAX_CONCURRENT_CALLS,
+    SERVICE_MAX_QUEUED_CALLS,
+    SERVICE_MAX_BATCH_SIZE,
+    SERVICE_MAX_BODY_BYTES,
+    LLM_CACHE_ENABLED
+)
+from src.compliance_chain import run_compliance_analysis, warm_up, loaded_index_version
+from src.metrics import REGISTRY
+
+log = logging.getLogger("service")
+
+_HTTP_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"
+}
+
+class ServiceError(Exception):
+    """Servisin 2xx dışı döndürdüğü cevaplar (istemci tarafı)."""
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+
+# =================================================================
+# 1. İSTEK KUYRUĞU VE EŞZAMANLILIK SINIRI
+# =================================================================
+
+def _load_transcript(item: dict) -> str:
+    """İstek öğesindeki transkripti döndürür; 'call_id' / 'id' verilmişse DB'den okur."""
+    if isinstance(item.get("transcript"), str) and item["transcript"].strip():
+        return item["transcript"]
+
+    from src.models import SessionLocal, CallInput
+    db_session = SessionLocal()
+    try:
+        query = db_session.query(CallInput.transcript)
+        if item.get("id") is not None:
+            row = query.filter(CallInput.id == int(item["id"])).first()
+        elif item.get("call_id") is not None:
+            row = query.filter(CallInput.call_id == str(item["call_id"])).first()
+        else:
+            raise ServiceError(400, "Her öğe 'transcript', 'call_id' veya 'id' alanlarından birini içermelidir.")
+    finally:
+        db_session.close()
+    if row is None:
+        raise ServiceError(404, f"Çağrı bulunamadı: {item}")
+    return row[0]
+
+class AnalysisService:
+    """
+    Sıcak tutulan zincirler üzerinde run_compliance_analysis çalıştırır.
+    En fazla 'max_concurrent' çağrı aynı anda analiz edilir, en fazla 'max_queued'
+    çağrı sırada bekler; fazlası hemen 503 ile reddedilir (istemci tekrar dener).
+    Tüm istekler tek event loop'ta çalıştığından eşzamanlı isteklerin retrieval
+    sorguları da RetrievalBatcher'da birleşir.
+    """
+
+    def __init__(self, max_concurrent: int = SERVICE_MAX_CONCURRENT_CALLS,
+                 max_queued: int = SERVICE_MAX_QUEUED_CALLS,
+                 max_batch: int = SERVICE_MAX_BATCH_SIZE):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_batch = max_batch
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.pending = 0 # Sırada bekleyen + analiz edilen çağrılar
+        self.warm_up_timings = {}
+        self.stats = {"requests": 0, "calls": 0, "failed_calls": 0, "rejected": 0}
+
+    def _admit(self, count: int):
+        if self.pending + count > self.max_concurrent + self.max_queued:
+            self.stats["rejected"] += 1
+            raise ServiceError(503, f"Servis dolu: {self.pending} çağrı işlemde/sırada.")
+        self.pending += count
+
+    async def _analyze_one(self, item: dict) -> dict:
+        try:
+            transcript = await asyncio.to_thread(_load_transcript, item)
+            async with self._semaphore:
+                start = time.perf_counter()
+                results = await run_compliance_analysis(transcript)
+            self.stats["calls"] += 1
+            return {"ok": True, "results": results, "seconds": round(time.perf_counter() - start, 3)}
+        except Exception as e:
+            self.stats["failed_calls"] += 1
+            status_code = e.status_code if isinstance(e, ServiceError) else 500
+            return {"ok": False, "status": status_code, "error": str(e)}
+        finally:
+            self.pending -= 1
+
+    async def handle(self, method: str, path: str, body: bytes):
+        """(HTTP durum kodu, JSON gövdesi veya metin) döndürür."""
+        self.stats["requests"] += 1
+        if path == "/metrics":
+            # Prometheus metin formatı (aşama süreleri, token sayıları, önbellek isabetleri)
+            return 200, REGISTRY.render_prometheus()
+        if path == "/health":
+            return 200, {
+                "status": "ok",
+                "pending_calls": self.pending,
+                "max_concurrent": self.max_concurrent,
+                "max_queued": self.max_queued,
+                "index_version": loaded_index_version(),
+                "warm_up": self.warm_up_timings,
+                "stats": self.stats
+            }
+        if path not in ("/analyze", "/analyze/batch"):
+            return 404, {"error": f"Bilinmeyen adres: {path}"}
+        if method != "POST":
+            return 405, {"error": "Sadece POST desteklenir."}
+
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError as e:
+            return 400, {"error": f"Geçersiz JSON: {e}"}
+
+        if path == "/analyze":
+            if not isinstance(payload, dict):
+                return 400, {"error": "Gövde bir JSON nesnesi olmalıdır."}
+            self._admit(1)
+            result = await self._analyze_one(payload)
+            if not result["ok"]:
+                return result["status"], {"error": result["error"]}
+            return 200, {"results": result["results"], "seconds": result["seconds"]}
+
+        items = payload.get("items") if isinstance(payload, dict) else None
+        if not isinstance(items, list) or not items or not all(isinstance(i, dict) for i in items):
+            return 400, {"error": "'items' boş olmayan bir nesne listesi olmalıdır."}
+        if len(items) > self.max_batch:
+            return 413, {"error": f"Tek istekte en fazla {self.max_batch} çağrı gönderilebilir."}
+        self._admit(len(items))
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self._analyze_one(item) for item in items))
+        return 200, {"results": results, "seconds": round(time.perf_counter() - start, 3)}
+
+# =================================================================
+# 2. MİNİMAL HTTP/1.1 KATMANI (TCP VEYA UNIX SOKETİ)
+# =================================================================
+
+async def _read_request(reader: asyncio.StreamReader):
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    if not request_line:
+        return None
+    method, target, _ = request_line.split(" ", 2)
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1")
+        if line in ("\r\n", "\n", ""):
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > SERVICE_MAX_BODY_BYTES:
+        raise ServiceError(413, f"İstek gövdesi {SERVICE_MAX_BODY_BYTES} baytı aşamaz.")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], body
+
+def _write_response(writer: asyncio.StreamWriter, status_code: int, payload):
+    if isinstance(payload, str):
+        body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+    else:
+        body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+    headers = [
+        f"HTTP/1.1 {status_code} {_HTTP_REASONS.get(status_code, '')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        "Connection: close",
+    ]
+    if status_code == 503:
+        headers.append("Retry-After: 1")
+    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+
+async def _handle_connection(service: AnalysisService, reader, writer):
+    try:
+        try:
+            request = await _read_request(reader)
+            if request is None:
+                return
+            status_code, payload = await service.handle(*request)
+        except ServiceError as e:
+            status_code, payload = e.status_code, {"error": str(e)}
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            status_code, payload = 400, {"error": f"Geçersiz HTTP isteği: {e}"}
+        except Exception as e:
+            log.error(f"İstek işlenirken beklenmeyen hata: {e}")
+            status_code, payload = 500, {"error": str(e)}
+        _write_response(writer, status_code, payload)
+        await writer.drain()
+    except ConnectionError:
+        pass # İstemci cevabı beklemeden bağlantıyı kapattı
+    finally:
+        writer.close()
+
+async def serve(host: str = SERVICE_HOST, port: int = SERVICE_PORT, socket_path: str = SERVICE_SOCKET_PATH):
+    """Kaynakları ısıtır ve servisi durdurulana kadar çalıştırır."""
+    from src.models import create_db_and_tables
+
+    service = AnalysisService()
+    # Anlamsal önbellek geçmiş sonuçları okur: şema güncel olmalıdır
+    await asyncio.to_thread(create_db_and_tables)
+    log.info("Model, retriever ve zincirler yükleniyor...")
+    service.warm_up_timings = await asyncio.to_thread(warm_up)
+
+    handler = lambda reader, writer: _handle_connection(service, reader, writer)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = await asyncio.start_unix_server(handler, path=socket_path)
+        log.info(f"Analiz servisi hazır: unix:{socket_path}")
+    else:
+        server = await asyncio.start_server(handler, host=host, port=port)
+        log.info(f"Analiz servisi hazır: http://{host}:{port}")
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+def run_service(host: str = SERVICE_HOST, port: int = SERVICE_PORT, socket_path: str = SERVICE_SOCKET_PATH):
+    try:
+        asyncio.run(serve(host, port, socket_path))
+    except KeyboardInterrupt:
+        log.info("Analiz servisi durduruldu.")
+    finally:
+        if LLM_CACHE_ENABLED:
+            from src.llm_cache import get_llm_cache
+            log.info(f"LLM önbellek istatistikleri: {get_llm_cache().stats()}")
+
+# =================================================================
+# 3. İSTEMCİ
+# =================================================================
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+class ServiceClient:
+    """Çalışan analiz servisine istek gönderen basit (senkron) istemci."""
+
+    def __init__(self, host: str = SERVICE_HOST, port: int = SERVICE_PORT,
+                 socket_path: str = SERVICE_SOCKET_PATH, timeout: float = 600.0):
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self.socket_path:
+            return _UnixHTTPConnection(self.socket_path, self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _request(self, method: str, path: str, payload: dict = None) -> dict:
+        connection = self._connection()
+        try:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else None
+            connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            data = json.loads(response.read() or b"{}")
+        finally:
+            connection.close()
+        if response.status >= 300:
+            raise ServiceError(response.status, data.get("error", ""))
+        return data
+
+    def metrics(self) -> str:
+        """Servisin Prometheus formatındaki metinsel metrikleri."""
+        connection = self._connection()
+        try:
+            connection.request("GET", "/metrics")
+            return connection.getresponse().read().decode("utf-8")
+        finally:
+            connection.close()
+
+    def health(self) -> dict:
+        return self._request("GET", "/health")
+
+    def analyze(self, transcript: str = None, call_id: str = None, id: int = None) -> dict:
+        """Tek çağrıyı analiz ettirir: {'results': [...], 'seconds': ...}"""
+        item = {"transcript": transcript, "call_id": call_id, "id": id}
+        return self._request("POST", "/analyze", {k: v for k, v in item.items() if v is not None})
+
+    def analyze_batch(self, items: list) -> dict:
+        """Birkaç çağrıyı birlikte analiz ettirir; her öğe için ayrı sonuç/hata döner."""
+        return self._request("POST", "/analyze/batch", {"items": items})
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="BDDK Uyumluluk Analiz Servisi (modeller bir kez yüklenir).")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--socket", default=SERVICE_SOCKET_PATH, help="TCP yerine bu Unix soketini dinle")
+    args = parser.parse_args()
+    run_service(args.host, args.port, args.socket)
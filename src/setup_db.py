@@ -1,64 +1,203 @@
 # src/setup_db.py
-import pandas as pd
+import os
+import sys
+import csv
+import json
+import time
 import logging
-from src.models import engine, create_db_and_tables, CallInput, SessionLocal
+import argparse
+from typing import Iterator, Optional, Tuple
+
+from src.models import engine, create_db_and_tables, CallInput, insert_ignore
 
 # Loglama ayarları
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 log = logging.getLogger(__name__)
 
 XLSX_PATH = "data/new_calls.xlsx" # Düzeltme: .xlsx yolu
-TRANSCRIPT_COLUMN_NAME = "Transkript" 
-CALL_ID_COLUMN_NAME = "Çağrı ID" 
+TRANSCRIPT_COLUMN_NAME = "Transkript"
+CALL_ID_COLUMN_NAME = "Çağrı ID"
 
-def load_xlsx_to_db():
+# Tek INSERT ifadesi (ve tek transaction) ile yazılan satır sayısı.
+# Bellek kullanımı dosya boyutundan bağımsız olarak bu değerle sınırlıdır.
+IMPORT_BATCH_SIZE = 5000
+
+# Desteklenen girdi formatları (dosya uzantısına göre seçilir)
+SUPPORTED_FORMATS = ("xlsx", "csv", "jsonl", "parquet")
+
+# =================================================================
+# 1. SATIR SATIR (STREAMING) OKUYUCULAR
+# =================================================================
+# Her okuyucu (satır no, çağrı id, transkript) üretir; dosyanın tamamı
+# hiçbir zaman belleğe alınmaz. Satır no 0'dan başlayan veri satırı sırasıdır.
+
+def _iter_xlsx(path: str) -> Iterator[Tuple[int, object, object]]:
+    from openpyxl import load_workbook
+    # read_only: hücreler sayfa XML'inden akış halinde okunur
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+        id_col = header.index(CALL_ID_COLUMN_NAME) if CALL_ID_COLUMN_NAME in header else None
+        text_col = header.index(TRANSCRIPT_COLUMN_NAME) if TRANSCRIPT_COLUMN_NAME in header else None
+        if text_col is None:
+            raise ValueError(f"'{TRANSCRIPT_COLUMN_NAME}' kolonu bulunamadı.")
+        for index, row in enumerate(rows):
+            call_id = row[id_col] if id_col is not None and id_col < len(row) else None
+            transcript = row[text_col] if text_col < len(row) else None
+            yield index, call_id, transcript
+    finally:
+        workbook.close()
+
+def _iter_csv(path: str) -> Iterator[Tuple[int, object, object]]:
+    # Uzun transkriptler varsayılan alan boyutu limitini (128 KB) aşabilir
+    csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        if TRANSCRIPT_COLUMN_NAME not in (reader.fieldnames or []):
+            raise ValueError(f"'{TRANSCRIPT_COLUMN_NAME}' kolonu bulunamadı.")
+        for index, row in enumerate(reader):
+            yield index, row.get(CALL_ID_COLUMN_NAME), row.get(TRANSCRIPT_COLUMN_NAME)
+
+def _iter_jsonl(path: str) -> Iterator[Tuple[int, object, object]]:
+    with open(path, encoding="utf-8") as f:
+        index = 0
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                log.warning(f"Satır {line_number} atlanıyor: Geçersiz JSON ({e}).")
+                index += 1
+                continue
+            yield index, record.get(CALL_ID_COLUMN_NAME), record.get(TRANSCRIPT_COLUMN_NAME)
+            index += 1
+
+def _iter_parquet(path: str) -> Iterator[Tuple[int, object, object]]:
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(path)
+    names = parquet_file.schema_arrow.names
+    if TRANSCRIPT_COLUMN_NAME not in names:
+        raise ValueError(f"'{TRANSCRIPT_COLUMN_NAME}' kolonu bulunamadı.")
+    columns = [c for c in (CALL_ID_COLUMN_NAME, TRANSCRIPT_COLUMN_NAME) if c in names]
+    index = 0
+    # Row group'lar tek tek, IMPORT_BATCH_SIZE'lık dilimler halinde okunur
+    for batch in parquet_file.iter_batches(batch_size=IMPORT_BATCH_SIZE, columns=columns):
+        call_ids = batch.column(CALL_ID_COLUMN_NAME).to_pylist() if CALL_ID_COLUMN_NAME in columns else [None] * batch.num_rows
+        transcripts = batch.column(TRANSCRIPT_COLUMN_NAME).to_pylist()
+        for call_id, transcript in zip(call_ids, transcripts):
+            yield index, call_id, transcript
+            index += 1
+
+_READERS = {
+    "xlsx": _iter_xlsx,
+    "csv": _iter_csv,
+    "jsonl": _iter_jsonl,
+    "parquet": _iter_parquet,
+}
+
+def detect_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    extension = {"xlsm": "xlsx", "ndjson": "jsonl", "pq": "parquet"}.get(extension, extension)
+    if extension not in SUPPORTED_FORMATS:
+        raise ValueError(f"Desteklenmeyen dosya formatı: '{extension}'. Desteklenenler: {', '.join(SUPPORTED_FORMATS)}")
+    return extension
+
+def _normalize_call_id(call_id, index: int) -> str:
+    if call_id is None or (isinstance(call_id, float) and call_id != call_id): # None veya NaN
+        return f"call_{index}"
+    if isinstance(call_id, float) and call_id.is_integer():
+        # Excel sayısal ID'leri float olarak saklayabilir (12345.0 -> "12345")
+        return str(int(call_id))
+    return str(call_id).strip() or f"call_{index}"
+
+def _is_empty(transcript) -> bool:
+    if transcript is None:
+        return True
+    if isinstance(transcript, float) and transcript != transcript: # NaN
+        return True
+    return not str(transcript).strip()
+
+# =================================================================
+# 2. TOPLU (SET-BASED) YAZIM
+# =================================================================
+
+def _write_batch(connection, batch: list) -> int:
+    """
+    Satırları tek bir INSERT ... ON CONFLICT (call_id) DO NOTHING ile yazar;
+    veritabanında zaten olan çağrılar satır satır sorgulanmadan atlanır.
+    Yeni eklenen satır sayısını döndürür.
+    """
+    if not batch:
+        return 0
+    result = connection.execute(insert_ignore(CallInput), batch)
+    return max(result.rowcount, 0)
+
+def import_calls(path: str, file_format: Optional[str] = None, batch_size: int = IMPORT_BATCH_SIZE) -> int:
+    """
+    Çağrı transkriptlerini XLSX, CSV, JSONL veya Parquet dosyasından akış halinde
+    okuyup 'calls_input' tablosuna 'batch_size'lık parçalar halinde yükler.
+    Her parça kendi transaction'ında yazılır; yarıda kalan bir yükleme tekrar
+    çalıştırıldığında var olan çağrılar atlanır. Eklenen çağrı sayısını döndürür.
+    """
     log.info("Veritabanı ve tablolar oluşturuluyor...")
     # models.py'dan fonksiyonu çağır
     create_db_and_tables()
-    
-    log.info(f"'{XLSX_PATH}' dosyasından veriler okunuyor...")
-    try:
-        df = pd.read_excel(XLSX_PATH)
-    except FileNotFoundError:
-        log.error(f"HATA: '{XLSX_PATH}' dosyası bulunamadı.")
-        return
-    except Exception as e:
-        log.error(f"XLSX okuma hatası: {e}")
-        log.error("İpucu: 'pip install openpyxl' komutunu çalıştırdınız mı?")
-        return
 
-    # Veritabanı oturumu başlatma
-    db_session = SessionLocal()
+    file_format = file_format or detect_format(path)
+    if not os.path.exists(path):
+        log.error(f"HATA: '{path}' dosyası bulunamadı.")
+        return 0
 
+    log.info(f"'{path}' dosyasından veriler okunuyor ({file_format})...")
     log.info("Transkriptler 'calls_input' tablosuna yükleniyor...")
-    count = 0
+    start = time.perf_counter()
+    read = skipped = inserted = 0
+    batch = []
     try:
-        for index, row in df.iterrows():
-            call_id = str(row.get(CALL_ID_COLUMN_NAME, f"call_{index}"))
-            transcript = row.get(TRANSCRIPT_COLUMN_NAME)
-
-            if not transcript or pd.isna(transcript):
+        for index, call_id, transcript in _READERS[file_format](path):
+            read += 1
+            call_id = _normalize_call_id(call_id, index)
+            if _is_empty(transcript):
                 log.warning(f"Satır {index} (ID: {call_id}) atlanıyor: Transkript boş.")
+                skipped += 1
                 continue
 
-            # Bu call_id daha önce eklendi mi diye kontrol et
-            exists = db_session.query(CallInput).filter_by(call_id=call_id).first()
-            if not exists:
-                new_call = CallInput(
-                    call_id=call_id,
-                    transcript=str(transcript),
-                    status="pending" # Başlangıç durumu
-                )
-                db_session.add(new_call)
-                count += 1
-            
-        db_session.commit()
-        log.info(f"Başarıyla {count} adet yeni çağrı transkripti veritabanına eklendi.")
+            batch.append({"call_id": call_id, "transcript": str(transcript), "status": "pending"})
+            if len(batch) >= batch_size:
+                with engine.begin() as connection:
+                    inserted += _write_batch(connection, batch)
+                batch = []
+                elapsed = time.perf_counter() - start
+                log.info(f"İlerleme: {read} satır okundu, {inserted} yeni çağrı eklendi ({read / elapsed:.0f} satır/sn).")
+
+        with engine.begin() as connection:
+            inserted += _write_batch(connection, batch)
+    except ImportError as e:
+        log.error(f"'{file_format}' okuma hatası: {e}")
+        log.error("İpucu: 'pip install openpyxl' (xlsx) veya 'pip install pyarrow' (parquet) komutunu çalıştırdınız mı?")
+        return inserted
     except Exception as e:
-        db_session.rollback()
-        log.error(f"Veritabanına yazma hatası: {e}")
-    finally:
-        db_session.close()
+        log.error(f"Yükleme hatası (satır ~{read}): {e}")
+        log.error(f"O ana kadar yazılan {inserted} çağrı veritabanında kaldı; tekrar çalıştırıldığında atlanacaklar.")
+        return inserted
+
+    elapsed = time.perf_counter() - start
+    log.info(
+        f"Başarıyla {inserted} adet yeni çağrı transkripti veritabanına eklendi "
+        f"({read} satır okundu, {skipped} boş satır, {read - skipped - inserted} zaten kayıtlı; {elapsed:.1f} sn)."
+    )
+    return inserted
+
+def load_xlsx_to_db():
+    """Varsayılan Excel dosyasını (XLSX_PATH) yükler."""
+    return import_calls(XLSX_PATH, "xlsx")
 
 if __name__ == "__main__":
-    load_xlsx_to_db()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Çağrı transkriptlerini 'calls_input' tablosuna yükler.")
+    parser.add_argument("path", nargs="?", default=XLSX_PATH, help=f"Girdi dosyası ({', '.join(SUPPORTED_FORMATS)})")
+    parser.add_argument("--format", choices=SUPPORTED_FORMATS, default=None, help="Varsayılan: dosya uzantısından")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    import_calls(args.path, args.format, args.batch_size)
@@ -3,6 +3,7 @@ import asyncio
 import logging
 import json
 import time
+import argparse
 
 from src.models import SessionLocal, CallInput
 # Ana RAG akışımızı (orkestratör) import ediyoruz
@@ -18,6 +19,37 @@ TEST_CALL_ID = 163
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 log = logging.getLogger(__name__)
 
+def print_results(analysis_results):
+    """Sonuçları (sözlük listesi) okunabilir JSON formatında konsola basar."""
+    if not analysis_results:
+        log.warning("Analiz tamamlandı ancak bu transkriptte BDDK ile ilgili bir segment bulunamadı.")
+        return
+
+    log.info(f"---------- {len(analysis_results)} ADET SEGMENT İÇİN ANALİZ SONUCU ----------")
+    print(json.dumps(
+        analysis_results,
+        indent=2,
+        ensure_ascii=False # Türkçe karakterleri koru
+    ))
+    log.info("----------------------------------------------------------")
+
+def run_single_test_via_service():
+    """
+    Çağrıyı çalışan analiz servisine ('python -m src.service') gönderir.
+    Model ve index zaten yüklü olduğundan süre sadece LLM çağrılarından oluşur.
+    """
+    from src.service import ServiceClient
+    log.info(f"Tekil Çağrı Testi servis üzerinden başlatılıyor (Çağrı ID: {TEST_CALL_ID})...")
+    start_time = time.time()
+    try:
+        response = ServiceClient().analyze(id=TEST_CALL_ID)
+    except Exception as e:
+        log.error(f"Servis isteği başarısız: {e}")
+        log.error("Servisin çalıştığından emin olun: 'python -m src.service'")
+        return
+    log.info(f"Çağrı {time.time() - start_time:.2f} saniyede işlendi (servis analiz süresi: {response['seconds']} sn).")
+    print_results(response["results"])
+
 async def run_single_test_async():
     """
     Belirlenen tek bir çağrı ID'si için tam "Çift Aşamalı RAG Uyumluluk Analizi" 
@@ -56,25 +88,20 @@ async def run_single_test_async():
         log.info(f"Çağrı {end_time - start_time:.2f} saniyede başarıyla işlendi.")
 
         # Adım 3: Sonuçları JSON olarak formatla ve yazdır
-        if not analysis_results:
-            log.warning("Analiz tamamlandı ancak bu transkriptte BDDK ile ilgili bir segment bulunamadı.")
-            return
-
-        log.info(f"---------- {len(analysis_results)} ADET SEGMENT İÇİN ANALİZ SONUCU ----------")
-        
-        # Sonuçları (sözlük listesi) okunabilir JSON formatına çevir
-        result_json = json.dumps(
-            analysis_results, 
-            indent=2, 
-            ensure_ascii=False # Türkçe karakterleri koru
-        )
-        print(result_json)
-        
-        log.info("----------------------------------------------------------")
+        print_results(analysis_results)
 
     except Exception as e:
         log.error(f"Tekil çağrı analizi sırasında bir hata oluştu: {e}")
 
 if __name__ == "__main__":
-    # Asenkron test fonksiyonunu çalıştırmak için
-    asyncio.run(run_single_test_async())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Tek bir çağrı için uyumluluk analizi testi.")
+    parser.add_argument("--call-id", type=int, default=TEST_CALL_ID, help="calls_input tablosundaki 'id'")
+    parser.add_argument("--service", action="store_true", help="Çalışan analiz servisini kullan (model yüklemesi yok)")
+    args = parser.parse_args()
+    TEST_CALL_ID = args.call_id
+
+    if args.service:
+        run_single_test_via_service()
+    else:
+        # Asenkron test fonksiyonunu çalıştırmak için
+        asyncio.run(run_single_test_async())
\ No newline at end of file